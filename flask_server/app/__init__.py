@@ -1,10 +1,19 @@
-from flask import Flask
-from flask_socketio import SocketIO
-from flask_cors import CORS
+# Flask is imported on first use, so offline tools (teeet.py, app.autolabel)
+# can import app.config and friends without the server's dependencies.
 
-socketio = SocketIO(cors_allowed_origins="*", async_mode="threading")
+def __getattr__(name):
+    if name == 'socketio':
+        from flask_socketio import SocketIO
+        global socketio
+        socketio = SocketIO(cors_allowed_origins="*", async_mode="threading")
+        return socketio
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_app():
+    from flask import Flask
+    from flask_cors import CORS
+    from . import socketio
+
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-here'
     CORS(app)
@@ -16,4 +25,40 @@ def create_app():
     from .routes import bp as routes_bp
     app.register_blueprint(routes_bp)
 
+    # Keep glibc from trimming the heap between frames
+    from .config import MALLOC_TUNING
+    if MALLOC_TUNING:
+        from .buffers import tune_allocator
+        tune_allocator()
+
+    # Detection logs are written in batches by a background writer
+    from .database import start_writer
+    start_writer()
+
+    # Capture mode appends frames to disk from its own thread
+    from .capture import writer as capture_writer
+    capture_writer.start()
+
+    # Start the inference worker that drains /upload frames
+    from .pipeline import start_inference_worker
+    start_inference_worker()
+
+    # JPEG frames published over MQTT feed the same ingest stage as /upload
+    from .config import MQTT_FRAME_INGEST
+    if MQTT_FRAME_INGEST:
+        from .mqtt_ingest import ingest as mqtt_ingest
+        mqtt_ingest.start()
+
+    # Servo commands are delivered by their own worker threads
+    from .servo import dispatcher
+    dispatcher.start()
+
+    # Sorting stats: rollup table flushes and live 'stats_delta' events
+    from . import stats
+    stats.start(socketio)
+
+    # Push a metrics snapshot to dashboards every METRICS_PUSH_INTERVAL
+    from .metrics import start_push
+    start_push(socketio)
+
     return app
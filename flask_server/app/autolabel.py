@@ -0,0 +1,238 @@
+"""Headless crop/label pass over the dataset images.
+
+Runs ``auto_detect_box`` on every image under <root>/<split>/ in a process
+pool. Boxes it is confident about are written straight away as a crop
+(<out>/crops/<split>/<name>) and a YOLO label file
+(<out>/labels/<split>/<stem>.txt, class 0). Images without a box or with a
+box below AUTOLABEL_REVIEW_CONFIDENCE go to the review queue, which teeet.py
+works through with the interactive widget. Every result is appended to
+<out>/manifest.jsonl, so an interrupted run resumes where it stopped and
+images already labelled (by either tool) are not redone unless they change.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+import cv2
+import numpy as np
+from .config import AUTOLABEL_OUTPUT_DIR, AUTOLABEL_REVIEW_CONFIDENCE, AUTOLABEL_DETECT_WIDTH
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CLASS_ID = 0
+DONE_STATUSES = ('ok', 'reviewed', 'skipped')   # written by the batch run, or handled in teeet.py
+
+# Where the address label sits in the dataset photos, in full-size pixels
+MIN_WIDTH = 300
+MIN_HEIGHT, MAX_HEIGHT = 40, 300
+MIN_TOP = 150
+SHIFT_X = 550                 # the text block starts this far right of the dark blob
+PAD_WIDTH, PAD_HEIGHT = 20, 25
+
+
+def detect_box(img, detect_width=AUTOLABEL_DETECT_WIDTH):
+    """(box, confidence) for the label, box = (x1, y1, x2, y2) or None.
+
+    Thresholding runs on a copy shrunk by an integer factor to about
+    detect_width, and the contour bounding boxes are computed and filtered as
+    arrays. Confidence is how much the chosen blob dominates the runner-up,
+    times how much of the padded box survived clipping to the image.
+    """
+    height, width = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    # Integer factors take INTER_AREA's fast path
+    factor = max(1, int(round(width / float(detect_width))))
+    if factor > 1:
+        gray = cv2.resize(gray, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None, 0.0
+
+    # Bounding rects of all contours at once: min/max over each contour's slice of the points
+    points = np.concatenate(contours).reshape(-1, 2)
+    starts = np.cumsum([0] + [len(c) for c in contours[:-1]])
+    low = np.minimum.reduceat(points, starts)
+    high = np.maximum.reduceat(points, starts)
+    x, y = (low * factor).T
+    w, h = ((high - low + 1) * factor).T
+
+    keep = (
+        (w > MIN_WIDTH) & (w < width)
+        & (h > MIN_HEIGHT) & (h < MAX_HEIGHT)
+        & (y > MIN_TOP) & (y < height // 2)
+    )
+    if not keep.any():
+        return None, 0.0
+
+    x, y, w, h = x[keep], y[keep], w[keep], h[keep]
+    areas = (w * h).astype(np.float64)
+    order = np.argsort(areas)[::-1]
+    best = order[0]
+    dominance = 1.0 - areas[order[1]] / areas[best] if len(order) > 1 else 1.0
+
+    x1 = max(0, int(x[best]) + SHIFT_X)
+    y1 = max(0, int(y[best]))
+    want_w, want_h = int(w[best]) + PAD_WIDTH, int(h[best]) + PAD_HEIGHT
+    box_w = min(width - x1, want_w)
+    box_h = min(height - y1, want_h)
+    if box_w <= 0 or box_h <= 0:
+        return None, 0.0
+
+    coverage = (box_w * box_h) / float(want_w * want_h)
+    return (x1, y1, x1 + box_w, y1 + box_h), float(dominance * coverage)
+
+
+def auto_detect_box(img):
+    """teeet.py's original interface: just the box, or None"""
+    box, _ = detect_box(img)
+    return box
+
+
+def yolo_label(box, shape, class_id=CLASS_ID):
+    """One YOLO label line: class cx cy w h, normalised to the image size"""
+    height, width = shape[:2]
+    x1, y1, x2, y2 = box
+    return (f"{class_id} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+            f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n")
+
+
+def write_result(img, path, split, box, out_dir=AUTOLABEL_OUTPUT_DIR):
+    """Crop and YOLO label for one image; returns the crop path"""
+    name = os.path.basename(path)
+    crop_dir = os.path.join(out_dir, 'crops', split)
+    label_dir = os.path.join(out_dir, 'labels', split)
+    os.makedirs(crop_dir, exist_ok=True)
+    os.makedirs(label_dir, exist_ok=True)
+
+    x1, y1, x2, y2 = box
+    crop_path = os.path.join(crop_dir, name)
+    cv2.imwrite(crop_path, img[y1:y2, x1:x2])
+    with open(os.path.join(label_dir, os.path.splitext(name)[0] + '.txt'), 'w') as f:
+        f.write(yolo_label(box, img.shape))
+    return crop_path
+
+
+def label_image(path, split, mtime, out_dir=AUTOLABEL_OUTPUT_DIR,
+                review_confidence=AUTOLABEL_REVIEW_CONFIDENCE, detect_width=AUTOLABEL_DETECT_WIDTH):
+    """Manifest record for one image; confident boxes are written out"""
+    record = {'path': path, 'split': split, 'mtime': mtime, 'box': None, 'confidence': 0.0}
+    img = cv2.imread(path)
+    if img is None:
+        record['status'] = 'failed'
+        return record
+
+    box, confidence = detect_box(img, detect_width)
+    record['box'] = list(box) if box else None
+    record['confidence'] = round(confidence, 3)
+    if box is None:
+        record['status'] = 'failed'
+    elif confidence < review_confidence:
+        record['status'] = 'review'
+    else:
+        write_result(img, path, split, box, out_dir)
+        record['status'] = 'ok'
+    return record
+
+
+def _label_task(task):
+    return label_image(*task)
+
+
+def _init_worker():
+    # One process per core already, OpenCV's own threads would only contend
+    cv2.setNumThreads(1)
+
+
+class Manifest:
+    """Append-only JSONL of per-image results; the last record for a path wins"""
+
+    def __init__(self, out_dir=AUTOLABEL_OUTPUT_DIR):
+        os.makedirs(out_dir, exist_ok=True)
+        self.path = os.path.join(out_dir, 'manifest.jsonl')
+
+    def load(self):
+        records = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    records[record['path']] = record
+        return records
+
+    def append(self, records):
+        with open(self.path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+    def review_queue(self):
+        """Records still waiting for a human: no box found, or not confident enough"""
+        return [r for r in self.load().values() if r['status'] in ('review', 'failed')]
+
+    def work_list(self, images):
+        """Records for every (path, split) not done yet: new or changed images, the
+        review queue, and images a manual session never got to"""
+        done = self.load()
+        pending = []
+        for path, split in images:
+            mtime = os.path.getmtime(path)
+            record = done.get(path)
+            if record is not None and record.get('mtime') == mtime:
+                if record['status'] in DONE_STATUSES:
+                    continue
+                pending.append(record)
+            else:
+                pending.append({'path': path, 'split': split, 'mtime': mtime})
+        return pending
+
+
+def list_images(root, splits):
+    """(path, split) for every image under <root>/<split>/"""
+    images = []
+    for split in splits:
+        folder = os.path.join(root, split)
+        if not os.path.isdir(folder):
+            print(f"Missing split folder: {folder}")
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.abspath(os.path.join(folder, name)), split))
+    return images
+
+
+def run(root, out_dir=AUTOLABEL_OUTPUT_DIR, splits=('train', 'val'), workers=None,
+        review_confidence=AUTOLABEL_REVIEW_CONFIDENCE, detect_width=AUTOLABEL_DETECT_WIDTH,
+        flush_every=200):
+    """Label every image not already in the manifest; returns (status counts, skipped, seconds)"""
+    manifest = Manifest(out_dir)
+    done = manifest.load()
+
+    tasks, skipped = [], 0
+    for path, split in list_images(root, splits):
+        mtime = os.path.getmtime(path)
+        previous = done.get(path)
+        if previous is not None and previous.get('mtime') == mtime:
+            skipped += 1
+            continue
+        tasks.append((path, split, mtime, out_dir, review_confidence, detect_width))
+
+    counts, pending = Counter(), []
+    start = time.perf_counter()
+    if tasks:
+        try:
+            with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+                for record in pool.imap_unordered(_label_task, tasks, chunksize=8):
+                    counts[record['status']] += 1
+                    pending.append(record)
+                    if len(pending) >= flush_every:
+                        manifest.append(pending)
+                        pending = []
+        finally:
+            # Keep what finished before an interrupt, the rerun picks up the rest
+            manifest.append(pending)
+    return counts, skipped, time.perf_counter() - start
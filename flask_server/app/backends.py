@@ -0,0 +1,203 @@
+"""Detector backends.
+
+All backends take a list of BGR frames and return, per frame, a list of
+(x1, y1, x2, y2, label) in frame coordinates. The PyTorch backend is the
+ultralytics path we always used; the ONNX Runtime and OpenVINO backends run a
+model exported from best.pt and do their own letterbox preprocessing and NMS,
+so the ultralytics/torch stack is not needed on the production boxes.
+"""
+import ast
+import os
+import cv2
+import numpy as np
+from .config import (
+    MODEL_PATH, ONNX_MODEL_PATH, ONNX_INT8_MODEL_PATH, OPENVINO_MODEL_PATH,
+    DETECTOR_IMGSZ, DETECTOR_CONF, DETECTOR_IOU,
+)
+from . import buffers
+
+DATA_YAML = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data.yaml')
+
+
+def _default_names():
+    import yaml
+    with open(DATA_YAML) as f:
+        return dict(enumerate(yaml.safe_load(f)['names']))
+
+
+class PytorchDetector:
+    name = "pytorch"
+
+    def __init__(self, path=MODEL_PATH):
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+        self.names = self.model.names
+
+    def detect(self, frames, conf=DETECTOR_CONF, imgsz=DETECTOR_IMGSZ, with_scores=False):
+        """(x1, y1, x2, y2, label) per box, plus the score when with_scores is set"""
+        results = self.model(list(frames), conf=conf, iou=DETECTOR_IOU, imgsz=imgsz, verbose=False)
+
+        boxes_per_frame = []
+        for result in results:
+            boxes = []
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                cls = int(box.cls[0])
+                if with_scores:
+                    boxes.append((x1, y1, x2, y2, self.names[cls], float(box.conf[0])))
+                else:
+                    boxes.append((x1, y1, x2, y2, self.names[cls]))
+            boxes_per_frame.append(boxes)
+        return boxes_per_frame
+
+
+def letterbox(frame, size, out=None):
+    """Resize keeping aspect ratio and pad to size x size (ultralytics style, pad 114)"""
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    top, left = (size - nh) // 2, (size - nw) // 2
+
+    canvas = out if out is not None else np.empty((size, size, 3), dtype=np.uint8)
+    canvas.fill(114)
+    # The resized size depends on the frame's, so it isn't pooled
+    canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, left, top
+
+
+def nms(boxes, scores, classes, iou_threshold=DETECTOR_IOU):
+    """Per-class NMS (classes offset apart so one call handles all of them)"""
+    if len(boxes) == 0:
+        return []
+    offset = classes[:, None] * 4096.0
+    shifted = boxes + offset
+    xywh = np.column_stack([shifted[:, 0], shifted[:, 1], shifted[:, 2] - shifted[:, 0], shifted[:, 3] - shifted[:, 1]])
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), 0.0, iou_threshold)
+    return np.array(keep).reshape(-1)
+
+
+class ExportedDetector:
+    """Shared pre/post-processing for models exported from best.pt"""
+
+    def __init__(self, names, imgsz=DETECTOR_IMGSZ):
+        self.names = names or _default_names()
+        self.imgsz = imgsz
+
+    def preprocess(self, frames, imgsz):
+        """Letterboxed RGB float blob (pooled, release after use) plus per-frame scale info"""
+        blob = buffers.acquire((len(frames), 3, imgsz, imgsz), np.float32)
+        canvas = buffers.acquire((imgsz, imgsz, 3))
+        meta = []
+        for i, frame in enumerate(frames):
+            _, scale, left, top = letterbox(frame, imgsz, out=canvas)
+            # BGR HWC uint8 -> RGB CHW in [0, 1], written straight into the blob
+            np.multiply(canvas[:, :, ::-1].transpose(2, 0, 1), 1 / 255.0, out=blob[i], casting='unsafe')
+            meta.append((scale, left, top, frame.shape[:2]))
+        buffers.release(canvas)
+        return blob, meta
+
+    def postprocess(self, output, meta, conf, with_scores=False):
+        """YOLOv8 head output (N, 4 + nc, anchors) -> boxes in frame coordinates"""
+        boxes_per_frame = []
+        for pred, (scale, left, top, (h, w)) in zip(output, meta):
+            pred = pred.T
+            class_scores = pred[:, 4:]
+            classes = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(pred)), classes]
+            mask = scores >= conf
+            pred, classes, scores = pred[mask], classes[mask], scores[mask]
+
+            cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+            xyxy = np.column_stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2])
+
+            boxes = []
+            for i in nms(xyxy, scores, classes):
+                x1, y1, x2, y2 = xyxy[i]
+                x1 = int(np.clip((x1 - left) / scale, 0, w))
+                y1 = int(np.clip((y1 - top) / scale, 0, h))
+                x2 = int(np.clip((x2 - left) / scale, 0, w))
+                y2 = int(np.clip((y2 - top) / scale, 0, h))
+                if with_scores:
+                    boxes.append((x1, y1, x2, y2, self.names[int(classes[i])], float(scores[i])))
+                else:
+                    boxes.append((x1, y1, x2, y2, self.names[int(classes[i])]))
+            boxes_per_frame.append(boxes)
+        return boxes_per_frame
+
+    def detect(self, frames, conf=DETECTOR_CONF, imgsz=None, with_scores=False):
+        # Models exported with a static input shape only accept their own size
+        imgsz = self.imgsz if self.fixed_size else (imgsz or self.imgsz)
+        if self.fixed_batch:
+            # Exported without dynamic=True: one frame per call
+            return [self._detect_batch([f], conf, imgsz, with_scores)[0] for f in frames]
+        return self._detect_batch(frames, conf, imgsz, with_scores)
+
+    def _detect_batch(self, frames, conf, imgsz, with_scores=False):
+        blob, meta = self.preprocess(frames, imgsz)
+        try:
+            output = self.run(blob)
+        finally:
+            buffers.release(blob)
+        return self.postprocess(output, meta, conf, with_scores)
+
+
+class OnnxDetector(ExportedDetector):
+    """Also runs the INT8 model from ``python -m app.cli quantize`` (backend "onnx_int8")"""
+    name = "onnx"
+
+    def __init__(self, path=ONNX_MODEL_PATH):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input = self.session.get_inputs()[0]
+        self.fixed_batch = isinstance(self.input.shape[0], int)
+        self.fixed_size = isinstance(self.input.shape[2], int)
+
+        # ultralytics stores the class names in the model metadata
+        meta = self.session.get_modelmeta().custom_metadata_map
+        names = ast.literal_eval(meta['names']) if 'names' in meta else None
+        imgsz = ast.literal_eval(meta['imgsz'])[0] if 'imgsz' in meta else DETECTOR_IMGSZ
+        super().__init__(names, imgsz)
+
+    def run(self, blob):
+        return self.session.run(None, {self.input.name: blob})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    name = "openvino"
+
+    def __init__(self, path=OPENVINO_MODEL_PATH):
+        import openvino as ov
+        core = ov.Core()
+        model = core.read_model(path)
+        shape = model.input(0).get_partial_shape()
+        self.fixed_batch = not shape[0].is_dynamic
+        self.fixed_size = not shape[2].is_dynamic
+        self.compiled = core.compile_model(model, 'CPU')
+        self.output = self.compiled.output(0)
+
+        names, imgsz = None, DETECTOR_IMGSZ
+        meta_path = os.path.join(os.path.dirname(path), 'metadata.yaml')
+        if os.path.exists(meta_path):
+            import yaml
+            with open(meta_path) as f:
+                meta = yaml.safe_load(f)
+            names = meta.get('names')
+            imgsz = meta.get('imgsz', [imgsz])[0]
+        super().__init__(names, imgsz)
+
+    def run(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+BACKENDS = {
+    "pytorch": PytorchDetector,
+    "onnx": OnnxDetector,
+    "onnx_int8": lambda: OnnxDetector(ONNX_INT8_MODEL_PATH),
+    "openvino": OpenVinoDetector,
+}
+
+
+def make_detector(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,107 @@
+import base64
+import threading
+import cv2
+import numpy as np
+from flask import request
+from flask_socketio import join_room
+from . import socketio, buffers
+
+# Socket clients get raw JPEG bytes as a binary attachment by default; old
+# clients can connect with frame_format=base64 (auth or query) for the fallback
+BINARY_ROOM = 'frames_binary'
+BASE64_ROOM = 'frames_base64'
+_base64_clients = set()
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    frame_format = (auth or {}).get('frame_format') or request.args.get('frame_format')
+    if frame_format == 'base64':
+        _base64_clients.add(request.sid)
+        join_room(BASE64_ROOM)
+    else:
+        join_room(BINARY_ROOM)
+
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    _base64_clients.discard(request.sid)
+
+
+class FrameBroadcaster:
+    """Latest-frame slot shared by every viewer.
+
+    Each new frame is JPEG-encoded once and stored with a sequence number.
+    MJPEG viewers block on the condition until the sequence moves, and the
+    socket event is emitted once for all dashboards, so encode cost does not
+    grow with the number of viewers. Passthrough frames keep the camera's
+    own JPEG bytes and are only decoded if someone asks for pixels.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.jpeg = None
+        self.camera = None
+        self.encodes = 0
+
+    def publish(self, frame, camera=None, emit=True):
+        """Encode once, store and fan out; returns the JPEG bytes"""
+        ok, buffer = cv2.imencode('.jpg', frame)
+        if not ok:
+            return None
+        self.encodes += 1
+        return self._store(buffer.tobytes(), frame, camera, emit)
+
+    def publish_jpeg(self, jpeg, camera=None, emit=True):
+        """Passthrough: fan out already-encoded JPEG bytes, decode only on demand"""
+        return self._store(bytes(jpeg), None, camera, emit)
+
+    def _store(self, jpeg, frame, camera, emit):
+        # Pooled canvases are shared with the pipeline, hold a reference while stored
+        buffers.retain(frame)
+        with self.cond:
+            previous = self.frame
+            self.seq += 1
+            self.frame = frame
+            self.jpeg = jpeg
+            self.camera = camera
+            self.cond.notify_all()
+        buffers.release(previous)
+
+        if emit:
+            socketio.emit('frame_update', {'frame': jpeg, 'camera': camera, 'encoding': 'binary'}, to=BINARY_ROOM)
+            if _base64_clients:
+                frame_base64 = base64.b64encode(jpeg).decode('utf-8')
+                socketio.emit('frame_update', {'frame': frame_base64, 'camera': camera, 'encoding': 'base64'}, to=BASE64_ROOM)
+        return jpeg
+
+    def wait_next(self, last_seq, timeout=5.0):
+        """Block until a frame newer than last_seq exists; returns (seq, jpeg)"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq, timeout)
+            return self.seq, self.jpeg
+
+    def latest(self):
+        with self.cond:
+            return self.seq, self.frame, self.jpeg
+
+    def latest_frame(self):
+        """Pixels of the latest frame, decoded lazily for passthrough frames"""
+        with self.cond:
+            seq, frame, jpeg = self.seq, self.frame, self.jpeg
+            if frame is not None:
+                # A copy: the pooled canvas is reused once the next frame replaces it
+                return frame.copy()
+        if jpeg is None:
+            return None
+
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        with self.cond:
+            if self.seq == seq:
+                self.frame = frame
+        return frame
+
+
+broadcaster = FrameBroadcaster()
@@ -0,0 +1,162 @@
+"""Reusable frame-sized buffers.
+
+Used for the annotated overlay canvas and the detector input tensors, the
+large arrays the pipeline itself creates for every frame (the decoded frame
+comes from cv2.imdecode, which can't write into a given buffer). A fixed
+number of slots is kept per (shape, dtype). ``acquire`` hands out a free slot
+with one reference; whoever else keeps the array around (e.g. the broadcaster
+holding the latest annotated frame) calls ``retain`` and every holder calls
+``release`` when done. At zero references the slot goes back to the ring.
+When every slot of a shape is in use a plain array is allocated instead
+(counted as ``exhausted``), so a slow consumer never blocks the pipeline.
+
+At most BUFFER_POOL_SHAPES shapes are pooled; /upload_web frames come in any
+size, so the least recently used shape is dropped (its arrays become ordinary
+arrays and are freed once their holders let go).
+"""
+import ctypes
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+from . import metrics
+from .config import BUFFER_POOL, BUFFER_POOL_SLOTS, BUFFER_POOL_SHAPES
+
+# glibc mallopt parameters
+M_TRIM_THRESHOLD = -1
+M_MMAP_THRESHOLD = -3
+MALLOC_THRESHOLD = 32 * 1024 * 1024  # glibc's maximum mmap threshold on 64-bit
+
+
+class PooledBuffer:
+    __slots__ = ('pool', 'key', 'array', 'refs')
+
+    def __init__(self, pool, key, array):
+        self.pool = pool
+        self.key = key
+        self.array = array
+        self.refs = 0
+
+    def retain(self):
+        with self.pool.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        self.pool._release(self)
+
+
+class BufferPool:
+    def __init__(self, slots=BUFFER_POOL_SLOTS, enabled=BUFFER_POOL, shapes=BUFFER_POOL_SHAPES):
+        self.slots = slots
+        self.enabled = enabled
+        self.shapes = shapes
+        self.lock = threading.Lock()
+        self.free = OrderedDict()  # key -> free buffers, least recently used key first
+        self.created = {}
+        self.by_id = {}  # id(array) -> PooledBuffer, for every array of a pooled key
+        self.allocated = 0
+        self.reused = 0
+        self.exhausted = 0
+        self.evicted = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """A buffer of shape/dtype with one reference; contents are whatever was left in it"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            if not self.enabled:
+                self.allocated += 1
+                buf = PooledBuffer(None, key, np.empty(shape, dtype))
+                buf.refs = 1
+                return buf
+
+            if key not in self.free:
+                self.free[key] = deque()
+                while len(self.free) > self.shapes:
+                    self._evict(next(iter(self.free)))
+            self.free.move_to_end(key)
+            free = self.free[key]
+            if free:
+                buf = free.pop()
+                self.reused += 1
+            elif self.created.get(key, 0) < self.slots:
+                self.created[key] = self.created.get(key, 0) + 1
+                self.allocated += 1
+                buf = PooledBuffer(self, key, np.empty(shape, dtype))
+                self.by_id[id(buf.array)] = buf
+            else:
+                self.allocated += 1
+                self.exhausted += 1
+                buf = PooledBuffer(None, key, np.empty(shape, dtype))
+            buf.refs = 1
+            return buf
+
+    def _evict(self, key):
+        """Stop pooling a shape; arrays still held elsewhere are simply not returned"""
+        del self.free[key]
+        self.created.pop(key, None)
+        for array_id in [i for i, buf in self.by_id.items() if buf.key == key]:
+            del self.by_id[array_id]
+        self.evicted += 1
+
+    def _release(self, buf):
+        if buf.pool is None:
+            return
+        with self.lock:
+            if self.by_id.get(id(buf.array)) is not buf:
+                return  # its shape was evicted
+            buf.refs -= 1
+            if buf.refs == 0:
+                self.free[buf.key].append(buf)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'shapes': len(self.created),
+                'evicted': self.evicted,
+                'allocated': self.allocated,
+                'reused': self.reused,
+                'exhausted': self.exhausted,
+                'free': sum(len(f) for f in self.free.values()),
+            }
+
+
+def tune_allocator(threshold=MALLOC_THRESHOLD):
+    """Stop glibc from returning freed frame-sized blocks to the OS after every frame.
+
+    With pooled buffers the only per-frame allocations left are cv2's (decode,
+    encode); by default glibc trims or unmaps those on free and page-faults
+    them back in on the next frame. Returns False when libc isn't glibc.
+    """
+    try:
+        libc = ctypes.CDLL("libc.so.6")
+        return bool(libc.mallopt(M_MMAP_THRESHOLD, threshold) and libc.mallopt(M_TRIM_THRESHOLD, threshold))
+    except (OSError, AttributeError):
+        return False
+
+
+pool = BufferPool()
+
+
+def acquire(shape, dtype=np.uint8):
+    """Array from the pool with one reference held by the caller"""
+    return pool.acquire(shape, dtype).array
+
+
+def retain(array):
+    """Take another reference to a pooled array (no-op for ordinary arrays)"""
+    buf = pool.by_id.get(id(array))
+    if buf is not None and buf.array is array:
+        buf.retain()
+
+
+def release(array):
+    """Drop a reference to a pooled array (no-op for ordinary arrays)"""
+    buf = pool.by_id.get(id(array))
+    if buf is not None and buf.array is array:
+        buf.release()
+
+metrics.register_gauge('buffer_pool_allocated', lambda: pool.allocated, kind="counter")
+metrics.register_gauge('buffer_pool_reused', lambda: pool.reused, kind="counter")
+metrics.register_gauge('buffer_pool_exhausted', lambda: pool.exhausted, kind="counter")
+metrics.register_gauge('buffer_pool_evicted', lambda: pool.evicted, kind="counter")
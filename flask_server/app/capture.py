@@ -0,0 +1,283 @@
+"""Capture mode: archive incoming frames and detections to disk.
+
+Records are appended to segment files (``<start ms>.seg``) by one writer
+thread; each record is a fixed header followed by the camera id, the raw JPEG
+bytes and a JSON metadata blob. A sidecar index (``<start ms>.idx``) holds one
+(timestamp, offset) pair per record so readers can binary-search by time over
+a memory map. Segments rotate by size or age and the oldest are deleted once
+the retention limits are exceeded.
+
+Record kinds:
+    frame       raw JPEG from /upload (meta has the ingest status and the
+                frame's sequence number 'seq')
+    stream      raw JPEG from /stream
+    detections  no JPEG; detections of the processed frame with the same
+                camera and 'seq' (frames dropped by the ingest queue have none)
+
+Ingest only ever does a non-blocking queue put; when the disk can't keep up
+records are dropped and counted.
+"""
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+from . import metrics
+from .config import (
+    CAPTURE_ENABLED, CAPTURE_DIR, CAPTURE_SEGMENT_BYTES, CAPTURE_SEGMENT_SECONDS,
+    CAPTURE_RETENTION_BYTES, CAPTURE_RETENTION_SECONDS, CAPTURE_QUEUE_SIZE,
+)
+
+# timestamp, kind, camera length, jpeg length, meta length
+HEADER = struct.Struct('<dBHII')
+# timestamp, offset of the record in the segment
+INDEX = struct.Struct('<dQ')
+
+KINDS = {'frame': 1, 'stream': 2, 'detections': 3}
+KIND_NAMES = {v: k for k, v in KINDS.items()}
+
+Record = namedtuple('Record', 'timestamp kind camera jpeg meta')
+
+
+class CaptureWriter:
+    def __init__(self, directory=CAPTURE_DIR, segment_bytes=CAPTURE_SEGMENT_BYTES,
+                 segment_seconds=CAPTURE_SEGMENT_SECONDS, retention_bytes=CAPTURE_RETENTION_BYTES,
+                 retention_seconds=CAPTURE_RETENTION_SECONDS, maxsize=CAPTURE_QUEUE_SIZE,
+                 enabled=CAPTURE_ENABLED):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.enabled = enabled
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+
+        self.data = None
+        self.index = None
+        self.segment_started = 0.0
+        self.segment_size = 0
+
+        self.written = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self.thread.start()
+
+    def record(self, kind, camera, jpeg=b'', meta=None):
+        """Queue a record; never blocks, returns False if capture is off or the queue is full"""
+        if not self.enabled:
+            return False
+        try:
+            self.queue.put_nowait((time.time(), KINDS[kind], camera, jpeg or b'', meta or {}))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._write(*item)
+                # Drain whatever else is waiting before paying for a flush
+                while True:
+                    try:
+                        self._write(*self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.data.flush()
+                self.index.flush()
+            except Exception as e:
+                print(f"Error writing capture: {e}")
+                self._close_segment()
+
+    def _write(self, timestamp, kind, camera, jpeg, meta):
+        if self.data is None or self._segment_full(timestamp):
+            self._rotate(timestamp)
+
+        camera_bytes = camera.encode()
+        meta_bytes = json.dumps(meta, default=float).encode()
+        offset = self.segment_size
+
+        self.data.write(HEADER.pack(timestamp, kind, len(camera_bytes), len(jpeg), len(meta_bytes)))
+        self.data.write(camera_bytes)
+        self.data.write(jpeg)
+        self.data.write(meta_bytes)
+        self.index.write(INDEX.pack(timestamp, offset))
+
+        size = HEADER.size + len(camera_bytes) + len(jpeg) + len(meta_bytes)
+        self.segment_size += size
+        self.bytes_written += size
+        self.written += 1
+
+    def _segment_full(self, timestamp):
+        return (self.segment_size >= self.segment_bytes
+                or timestamp - self.segment_started >= self.segment_seconds)
+
+    def _rotate(self, timestamp):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{int(timestamp * 1000)}")
+        self.data = open(base + '.seg', 'ab')
+        self.index = open(base + '.idx', 'ab')
+        self.segment_started = timestamp
+        self.segment_size = self.data.tell()
+        self._apply_retention(keep=base + '.seg')
+
+    def _close_segment(self):
+        for f in (self.data, self.index):
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+        self.data = self.index = None
+
+    def _apply_retention(self, keep):
+        segments = list_segments(self.directory)
+        total = sum(os.path.getsize(p) for _, p in segments)
+        cutoff = time.time() - self.retention_seconds
+
+        for start, path in segments:
+            if path == keep:
+                break
+            if total <= self.retention_bytes and start >= cutoff:
+                break
+            size = os.path.getsize(path)
+            for p in (path, path[:-4] + '.idx'):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'pending': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'bytes_written': self.bytes_written,
+        }
+
+
+def list_segments(directory=CAPTURE_DIR):
+    """(start timestamp, path) of every segment, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        if name.endswith('.seg'):
+            try:
+                segments.append((int(name[:-4]) / 1000.0, os.path.join(directory, name)))
+            except ValueError:
+                continue
+    return sorted(segments)
+
+
+class CaptureReader:
+    """Reads segments through memory maps; the segment being written is read up to its last flush"""
+
+    def __init__(self, directory=CAPTURE_DIR):
+        self.directory = directory
+
+    def records(self, start=None, end=None, kinds=None, camera=None):
+        """Records with start <= timestamp < end, oldest first"""
+        segments = list_segments(self.directory)
+        kind_ids = {KINDS[k] for k in kinds} if kinds else None
+
+        for i, (seg_start, path) in enumerate(segments):
+            # Skip segments that end before start (the next one starts after it)
+            if start is not None and i + 1 < len(segments) and segments[i + 1][0] <= start:
+                continue
+            if end is not None and seg_start >= end:
+                break
+
+            for record in self._read_segment(path, start, end):
+                if kind_ids and KINDS[record.kind] not in kind_ids:
+                    continue
+                if camera and record.camera != camera:
+                    continue
+                yield record
+
+    def seek(self, timestamp, **filters):
+        """First record at or after timestamp, or None"""
+        return next(self.records(start=timestamp, **filters), None)
+
+    def _read_segment(self, path, start, end):
+        index_path = path[:-4] + '.idx'
+        with _mapped(index_path) as index, _mapped(path) as data:
+            if index is None or data is None:
+                return
+            count = len(index) // INDEX.size
+            i = _bisect(index, count, start) if start is not None else 0
+
+            while i < count:
+                timestamp, offset = INDEX.unpack_from(index, i * INDEX.size)
+                i += 1
+                if end is not None and timestamp >= end:
+                    return
+                if offset + HEADER.size > len(data):
+                    return  # index flushed ahead of data
+
+                ts, kind, cam_len, jpeg_len, meta_len = HEADER.unpack_from(data, offset)
+                pos = offset + HEADER.size
+                if pos + cam_len + jpeg_len + meta_len > len(data):
+                    return
+                camera = bytes(data[pos:pos + cam_len]).decode()
+                pos += cam_len
+                jpeg = bytes(data[pos:pos + jpeg_len])
+                pos += jpeg_len
+                meta = json.loads(bytes(data[pos:pos + meta_len]) or b'{}')
+                yield Record(ts, KIND_NAMES.get(kind, kind), camera, jpeg, meta)
+
+
+class _mapped:
+    """Read-only mmap of a file as a context manager; None for missing or empty files"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+
+    def __enter__(self):
+        try:
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        return self.map
+
+    def __exit__(self, *exc):
+        if self.map is not None:
+            self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+
+def _bisect(index, count, timestamp):
+    """First index entry with timestamp >= the given one"""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if INDEX.unpack_from(index, mid * INDEX.size)[0] < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+writer = CaptureWriter()
+
+metrics.register_gauge('capture_pending', writer.queue.qsize)
+metrics.register_gauge('capture_written', lambda: writer.written, kind="counter")
+metrics.register_gauge('capture_dropped', lambda: writer.dropped, kind="counter")
+metrics.register_gauge('capture_bytes', lambda: writer.bytes_written, kind="counter")
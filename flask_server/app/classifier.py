@@ -0,0 +1,143 @@
+"""Fixed-vocabulary label classifier.
+
+Only the TEXT_SERVO_MAPPING keys matter, so instead of reading characters we
+can classify the YOLO crop directly: HOG features of a normalised grayscale
+crop and a softmax (multinomial logistic regression) over the keys plus
+"unknown". Confidences are calibrated with a temperature fitted on held-out
+crops. Training data is a folder per label (``crops/A1/*.jpg``), e.g. written
+by ``python -m app.cli collect-crops`` from capture mode archives. That only
+yields mapping keys; ``crops/UNKNOWN/*.jpg`` negatives have to be added by
+hand, otherwise other text is only rejected by the confidence threshold.
+"""
+import glob
+import os
+import cv2
+import numpy as np
+
+UNKNOWN = "UNKNOWN"
+CROP_SIZE = (96, 32)  # width, height
+CELL = 8
+BINS = 9
+
+
+def features(roi):
+    """HOG-style descriptor: unsigned gradient orientation histograms per 8x8 cell,
+    normalised over 2x2 cell blocks (numpy, so it doesn't depend on cv2 contrib builds)"""
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    gray = cv2.equalizeHist(cv2.resize(gray, CROP_SIZE, interpolation=cv2.INTER_AREA))
+
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=1)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=1)
+    magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+    bins = (angle % 180 / (180 / BINS)).astype(np.int32) % BINS
+
+    h, w = gray.shape
+    cells_y, cells_x = h // CELL, w // CELL
+    cell_index = (np.arange(h)[:, None] // CELL) * cells_x + np.arange(w)[None, :] // CELL
+    hist = np.bincount(
+        (cell_index * BINS + bins).ravel(), weights=magnitude.ravel(), minlength=cells_y * cells_x * BINS
+    ).reshape(cells_y, cells_x, BINS)
+
+    blocks = np.concatenate([hist[:-1, :-1], hist[1:, :-1], hist[:-1, 1:], hist[1:, 1:]], axis=2)
+    blocks /= np.sqrt((blocks ** 2).sum(axis=2, keepdims=True)) + 1e-6
+    return blocks.reshape(-1).astype(np.float32)
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(logits)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class LabelClassifier:
+    def __init__(self, classes, weights, bias, mean, std, temperature=1.0):
+        self.classes = list(classes)
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+        self.temperature = temperature
+
+    def logits(self, X):
+        return ((X - self.mean) / self.std) @ self.weights + self.bias
+
+    def predict_proba(self, rois):
+        if not rois:
+            return np.zeros((0, len(self.classes)))
+        X = np.stack([features(r) for r in rois])
+        return softmax(self.logits(X) / self.temperature)
+
+    def predict(self, rois):
+        """(label, confidence) per ROI; label is a mapping key or UNKNOWN"""
+        probs = self.predict_proba(rois)
+        best = probs.argmax(axis=1)
+        return [(self.classes[i], float(probs[n, i])) for n, i in enumerate(best)]
+
+    @classmethod
+    def fit(cls, X, y, classes, epochs=300, lr=0.5, l2=1e-3):
+        """Full-batch gradient descent on the softmax cross-entropy"""
+        mean = X.mean(axis=0)
+        std = X.std(axis=0) + 1e-6
+        Xs = (X - mean) / std
+        onehot = np.eye(len(classes))[y]
+
+        weights = np.zeros((X.shape[1], len(classes)))
+        bias = np.zeros(len(classes))
+        for _ in range(epochs):
+            grad = (softmax(Xs @ weights + bias) - onehot) / len(X)
+            weights -= lr * (Xs.T @ grad + l2 * weights)
+            bias -= lr * grad.sum(axis=0)
+        return cls(classes, weights, bias, mean, std)
+
+    def calibrate(self, X, y):
+        """Pick the temperature that minimises NLL on held-out samples"""
+        logits = self.logits(X)
+        best_t, best_nll = 1.0, np.inf
+        for t in np.linspace(0.25, 5.0, 39):
+            p = softmax(logits / t)[np.arange(len(y)), y]
+            nll = -np.log(np.clip(p, 1e-12, 1.0)).mean()
+            if nll < best_nll:
+                best_t, best_nll = t, nll
+        self.temperature = float(best_t)
+        return self.temperature
+
+    def save(self, path):
+        np.savez(path, classes=np.array(self.classes), weights=self.weights, bias=self.bias,
+                 mean=self.mean, std=self.std, temperature=self.temperature)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls([str(c) for c in data['classes']], data['weights'], data['bias'],
+                   data['mean'], data['std'], float(data['temperature']))
+
+
+def load_crops(folder):
+    """(rois, labels) from a folder of per-label subfolders"""
+    rois, labels = [], []
+    for label in sorted(os.listdir(folder)):
+        for path in sorted(glob.glob(os.path.join(folder, label, '*'))):
+            roi = cv2.imread(path)
+            if roi is not None:
+                rois.append(roi)
+                labels.append(label.upper())
+    return rois, labels
+
+
+def train(rois, labels, val_fraction=0.2, seed=0):
+    """Train on a random split, calibrate on the rest; returns (classifier, val accuracy)"""
+    classes = sorted(set(labels) - {UNKNOWN}) + [UNKNOWN]
+    X = np.stack([features(r) for r in rois])
+    y = np.array([classes.index(label) for label in labels])
+
+    order = np.random.default_rng(seed).permutation(len(y))
+    n_val = max(1, int(len(y) * val_fraction)) if len(y) > 4 else 0
+    val, tr = order[:n_val], order[n_val:]
+
+    clf = LabelClassifier.fit(X[tr], y[tr], classes)
+    if n_val:
+        clf.calibrate(X[val], y[val])
+        accuracy = float((clf.logits(X[val]).argmax(axis=1) == y[val]).mean())
+    else:
+        accuracy = None
+    return clf, accuracy
@@ -0,0 +1,717 @@
+"""Command line tools for the sorting server.
+
+Usage (from flask_server/):
+    python -m app.cli bench-batch --frames recorded/ --batch-sizes 1,2,4,8
+    python -m app.cli export --format onnx
+    python -m app.cli parity --frames recorded/ --backend onnx
+    python -m app.cli quantize [--data data.yaml] [--onnx best.onnx] [--out best_int8.onnx]
+    python -m app.cli bench-roi --frames recorded/ [--roi 0,150,640,400] [--imgsz 320]
+    python -m app.cli rebuild-stats
+    python -m app.cli collect-crops captures/ --out crops/
+    python -m app.cli train-classifier --crops crops/ [--out label_classifier.npz]
+    python -m app.cli eval-classifier --crops crops_test/
+    python -m app.cli bench-alloc --frames recorded/ [--count 1000]
+    python -m app.cli bench-ingest --frames recorded/ [--url http://host:5000] [--broker host:1883]
+    python -m app.cli autolabel dataset/images [--out hasil_crop] [--workers 8]
+    python -m app.cli replay recorded/|captures/ --speed 0 [--golden golden.json | --write-golden golden.json]
+"""
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from .config import ROI_IMGSZ, CLASSIFIER_MODEL_PATH, CLASSIFIER_MIN_CONFIDENCE
+from .config import ONNX_INT8_MODEL_PATH, QUANT_MAX_MAP_DROP, QUANT_MAX_READ_DROP
+from .config import AUTOLABEL_OUTPUT_DIR, AUTOLABEL_REVIEW_CONFIDENCE, AUTOLABEL_DETECT_WIDTH
+
+
+def load_frames(folder, limit=None):
+    paths = sorted(
+        p for p in glob.glob(os.path.join(folder, '*'))
+        if p.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+    if limit:
+        paths = paths[:limit]
+
+    frames = [cv2.imread(p) for p in paths]
+    return [f for f in frames if f is not None]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def bench_batch(args):
+    """Frames/sec and per-frame latency of YOLO + OCR against batch size"""
+    from .detection import detect_boxes, read_rois
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        print(f"No frames found in {args.frames}")
+        return 1
+
+    # Warm up once so the first batch size does not pay for it
+    detect_boxes(frames[:1])
+
+    print(f"{'batch':>5} {'fps':>8} {'p50 ms':>8} {'p99 ms':>8} {'ocr rois':>9}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        latencies = []
+        roi_count = 0
+        start = time.perf_counter()
+
+        for i in range(0, len(frames), batch_size):
+            chunk = [f.copy() for f in frames[i:i + batch_size]]
+            t0 = time.perf_counter()
+
+            rois = []
+            for frame, boxes in zip(chunk, detect_boxes(chunk)):
+                for (x1, y1, x2, y2, _) in boxes:
+                    roi = frame[y1:y2, x1:x2]
+                    if roi.size > 0:
+                        rois.append(roi)
+            read_rois(rois)
+            roi_count += len(rois)
+
+            # Every frame in the chunk waits for the whole batch
+            elapsed = (time.perf_counter() - t0) * 1000
+            latencies.extend([elapsed] * len(chunk))
+
+        total = time.perf_counter() - start
+        print(f"{batch_size:>5} {len(frames) / total:>8.1f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} {roi_count:>9}")
+
+    return 0
+
+
+def export_model(args):
+    """Export best.pt for the ONNX Runtime / OpenVINO detector backends"""
+    from ultralytics import YOLO
+    from .config import MODEL_PATH
+
+    path = YOLO(args.weights or MODEL_PATH).export(
+        format=args.format, imgsz=args.imgsz, dynamic=args.dynamic, half=False
+    )
+    print(f"Exported {args.format} model to {path}")
+    return 0
+
+
+def match_boxes(ref, other, min_iou):
+    """Greedy one-to-one IoU matching; returns matched IoUs and unmatched counts"""
+    from .tracker import iou
+
+    pairs = sorted(
+        ((iou(a[:4], b[:4]), i, j) for i, a in enumerate(ref) for j, b in enumerate(other) if a[4] == b[4]),
+        reverse=True
+    )
+    used_ref, used_other, ious = set(), set(), []
+    for score, i, j in pairs:
+        if score < min_iou:
+            break
+        if i in used_ref or j in used_other:
+            continue
+        used_ref.add(i)
+        used_other.add(j)
+        ious.append(score)
+    return ious, len(ref) - len(used_ref), len(other) - len(used_other)
+
+
+def parity(args):
+    """Check an exported backend gives the same boxes as the PyTorch model"""
+    from .backends import make_detector
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        print(f"No frames found in {args.frames}")
+        return 1
+
+    ref = make_detector("pytorch")
+    other = make_detector(args.backend)
+
+    ious, missing, extra, total = [], 0, 0, 0
+    timings = {'pytorch': 0.0, args.backend: 0.0}
+    for frame in frames:
+        t0 = time.perf_counter()
+        ref_boxes = ref.detect([frame])[0]
+        t1 = time.perf_counter()
+        other_boxes = other.detect([frame])[0]
+        t2 = time.perf_counter()
+        timings['pytorch'] += t1 - t0
+        timings[args.backend] += t2 - t1
+
+        matched, m, e = match_boxes(ref_boxes, other_boxes, args.min_iou)
+        ious.extend(matched)
+        missing += m
+        extra += e
+        total += len(ref_boxes)
+
+    mean_iou = sum(ious) / len(ious) if ious else 0.0
+    print(f"frames: {len(frames)}  reference boxes: {total}")
+    print(f"matched: {len(ious)}  missing: {missing}  extra: {extra}  mean IoU: {mean_iou:.3f}")
+    for name, seconds in timings.items():
+        print(f"{name:>10}: {seconds / len(frames) * 1000:.1f} ms/frame")
+
+    ok = missing == 0 and extra == 0
+    print("PARITY OK" if ok else "PARITY FAILED")
+    return 0 if ok else 1
+
+
+def quantize(args):
+    """INT8 ONNX model calibrated on data.yaml; only published if accuracy holds up against best.pt"""
+    from ultralytics import YOLO
+    from .backends import PytorchDetector, OnnxDetector, DATA_YAML
+    from .config import MODEL_PATH
+    from .quantize import dataset_images, quantize_model, evaluate, time_detector, gate
+
+    weights = args.weights or MODEL_PATH
+    data = args.data or DATA_YAML
+    calibration = dataset_images('train', data, args.calibration)
+    val = dataset_images('val', data, args.limit)
+    if not val:
+        print(f"No val images found via {data}")
+        return 1
+    if not calibration:
+        print("No train images found, calibrating on val")
+        calibration = val[:args.calibration]
+
+    # Static shapes: quantized kernels are picked per shape at session creation
+    fp32_path = args.onnx or YOLO(weights).export(format="onnx", imgsz=args.imgsz, dynamic=False, half=False)
+    tmp_path = args.out + '.tmp'
+    start = time.perf_counter()
+    quantize_model(fp32_path, tmp_path, calibration, args.imgsz, exclude_head=not args.quantize_head)
+    print(f"Quantized {fp32_path} on {len(calibration)} images in {time.perf_counter() - start:.0f}s")
+
+    models = {
+        'pytorch': (PytorchDetector(weights), weights),
+        'onnx': (OnnxDetector(fp32_path), fp32_path),
+        'onnx_int8': (OnnxDetector(tmp_path), tmp_path),
+    }
+    results = {}
+    for name, (detector, path) in models.items():
+        results[name] = evaluate(detector, val)
+        results[name]['ms_per_frame'] = time_detector(detector, val)
+        results[name]['size_mb'] = os.path.getsize(path) / 1e6
+
+    base_ms = results['pytorch']['ms_per_frame']
+    print(f"val images: {len(val)}  labels: {results['pytorch']['labels']}")
+    print(f"{'model':>10} {'size MB':>8} {'ms/frame':>9} {'speedup':>8} {'mAP50':>7} {'read rate':>10}")
+    for name, r in results.items():
+        speedup = base_ms / r['ms_per_frame'] if r['ms_per_frame'] else 0.0
+        print(f"{name:>10} {r['size_mb']:>8.1f} {r['ms_per_frame']:>9.1f} {speedup:>7.2f}x "
+              f"{r['map50']:>7.4f} {r['read_rate']:>10.4f}")
+
+    failures = gate(results['pytorch'], results['onnx_int8'], args.max_map_drop, args.max_read_drop)
+    if failures:
+        os.remove(tmp_path)
+        for failure in failures:
+            print(f"REJECTED: {failure}")
+        return 1
+
+    os.replace(tmp_path, args.out)
+    print(f"Published {args.out}, load it with DETECTOR_BACKEND = \"onnx_int8\"")
+    return 0
+
+
+def bench_roi(args):
+    """YOLO latency and box agreement: full frame vs. ROI crop at a smaller imgsz"""
+    from .detection import models
+    from .roi import RegionLearner
+
+    frames = load_frames(args.frames, args.limit)
+    if not frames:
+        print(f"No frames found in {args.frames}")
+        return 1
+    detector, _ = models.get()
+
+    full_boxes, full_ms = [], []
+    for frame in frames:
+        t0 = time.perf_counter()
+        full_boxes.append(detector.detect([frame])[0])
+        full_ms.append((time.perf_counter() - t0) * 1000)
+
+    if args.roi:
+        region = tuple(int(v) for v in args.roi.split(','))
+    else:
+        # Same thing adaptive mode does, learned from the full-frame pass
+        learner = RegionLearner(window=max(len(frames), 1) * 10, min_boxes=1, full_frame_every=10 ** 9)
+        for boxes in full_boxes:
+            learner.add(boxes)
+        region = learner.region(frames[0].shape)
+        if region is None:
+            print("No detections to learn a region from, pass --roi")
+            return 1
+    x1, y1, x2, y2 = region
+
+    ious, missing, extra, roi_ms = [], 0, 0, []
+    for frame, ref in zip(frames, full_boxes):
+        t0 = time.perf_counter()
+        boxes = detector.detect([frame[y1:y2, x1:x2]], imgsz=args.imgsz)[0]
+        roi_ms.append((time.perf_counter() - t0) * 1000)
+        boxes = [(a + x1, b + y1, c + x1, d + y1, label) for (a, b, c, d, label) in boxes]
+
+        matched, m, e = match_boxes(ref, boxes, args.min_iou)
+        ious.extend(matched)
+        missing += m
+        extra += e
+
+    h, w = frames[0].shape[:2]
+    area = (x2 - x1) * (y2 - y1) / float(w * h)
+    print(f"frames: {len(frames)}  region: {region} ({area:.0%} of frame)  crop imgsz: {args.imgsz}")
+    print(f"{'':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'full':>6} {percentile(full_ms, 50):>8.1f} {percentile(full_ms, 99):>8.1f}")
+    print(f"{'roi':>6} {percentile(roi_ms, 50):>8.1f} {percentile(roi_ms, 99):>8.1f}")
+    mean_iou = sum(ious) / len(ious) if ious else 0.0
+    print(f"matched: {len(ious)}  missed by roi: {missing}  extra: {extra}  mean IoU: {mean_iou:.3f}")
+    return 0
+
+
+def replay_cmd(args):
+    """Replay recorded frames through the pipeline with stubbed servo/DB sinks"""
+    import json
+    from .replay import folder_source, capture_source, mjpeg_source, replay, build_report, print_report, write_golden
+    from .capture import list_segments
+
+    if list_segments(args.source):
+        source = capture_source(args.source, args.camera, args.start, args.end)
+    elif os.path.isdir(args.source):
+        source = folder_source(args.source, args.fps)
+    else:
+        source = mjpeg_source(args.source, args.fps)
+
+    golden = None
+    if args.golden:
+        with open(args.golden) as f:
+            golden = json.load(f)
+
+    results, sinks, elapsed = replay(source, args.camera, args.speed)
+    if not results:
+        print(f"No frames found in {args.source}")
+        return 1
+
+    report = build_report(results, sinks, elapsed, golden)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.write_golden:
+        write_golden(results, args.write_golden)
+        print(f"Wrote golden results to {args.write_golden}")
+
+    g = report.get('golden')
+    return 1 if g and (g['missing'] or g['extra']) else 0
+
+
+def autolabel_cmd(args):
+    """Crop and YOLO-label the dataset in a process pool; unsure images go to the review queue"""
+    from .autolabel import run, Manifest
+
+    counts, skipped, seconds = run(
+        args.root, args.out, args.splits.split(','), args.workers,
+        args.review_confidence, args.detect_width,
+    )
+    processed = sum(counts.values())
+    rate = processed / seconds if seconds else 0.0
+    print(f"processed: {processed} ({rate:.0f} images/s)  already in manifest: {skipped}")
+    print(f"labelled: {counts['ok']}  to review: {counts['review']}  no box: {counts['failed']}")
+    print(f"review queue: {len(Manifest(args.out).review_queue())} images, open them with teeet.py")
+    return 0
+
+
+def rebuild_stats(args):
+    """Recompute the stats rollup tables from the raw detections (run with the server stopped)"""
+    from .database import init_db
+    from .stats import rebuild_rollups
+
+    init_db()
+    start = time.perf_counter()
+    rebuild_rollups()
+    print(f"Rebuilt stats_minute and stats_hour in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def _timed_sends(payloads, send):
+    latencies = []
+    start = time.perf_counter()
+    for payload in payloads:
+        t0 = time.perf_counter()
+        send(payload)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return len(payloads) / (time.perf_counter() - start), latencies
+
+
+def bench_ingest(args):
+    """Per-frame cost of getting a JPEG into the ingest stage: HTTP POST vs MQTT publish"""
+    from .config import MQTT_TOPIC_FRAME
+
+    paths = sorted(
+        p for p in glob.glob(os.path.join(args.frames, '*'))
+        if p.lower().endswith(('.jpg', '.jpeg'))
+    )[:args.limit]
+    payloads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    if not payloads:
+        print(f"No frames found in {args.frames}")
+        return 1
+
+    results = {}
+
+    # In-process: broker stub -> ingest queue -> ingest_jpeg (change gate, decode, frame queue)
+    from . import pipeline
+    from .mqtt_ingest import FrameIngest, LoopbackBroker
+    broker = LoopbackBroker()
+    ingest = FrameIngest(maxsize=len(payloads), require_ready=False)
+    ingest.start(subscribe=broker.subscribe, qos=0)
+
+    def loopback(payload):
+        done = ingest.ingested + 1
+        broker.publish(MQTT_TOPIC_FRAME, payload)
+        while ingest.ingested < done:
+            time.sleep(0.0001)
+    results['mqtt loopback'] = _timed_sends(payloads, loopback)
+
+    if args.url:
+        import requests
+        url = args.url.rstrip('/') + '/upload'
+        # New connection per frame, like the ESP32-CAM firmware does today
+        results['http new conn'] = _timed_sends(
+            payloads, lambda p: requests.post(url, data=p, headers={'Connection': 'close'}, timeout=5))
+        session = requests.Session()
+        results['http keep-alive'] = _timed_sends(payloads, lambda p: session.post(url, data=p, timeout=5))
+
+    if args.broker:
+        import paho.mqtt.client as mqtt
+        host, _, port = args.broker.partition(':')
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        client.connect(host, int(port or 1883))
+        client.loop_start()
+        results[f'mqtt qos{args.qos}'] = _timed_sends(
+            payloads, lambda p: client.publish(MQTT_TOPIC_FRAME, p, qos=args.qos).wait_for_publish())
+        client.loop_stop()
+        client.disconnect()
+
+    size = sum(len(p) for p in payloads) / len(payloads) / 1024
+    print(f"frames: {len(payloads)}  avg size: {size:.1f} KiB")
+    print(f"{'path':>16} {'fps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, (fps, latencies) in results.items():
+        print(f"{name:>16} {fps:>8.1f} {percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f}")
+    print(f"frame queue drops during loopback run: {pipeline.frame_queue.dropped}")
+    return 0
+
+
+def collect_crops(args):
+    """Cut labelled crops out of capture mode archives for classifier training"""
+    from collections import OrderedDict
+    from .capture import CaptureReader
+
+    # Queued frames waiting for their detections record, joined on (camera, seq);
+    # frames the ingest queue dropped never get one, so only the newest are kept
+    frames, max_waiting = OrderedDict(), 1000
+    saved, unmatched = 0, 0
+    for record in CaptureReader(args.capture).records(kinds=['frame', 'detections']):
+        key = (record.camera, record.meta.get('seq'))
+        if record.kind == 'frame':
+            if record.meta.get('status') == 'queued' and key[1] is not None:
+                frames.pop(key, None)
+                frames[key] = record
+                if len(frames) > max_waiting:
+                    frames.popitem(last=False)
+            continue
+
+        frame_record = frames.pop(key, None)
+        if frame_record is None:
+            unmatched += 1
+            continue
+
+        frame = cv2.imdecode(np.frombuffer(frame_record.jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+        for i, det in enumerate(record.meta.get('detections', [])):
+            x1, y1, x2, y2 = det['bbox']
+            roi = frame[y1:y2, x1:x2]
+            if roi.size == 0:
+                continue
+            folder = os.path.join(args.out, det['text'])
+            os.makedirs(folder, exist_ok=True)
+            cv2.imwrite(os.path.join(folder, f"{record.camera}_{frame_record.timestamp:.3f}_{i}.jpg"), roi)
+            saved += 1
+
+    print(f"Saved {saved} crops to {args.out} ({unmatched} detection records without their frame)")
+    return 0
+
+
+def train_classifier(args):
+    """Train the fixed-vocabulary label classifier on a folder of labelled crops"""
+    from collections import Counter
+    from .classifier import load_crops, train, UNKNOWN
+
+    rois, labels = load_crops(args.crops)
+    if not rois:
+        print(f"No crops found in {args.crops}")
+        return 1
+
+    for label, count in sorted(Counter(labels).items()):
+        print(f"{label:>10}: {count}")
+    if UNKNOWN not in labels:
+        print(f"No {UNKNOWN} crops: non-label boxes are only rejected by the confidence threshold")
+    clf, accuracy = train(rois, labels, args.val_fraction)
+    clf.save(args.out)
+
+    acc = f"{accuracy:.3f}" if accuracy is not None else "n/a"
+    print(f"classes: {clf.classes}  val accuracy: {acc}  temperature: {clf.temperature:.2f}")
+    print(f"Saved classifier to {args.out}")
+    return 0
+
+
+def eval_classifier(args):
+    """Accuracy and per-crop latency: classifier vs. EasyOCR (readtext and constrained)"""
+    from .classifier import LabelClassifier, load_crops, UNKNOWN
+    from .detection import models, _run_ocr
+    from .ocr import read_labels
+
+    rois, labels = load_crops(args.crops)
+    if not rois:
+        print(f"No crops found in {args.crops}")
+        return 1
+    _, reader = models.get()
+    clf = LabelClassifier.load(args.model)
+
+    def classifier(roi):
+        label, conf = clf.predict([roi])[0]
+        return label if conf >= args.min_confidence else None
+
+    def hybrid(roi):
+        label, conf = clf.predict([roi])[0]
+        if conf >= args.min_confidence:
+            return label
+        # Straight to EasyOCR: the server's OCR cache would answer repeated eval crops for free
+        reads = _run_ocr([roi])[0]
+        return reads[0][1] if reads else UNKNOWN
+
+    def readtext(roi):
+        reads = reader.readtext(roi)
+        return reads[0][1].strip().upper() if reads else UNKNOWN
+
+    def constrained(roi):
+        reads = read_labels(reader, [roi])[0]
+        return reads[0][1] if reads else UNKNOWN
+
+    engines = [('classifier', classifier), ('hybrid', hybrid), ('readtext', readtext), ('constrained', constrained)]
+    print(f"crops: {len(rois)}  classes: {clf.classes}  min confidence: {args.min_confidence}")
+    print(f"{'engine':>12} {'accuracy':>9} {'answered':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, engine in engines:
+        correct, answered, latencies = 0, 0, []
+        for roi, label in zip(rois, labels):
+            t0 = time.perf_counter()
+            predicted = engine(roi)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if predicted is not None:
+                answered += 1
+                correct += predicted == label
+        print(f"{name:>12} {correct / len(rois):>9.3f} {answered / len(rois):>9.3f} "
+              f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f}")
+
+    # Expected calibration error of the classifier's confidences
+    probs = clf.predict_proba(rois)
+    conf, pred = probs.max(axis=1), probs.argmax(axis=1)
+    hit = np.array([clf.classes[p] == label for p, label in zip(pred, labels)])
+    bins = np.minimum((conf * 10).astype(int), 9)
+    ece = sum(abs(hit[bins == b].mean() - conf[bins == b].mean()) * (bins == b).mean()
+              for b in range(10) if (bins == b).any())
+    print(f"classifier ECE: {ece:.3f}")
+    return 0
+
+
+def _alloc_run(folder, count, pooled, tuned, results):
+    """Child process of bench-alloc: per-frame buffers the pipeline creates, without the models"""
+    import resource
+    import tracemalloc
+    from . import buffers
+    from .backends import ExportedDetector
+    from .detection import finish_frame
+
+    buffers.pool.enabled = pooled
+    if tuned:
+        buffers.tune_allocator()
+    jpegs = []
+    for path in sorted(glob.glob(os.path.join(folder, '*'))):
+        if path.lower().endswith(('.jpg', '.jpeg')):
+            with open(path, 'rb') as f:
+                jpegs.append(f.read())
+    preprocess = ExportedDetector({0: 'alamat'}).preprocess
+
+    def one_frame(jpeg):
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        blob, _ = preprocess([frame], 640)
+        buffers.release(blob)
+        h, w = frame.shape[:2]
+        canvas, _ = finish_frame(frame, 'bench', [((w // 4, h // 4, w // 2, h // 2, 'alamat'), None)])
+        cv2.imencode('.jpg', canvas)
+        buffers.release(canvas)
+
+    one_frame(jpegs[0])  # first frame fills the pool
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    stats_before = buffers.pool.stats()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(count):
+        one_frame(jpegs[i % len(jpegs)])
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    stats = buffers.pool.stats()
+
+    results.put({
+        'ms_per_frame': elapsed / count * 1000,
+        'allocations': stats['allocated'] - stats_before['allocated'],
+        'reused': stats['reused'] - stats_before['reused'],
+        'page_faults': after.ru_minflt - before.ru_minflt,
+        'peak_rss_mb': after.ru_maxrss / 1024.0,
+        'peak_traced_mb': peak / 1024.0 ** 2,
+    })
+
+
+def bench_alloc(args):
+    """Buffer allocations, page faults and peak RSS per N frames: without the buffer pool,
+    with it, and with it plus the glibc malloc tuning"""
+    import multiprocessing as mp
+
+    if not any(p.lower().endswith(('.jpg', '.jpeg')) for p in glob.glob(os.path.join(args.frames, '*'))):
+        print(f"No frames found in {args.frames}")
+        return 1
+
+    # Separate processes so each run starts with a fresh heap and its own peak RSS
+    ctx = mp.get_context("spawn")
+    rows = {}
+    for name, pooled, tuned in (('unpooled', False, False), ('pooled', True, False), ('pooled+malloc', True, True)):
+        results = ctx.Queue()
+        proc = ctx.Process(target=_alloc_run, args=(args.frames, args.count, pooled, tuned, results))
+        proc.start()
+        rows[name] = results.get()
+        proc.join()
+
+    print(f"per {args.count} frames (decode, detector input, overlay canvas, encode)")
+    print(f"{'':>13} {'ms/frame':>9} {'buffer allocs':>14} {'reused':>7} {'page faults':>12} "
+          f"{'peak RSS MB':>12} {'peak traced MB':>15}")
+    for name, r in rows.items():
+        print(f"{name:>13} {r['ms_per_frame']:>9.2f} {r['allocations']:>14} {r['reused']:>7} "
+              f"{r['page_faults']:>12} {r['peak_rss_mb']:>12.1f} {r['peak_traced_mb']:>15.1f}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("bench-batch", help="benchmark batched YOLO + OCR inference")
+    p.add_argument("--frames", required=True, help="folder of recorded JPEG frames")
+    p.add_argument("--batch-sizes", default="1,2,4,8")
+    p.add_argument("--limit", type=int, default=None, help="use at most N frames")
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("export", help="export best.pt to ONNX or OpenVINO")
+    p.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    p.add_argument("--weights", default=None, help="defaults to MODEL_PATH")
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--dynamic", action="store_true", help="dynamic batch and input size")
+    p.set_defaults(func=export_model)
+
+    p = sub.add_parser("parity", help="compare an exported backend against the PyTorch model")
+    p.add_argument("--frames", required=True, help="folder of recorded JPEG frames")
+    p.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    p.add_argument("--min-iou", type=float, default=0.9, help="IoU needed to count two boxes as the same")
+    p.add_argument("--limit", type=int, default=None, help="use at most N frames")
+    p.set_defaults(func=parity)
+
+    p = sub.add_parser("quantize", help="INT8-quantize the detector, gated on mAP50 and read rate")
+    p.add_argument("--data", default=None, help="dataset yaml, calibrates on train and evaluates on val (default data.yaml)")
+    p.add_argument("--weights", default=None, help="FP32 reference, defaults to MODEL_PATH")
+    p.add_argument("--onnx", default=None, help="FP32 ONNX export to quantize (exported from --weights if omitted)")
+    p.add_argument("--out", default=ONNX_INT8_MODEL_PATH)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--calibration", type=int, default=300, help="number of train images to calibrate on")
+    p.add_argument("--limit", type=int, default=None, help="evaluate on at most N val images")
+    p.add_argument("--quantize-head", action="store_true", help="also quantize the Detect head (keeps FP32 by default)")
+    p.add_argument("--max-map-drop", type=float, default=QUANT_MAX_MAP_DROP)
+    p.add_argument("--max-read-drop", type=float, default=QUANT_MAX_READ_DROP)
+    p.set_defaults(func=quantize)
+
+    p = sub.add_parser("bench-roi", help="compare full-frame YOLO against ROI crops")
+    p.add_argument("--frames", required=True, help="folder of recorded JPEG frames")
+    p.add_argument("--roi", default=None, help="x1,y1,x2,y2; learned from the frames if omitted")
+    p.add_argument("--imgsz", type=int, default=ROI_IMGSZ)
+    p.add_argument("--min-iou", type=float, default=0.7, help="IoU needed to count two boxes as the same")
+    p.add_argument("--limit", type=int, default=None, help="use at most N frames")
+    p.set_defaults(func=bench_roi)
+
+    p = sub.add_parser("replay", help="replay recorded frames and print a benchmark report")
+    p.add_argument("source", help="capture directory, folder of JPEG frames or an MJPEG file")
+    p.add_argument("--speed", type=float, default=0.0, help="0 = as fast as possible, 1 = real time")
+    p.add_argument("--fps", type=float, default=10.0, help="frame rate the frames were recorded at")
+    p.add_argument("--camera", default="cam0")
+    p.add_argument("--start", type=float, default=None, help="capture directory: first unix timestamp to replay")
+    p.add_argument("--end", type=float, default=None, help="capture directory: stop at this unix timestamp")
+    p.add_argument("--golden", default=None, help="golden results file to compare detections against")
+    p.add_argument("--write-golden", default=None, help="save this run's detections as a golden file")
+    p.add_argument("--report", default=None, help="also write the report as JSON")
+    p.set_defaults(func=replay_cmd)
+
+    p = sub.add_parser("autolabel", help="headless crop/label pass over the dataset images")
+    p.add_argument("root", help="images folder with one subfolder per split")
+    p.add_argument("--out", default=AUTOLABEL_OUTPUT_DIR, help="crops, labels and manifest.jsonl go here")
+    p.add_argument("--splits", default="train,val")
+    p.add_argument("--workers", type=int, default=None, help="processes, defaults to the CPU count")
+    p.add_argument("--review-confidence", type=float, default=AUTOLABEL_REVIEW_CONFIDENCE)
+    p.add_argument("--detect-width", type=int, default=AUTOLABEL_DETECT_WIDTH)
+    p.set_defaults(func=autolabel_cmd)
+
+    p = sub.add_parser("rebuild-stats", help="rebuild the stats rollup tables from raw detections")
+    p.set_defaults(func=rebuild_stats)
+
+    p = sub.add_parser("bench-alloc", help="measure per-frame allocations with and without the buffer pool and malloc tuning")
+    p.add_argument("--frames", required=True, help="folder of recorded JPEG frames")
+    p.add_argument("--count", type=int, default=1000, help="frames per run")
+    p.set_defaults(func=bench_alloc)
+
+    p = sub.add_parser("bench-ingest", help="compare HTTP and MQTT frame ingest overhead")
+    p.add_argument("--frames", required=True, help="folder of recorded JPEG frames")
+    p.add_argument("--url", default=None, help="running server to POST /upload to")
+    p.add_argument("--broker", default=None, help="host[:port] of an MQTT broker the server listens on")
+    p.add_argument("--qos", type=int, choices=[0, 1], default=0)
+    p.add_argument("--limit", type=int, default=500, help="use at most N frames")
+    p.set_defaults(func=bench_ingest)
+
+    p = sub.add_parser("collect-crops", help="extract labelled crops from capture archives")
+    p.add_argument("capture", help="capture directory (CAPTURE_DIR)")
+    p.add_argument("--out", default="crops", help="one subfolder per label is written here")
+    p.set_defaults(func=collect_crops)
+
+    p = sub.add_parser(
+        "train-classifier", help="train the label classifier",
+        description="collect-crops only writes crops whose text is a mapping key. Unless an UNKNOWN "
+                    "subfolder of non-label crops is added by hand, the classifier never sees negatives "
+                    "and rejecting them depends only on the calibrated confidence threshold "
+                    "(CLASSIFIER_MIN_CONFIDENCE).")
+    p.add_argument("--crops", required=True, help="folder with one subfolder of crops per label (optionally UNKNOWN)")
+    p.add_argument("--out", default=CLASSIFIER_MODEL_PATH)
+    p.add_argument("--val-fraction", type=float, default=0.2, help="held out for accuracy and calibration")
+    p.set_defaults(func=train_classifier)
+
+    p = sub.add_parser("eval-classifier", help="compare the label classifier against EasyOCR")
+    p.add_argument("--crops", required=True, help="folder with one subfolder of crops per label")
+    p.add_argument("--model", default=CLASSIFIER_MODEL_PATH)
+    p.add_argument("--min-confidence", type=float, default=CLASSIFIER_MIN_CONFIDENCE)
+    p.set_defaults(func=eval_classifier)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
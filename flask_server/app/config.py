@@ -11,6 +11,9 @@ MQTT_PORT = 1883
 MQTT_TOPIC_FRAME = "esp8266/camera/frame"
 MQTT_TOPIC_SERVO_CMD = "esp8266/servo/cmd"
 MQTT_TOPIC_STATUS = "esp8266/status"
+MQTT_FRAME_INGEST = False    # take JPEG frames on MQTT_TOPIC_FRAME[/<camera>] at MQTT_BROKER besides /upload
+MQTT_FRAME_QOS = 0           # frames are perishable, redelivering stale ones doesn't help
+MQTT_FRAME_QUEUE_SIZE = 16   # frames between the MQTT network loop and ingest; more are dropped
 
 
 ESP32_CONTROLLER_IP = "http://192.168.21.111"
@@ -23,4 +26,126 @@ TEXT_SERVO_MAPPING = {
 "A4": 4,
 "A5": 5,
 "A6": 6,
-}
\ No newline at end of file
+}
+
+# Ingest queue between /upload and the inference worker
+FRAME_QUEUE_SIZE = 8
+FRAME_DROP_POLICY = "drop_oldest"  # "drop_oldest" or "latest_only"
+
+# Micro-batching: collect up to N frames or wait up to N ms per inference pass
+BATCH_MAX_FRAMES = 4
+BATCH_MAX_WAIT_MS = 20
+UPLOAD_WEB_TIMEOUT = 10.0  # seconds /upload_web waits for its result before answering 504
+OCR_BATCH_WIDTH = 256
+OCR_BATCH_HEIGHT = 64
+
+# Label tracking across frames (OCR once per parcel, servo fires once per parcel)
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_CENTROID_DIST = 80  # px, fallback match for fast-moving parcels
+TRACK_MAX_MISSED = 5          # frames a track survives without a matching box
+OCR_CONFIDENT_THRESHOLD = 0.8 # stop re-reading a track once it reaches this
+TRACK_FIRE_AFTER_READS = 3    # fire on the best read after this many, even below the threshold
+
+# OCR: "constrained" reads only TEXT_SERVO_MAPPING labels, "open" is plain readtext
+OCR_MODE = "constrained"
+OCR_SNAP_MIN_RATIO = 0.6  # min similarity to snap a near-miss onto a mapping key
+OCR_ENGINE = "easyocr"    # "easyocr" or "classifier" (label classifier, EasyOCR only as fallback)
+CLASSIFIER_MODEL_PATH = "label_classifier.npz"
+CLASSIFIER_MIN_CONFIDENCE = 0.9  # below this the crop goes to EasyOCR
+OCR_CACHE = True          # reuse EasyOCR reads for ROIs that look the same (perceptual hash)
+OCR_CACHE_SIZE = 256      # entries, least recently used evicted first
+OCR_CACHE_TTL = 30.0      # seconds an entry stays valid
+OCR_CACHE_HAMMING = 12    # max differing hash bits (of 256) that still count as the same label
+
+# Servo dispatcher (async queue + keep-alive pool to the ESP32 controller)
+SERVO_QUEUE_SIZE = 32
+SERVO_WORKERS = 2
+SERVO_TIMEOUT = (0.5, 1.5)     # (connect, read) seconds
+SERVO_MAX_RETRIES = 2
+SERVO_BACKOFF_BASE = 0.1       # seconds, doubled on every retry
+SERVO_DEDUP_IDS = 256          # recent command (track) ids remembered to drop repeats
+SERVO_BREAKER_THRESHOLD = 5    # consecutive failures before the circuit opens
+SERVO_BREAKER_COOLDOWN = 10    # seconds the circuit stays open, then one probe command decides
+
+# Detection log storage: "mysql" (DB_CONFIG) or "sqlite" (SQLITE_PATH, same schema)
+DB_BACKEND = "mysql"
+SQLITE_PATH = "detection_log.db"
+DB_POOL_SIZE = 4
+DB_POOL_TIMEOUT = 5.0     # seconds to wait for a free pooled connection before giving up
+DB_BATCH_SIZE = 50         # rows per multi-row INSERT
+DB_FLUSH_INTERVAL = 1.0    # seconds, flush a partial batch after this long
+DB_QUEUE_SIZE = 2000       # pending rows before log_detection starts dropping
+DETECTION_CACHE_SIZE = 500 # recent detections kept in memory for /api/logs
+QUERY_MAX_LIMIT = 1000     # page size cap for /api/detections
+EXPORT_PAGE_SIZE = 1000    # rows fetched per query while streaming an export
+STATS_FLUSH_INTERVAL = 10.0  # seconds between rollup table flushes
+STATS_PUSH_INTERVAL = 2.0    # seconds between 'stats_delta' socket events (0 disables)
+
+# /stream preview: keep the camera's JPEG bytes as-is instead of decode + re-encode
+STREAM_PASSTHROUGH = True
+
+# Pipeline metrics (/metrics, Prometheus text format)
+METRICS_WINDOW = 1000          # samples kept per stage for the rolling percentiles
+METRICS_PUSH_INTERVAL = 2.0    # seconds between 'metrics' socket events, 0 disables
+
+# Process-pool inference: 0 runs inference in the worker thread, N > 0 starts N
+# processes (each with its own model) fed through shared-memory frame slots
+INFERENCE_WORKERS = 0
+SHM_SLOT_BYTES = 1280 * 720 * 3   # largest frame a slot can hold
+INFERENCE_SLOT_TIMEOUT = 5.0      # seconds submit waits for a free slot before failing the frame
+WORKER_MAX_RESTARTS = 3           # restarts per worker process after it dies
+
+# Models are loaded in the background after startup, then warmed on a synthetic frame
+MODEL_PATH = "best.pt"
+OCR_GPU = True
+MODEL_WARMUP = True
+
+# Detector backend: "pytorch" (ultralytics, best.pt), "onnx", "onnx_int8" or "openvino"
+# (export first with: python -m app.cli export --format onnx|openvino)
+DETECTOR_BACKEND = "pytorch"
+ONNX_MODEL_PATH = "best.onnx"
+ONNX_INT8_MODEL_PATH = "best_int8.onnx"   # written by `python -m app.cli quantize`, backend "onnx_int8"
+OPENVINO_MODEL_PATH = "best_openvino_model/best.xml"
+DETECTOR_IMGSZ = 640
+DETECTOR_CONF = 0.5
+DETECTOR_IOU = 0.7
+QUANT_MAX_MAP_DROP = 0.01     # quantize refuses to publish if mAP50 drops more than this...
+QUANT_MAX_READ_DROP = 0.02    # ...or the label read rate drops more than this
+
+# Change gating in front of inference: frames where the belt didn't change are not inferred
+MOTION_GATE = True
+MOTION_PIXEL_THRESHOLD = 12       # grey-level difference that counts as a changed pixel
+MOTION_MIN_CHANGED_FRACTION = 0.01 # fraction of changed pixels needed to run inference
+MOTION_MAX_SKIP = 30              # force inference after this many skipped frames
+MOTION_STATIC_ACTION = "reuse"    # "reuse" previous detections or "skip" (no detections)
+
+# Region of interest for YOLO: "off", "static" (CAMERA_ROIS) or "adaptive" (learned from detections)
+ROI_MODE = "off"
+CAMERA_ROIS = {
+    # "cam0": (0, 150, 640, 400),  # x1, y1, x2, y2 in frame pixels
+}
+ROI_IMGSZ = 320               # YOLO input size used on crops
+ROI_MARGIN = 40               # px added around the learned region
+ROI_ADAPTIVE_WINDOW = 100     # recent boxes the adaptive region is learned from
+ROI_ADAPTIVE_MIN_BOXES = 10   # full-frame inference until this many boxes were seen
+ROI_FULL_FRAME_EVERY = 50     # adaptive mode: still run a full frame every N frames
+
+# Capture mode: archive raw frames and detections to segmented files under CAPTURE_DIR
+CAPTURE_ENABLED = False
+CAPTURE_DIR = "captures"
+CAPTURE_SEGMENT_BYTES = 64 * 1024 * 1024    # rotate to a new segment after this many bytes...
+CAPTURE_SEGMENT_SECONDS = 600               # ...or this many seconds
+CAPTURE_RETENTION_BYTES = 2 * 1024 ** 3     # delete oldest segments above this total size
+CAPTURE_RETENTION_SECONDS = 24 * 3600       # and segments older than this
+CAPTURE_QUEUE_SIZE = 256                    # records waiting for the writer; more are dropped
+
+# Reusable buffers for overlay canvases and detector inputs (slots per frame shape)
+BUFFER_POOL = True
+BUFFER_POOL_SLOTS = 8
+BUFFER_POOL_SHAPES = 8    # distinct frame shapes pooled at once, least recently used dropped first
+MALLOC_TUNING = False     # raise glibc's mmap/trim thresholds so freed frame buffers stay in the heap
+
+# Headless dataset labelling (python -m app.cli autolabel), see app/autolabel.py
+AUTOLABEL_OUTPUT_DIR = "hasil_crop"
+AUTOLABEL_REVIEW_CONFIDENCE = 0.6   # auto boxes below this go to the review queue for teeet.py
+AUTOLABEL_DETECT_WIDTH = 800        # images are downscaled to this width to find the label box
@@ -1,11 +1,41 @@
-import mysql.connector
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from .config import DB_CONFIG
+from . import metrics
+from .config import (
+    DB_CONFIG, DB_BACKEND, SQLITE_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_QUEUE_SIZE,
+    DETECTION_CACHE_SIZE, QUERY_MAX_LIMIT, EXPORT_PAGE_SIZE,
+)
 
-def init_db():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    c = conn.cursor()
-    c.execute('''
+INSERT_COLUMNS = "(timestamp, detected_text, servo_id, confidence, bbox)"
+COLUMNS = ('timestamp', 'detected_text', 'servo_id', 'confidence', 'bbox')
+
+# Schema changes after the initial CREATE TABLE, applied once each by init_db
+# (plain SQL that both MySQL and SQLite accept)
+MIGRATIONS = [
+    (1, [
+        "CREATE INDEX idx_detections_timestamp ON detections (timestamp)",
+        "CREATE INDEX idx_detections_servo ON detections (servo_id, id)",
+        "CREATE INDEX idx_detections_text ON detections (detected_text, id)",
+    ]),
+    (2, [
+        # Per-servo rollups maintained by app.stats; bucket is 'YYYY-MM-DD HH:MM:00' / 'YYYY-MM-DD HH:00:00'
+        "CREATE TABLE stats_minute (bucket VARCHAR(19) NOT NULL, servo_id INT NOT NULL, "
+        "parcels INT NOT NULL, confidence_sum DOUBLE NOT NULL, PRIMARY KEY (bucket, servo_id))",
+        "CREATE TABLE stats_hour (bucket VARCHAR(19) NOT NULL, servo_id INT NOT NULL, "
+        "parcels INT NOT NULL, confidence_sum DOUBLE NOT NULL, PRIMARY KEY (bucket, servo_id))",
+    ]),
+]
+
+
+class MySQLBackend:
+    placeholder = "%s"
+    create_table = '''
         CREATE TABLE IF NOT EXISTS detections (
             id INT AUTO_INCREMENT PRIMARY KEY,
             timestamp DATETIME,
@@ -14,17 +44,360 @@ def init_db():
             confidence FLOAT,
             bbox TEXT
         )
-    ''')
-    conn.commit()
-    conn.close()
+    '''
+
+    minute_bucket = "DATE_FORMAT(timestamp, '%Y-%m-%d %H:%i:00')"
+    hour_bucket = "DATE_FORMAT(timestamp, '%Y-%m-%d %H:00:00')"
+    upsert_rollup = '''
+        INSERT INTO {table} (bucket, servo_id, parcels, confidence_sum) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE parcels = parcels + VALUES(parcels),
+                                confidence_sum = confidence_sum + VALUES(confidence_sum)
+    '''
+
+    def __init__(self, config=DB_CONFIG, pool_size=DB_POOL_SIZE, pool_timeout=DB_POOL_TIMEOUT):
+        from mysql.connector import pooling
+        self.pool = pooling.MySQLConnectionPool(pool_name="sorting", pool_size=pool_size, **config)
+        self.pool_timeout = pool_timeout
+
+    def _get_connection(self):
+        # get_connection() raises instead of blocking when every connection is out
+        from mysql.connector.errors import PoolError
+        deadline = time.monotonic() + self.pool_timeout
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    @contextmanager
+    def connection(self):
+        conn = self._get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()  # returns it to the pool
+
+    def inserted_ids(self, conn, cursor, count):
+        # A multi-row INSERT reports the id of its first row; the writer is the
+        # only inserter, so the batch got consecutive ids
+        return range(cursor.lastrowid, cursor.lastrowid + count)
+
+    def fetch_all(self, query, params=()):
+        with self.connection() as conn:
+            c = conn.cursor(dictionary=True)
+            c.execute(query, params)
+            return c.fetchall()
+
+
+class SQLiteBackend:
+    placeholder = "?"
+    create_table = '''
+        CREATE TABLE IF NOT EXISTS detections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            detected_text TEXT,
+            servo_id INTEGER,
+            confidence REAL,
+            bbox TEXT
+        )
+    '''
+
+    minute_bucket = "strftime('%Y-%m-%d %H:%M:00', timestamp)"
+    hour_bucket = "strftime('%Y-%m-%d %H:00:00', timestamp)"
+    upsert_rollup = '''
+        INSERT INTO {table} (bucket, servo_id, parcels, confidence_sum) VALUES (?, ?, ?, ?)
+        ON CONFLICT (bucket, servo_id) DO UPDATE SET parcels = parcels + excluded.parcels,
+                                                     confidence_sum = confidence_sum + excluded.confidence_sum
+    '''
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        # sqlite connections are per thread, keep one open per thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        yield conn
+
+    def inserted_ids(self, conn, cursor, count):
+        # lastrowid isn't set by executemany; the writer is the only inserter,
+        # so the batch ends at last_insert_rowid() with consecutive ids
+        last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return range(last - count + 1, last + 1)
+
+    def fetch_all(self, query, params=()):
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+
+def make_backend(name=DB_BACKEND):
+    if name == "mysql":
+        return MySQLBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown DB backend: {name}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend()
+        return _backend
+
+
+def init_db():
+    backend = get_backend()
+    with backend.connection() as conn:
+        c = conn.cursor()
+        c.execute(backend.create_table)
+        c.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL)")
+        c.execute("SELECT MAX(version) FROM schema_version")
+        current = c.fetchone()[0] or 0
+
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"Migrating detections schema to version {version}")
+            for statement in statements:
+                c.execute(statement)
+            c.execute(f"INSERT INTO schema_version (version) VALUES ({backend.placeholder})", (version,))
+        conn.commit()
+
+    # Warm the cache so /api/logs has history right after a restart
+    rows = fetch_logs(cache.size)
+    cache.extend(serialize_row(r) for r in reversed(rows))
+
+
+def serialize_row(row):
+    """A detection as the API returns it, whether it came from the cache or the database"""
+    timestamp = row['timestamp']
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    out = {'id': row.get('id')}
+    out.update({k: row[k] for k in COLUMNS})
+    out['timestamp'] = timestamp
+    return out
+
+
+def insert_detections(rows):
+    """Write detection dicts (COLUMNS keys) in one INSERT and set their 'id'"""
+    backend = get_backend()
+    marks = ", ".join([backend.placeholder] * 5)
+    query = f"INSERT INTO detections {INSERT_COLUMNS} VALUES ({marks})"
+    with backend.connection() as conn:
+        c = conn.cursor()
+        # mysql-connector rewrites executemany INSERTs into one multi-row statement
+        c.executemany(query, [tuple(row[k] for k in COLUMNS) for row in rows])
+        ids = backend.inserted_ids(conn, c, len(rows))
+        conn.commit()
+    for row, row_id in zip(rows, ids):
+        row['id'] = row_id
+
+
+def fetch_logs(limit=50):
+    backend = get_backend()
+    return backend.fetch_all(
+        f"SELECT * FROM detections ORDER BY id DESC LIMIT {backend.placeholder}", (limit,)
+    )
+
+
+def recent_logs(limit=50):
+    """Newest detections from the in-memory cache, the database only past its size.
+
+    Cached rows get their 'id' once the writer has flushed them (None until then).
+    """
+    rows = cache.recent(limit) if limit <= cache.size else fetch_logs(limit)
+    return [serialize_row(r) for r in rows]
+
+
+def query_detections(since=None, until=None, servo_id=None, text=None, cursor=None, limit=100):
+    """Filtered detections, newest first, with keyset pagination on id.
+
+    Returns (rows, next_cursor); pass next_cursor back as cursor for the next
+    page, it is None on the last page.
+    """
+    backend = get_backend()
+    mark = backend.placeholder
+    where, params = [], []
+    if since is not None:
+        where.append(f"timestamp >= {mark}")
+        params.append(since)
+    if until is not None:
+        where.append(f"timestamp < {mark}")
+        params.append(until)
+    if servo_id is not None:
+        where.append(f"servo_id = {mark}")
+        params.append(servo_id)
+    if text is not None:
+        where.append(f"detected_text = {mark}")
+        params.append(text)
+    if cursor is not None:
+        where.append(f"id < {mark}")
+        params.append(cursor)
+
+    limit = max(1, min(limit, QUERY_MAX_LIMIT))
+    query = "SELECT * FROM detections"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY id DESC LIMIT {mark}"
+
+    rows = [serialize_row(r) for r in backend.fetch_all(query, params + [limit])]
+    next_cursor = rows[-1]['id'] if len(rows) == limit else None
+    return rows, next_cursor
+
+
+def iter_detections(page_size=EXPORT_PAGE_SIZE, **filters):
+    """Every matching row, fetched page by page so exports don't load the whole table"""
+    cursor = None
+    while True:
+        rows, cursor = query_detections(cursor=cursor, limit=page_size, **filters)
+        yield from rows
+        if cursor is None:
+            return
+
+
+class DetectionCache:
+    """Ring buffer of the most recent detections, newest last"""
+
+    def __init__(self, size=DETECTION_CACHE_SIZE):
+        self.size = size
+        self.rows = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def append(self, row):
+        with self.lock:
+            self.rows.append(row)
+
+    def extend(self, rows):
+        with self.lock:
+            self.rows.extend(rows)
+
+    def recent(self, limit):
+        with self.lock:
+            return [self.rows[-i] for i in range(1, min(limit, len(self.rows)) + 1)]
+
+
+cache = DetectionCache()
+
+
+class DetectionWriter:
+    """Background writer that groups detections into batched INSERTs.
+
+    Flushes every DB_BATCH_SIZE rows or DB_FLUSH_INTERVAL seconds. When the
+    database is slow the queue fills up and new rows are dropped (and counted)
+    instead of blocking the inference worker.
+    """
+
+    def __init__(self, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL, maxsize=DB_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self.thread.start()
+
+    def put(self, row):
+        """Queue a detection dict; insert_detections fills in its 'id'"""
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _collect(self, rows):
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        rows = []
+        backoff = self.flush_interval
+        while True:
+            if not rows:
+                rows.append(self.queue.get())
+            rows = self._collect(rows)
+
+            try:
+                with metrics.timed('db_flush'):
+                    insert_detections(rows)
+                self.written += len(rows)
+                rows = []
+                backoff = self.flush_interval
+            except Exception as e:
+                # Keep the batch and retry; bounded so a dead DB can't grow memory
+                self.failed_flushes += 1
+                print(f"Error writing detections: {e}")
+                if len(rows) > self.queue.maxsize:
+                    self.dropped += len(rows) - self.queue.maxsize
+                    rows = rows[-self.queue.maxsize:]
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stats(self):
+        return {
+            'pending': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes,
+        }
+
+
+writer = DetectionWriter()
+
+metrics.register_gauge('db_pending', writer.queue.qsize)
+metrics.register_gauge('db_written', lambda: writer.written, kind="counter")
+metrics.register_gauge('db_dropped', lambda: writer.dropped, kind="counter")
+
+
+def start_writer():
+    try:
+        init_db()
+    except Exception as e:
+        print(f"Error initializing database: {e}")
+    writer.start()
+
+
+_listeners = []
+
+
+def on_detection_logged(callback):
+    """Register callback(timestamp, text, servo_id, confidence) to run for every logged detection"""
+    _listeners.append(callback)
+    return callback
+
 
 def log_detection(detected_text, servo_id, confidence, bbox):
-    conn = mysql.connector.connect(**DB_CONFIG)
-    c = conn.cursor()
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    query = "INSERT INTO detections (timestamp, detected_text, servo_id, confidence, bbox) VALUES (%s, %s, %s, %s, %s)"
-    values = (timestamp, detected_text, servo_id, confidence, str(bbox))
-    c.execute(query, values)
-    conn.commit()
-    conn.close()
+    row = dict(zip(COLUMNS, (timestamp, detected_text, servo_id, float(confidence), str(bbox))), id=None)
+    # The same dict goes to the cache and the writer, so the cached row gets its id on flush
+    cache.append(row)
+    writer.put(row)
+    for callback in _listeners:
+        callback(timestamp, detected_text, servo_id, float(confidence))
     return timestamp
@@ -1,52 +1,330 @@
+import threading
+import time
 import cv2
-from ultralytics import YOLO
-import easyocr
-from .controller import send_servo_command
-
-model = YOLO('best.pt')
-reader = easyocr.Reader(['en'], gpu=True)
-
-TEXT_SERVO_MAPPING = {
-    "A1": 1,
-    "A2": 2,
-    "A3": 3,
-    "A4": 4,
-    "A5": 5,
-    "A6": 6,
-}
-
-def process_frame(frame):
-    detections = []
-    results = model(frame, conf=0.5)
-
-    for result in results:
-        for box in result.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            cls = int(box.cls[0])
-            label = model.names[cls]
+import numpy as np
+from .servo import send_servo_command
+from .config import OCR_BATCH_WIDTH, OCR_BATCH_HEIGHT, OCR_MODE, TEXT_SERVO_MAPPING, TRACK_IOU_THRESHOLD
+from .config import OCR_GPU, MODEL_WARMUP, DETECTOR_BACKEND, ROI_IMGSZ
+from .config import OCR_ENGINE, CLASSIFIER_MODEL_PATH, CLASSIFIER_MIN_CONFIDENCE, OCR_CACHE
+from .backends import make_detector
+from .tracker import IouTracker, iou
+from .ocr import read_labels
+from .classifier import LabelClassifier, UNKNOWN
+from .ocr_cache import cache as ocr_cache, phash
+from . import metrics, roi, buffers
 
+DEFAULT_CAMERA = "cam0"
+
+STARTED_AT = time.perf_counter()
+
+
+class LazyModels:
+    """Detector, OCR reader and label classifier, loaded once on first use or by load_async()"""
+
+    def __init__(self):
+        self.detector = None
+        self.reader = None
+        self.classifier = None
+        self.ready = threading.Event()
+        self.error = None
+        self.load_seconds = None
+        self.first_detection_seconds = None
+        self._lock = threading.Lock()
+
+    def load(self, warmup=MODEL_WARMUP):
+        with self._lock:
+            if self.ready.is_set():
+                return
+            try:
+                start = time.perf_counter()
+                import easyocr
+                self.detector = make_detector(DETECTOR_BACKEND)
+                self.reader = easyocr.Reader(['en'], gpu=OCR_GPU)
+                if OCR_ENGINE == "classifier":
+                    self.classifier = LabelClassifier.load(CLASSIFIER_MODEL_PATH)
+                if warmup:
+                    self._warmup()
+                self.load_seconds = time.perf_counter() - start
+                print(f"Models ready in {self.load_seconds:.1f}s")
+                self.ready.set()
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error loading models: {e}")
+                raise
+
+    def _warmup(self):
+        """One pass on a synthetic frame so the first real frame doesn't pay for it"""
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(frame, "A1", (260, 260), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 6)
+        self.detector.detect([frame])
+        self.reader.recognize(cv2.cvtColor(frame[180:300, 220:420], cv2.COLOR_BGR2GRAY))
+
+    def load_async(self):
+        thread = threading.Thread(target=self.load, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def get(self):
+        if not self.ready.is_set():
+            self.load()
+        return self.detector, self.reader
+
+    def status(self):
+        return {
+            'ready': self.ready.is_set(),
+            'backend': DETECTOR_BACKEND,
+            'ocr_engine': OCR_ENGINE,
+            'error': self.error,
+            'load_seconds': self.load_seconds,
+            'first_detection_seconds': self.first_detection_seconds,
+        }
+
+
+models = LazyModels()
+
+# One tracker per camera. finish_frame updates it in the inference (or pool
+# collector) thread while confident_boxes reads it at submit, hence tracker.lock.
+trackers = {}
+
+def detect_boxes(frames, regions=None):
+    """Run batched detector passes, returns a list of (x1, y1, x2, y2, label) per frame.
+
+    Frames with a region (x1, y1, x2, y2) are cropped to it and run at ROI_IMGSZ;
+    their boxes are shifted back to frame coordinates.
+    """
+    detector, _ = models.get()
+    if not regions or not any(regions):
+        return detector.detect(list(frames))
+
+    boxes_per_frame = [None] * len(frames)
+    full = [i for i, r in enumerate(regions) if r is None]
+    cropped = [i for i, r in enumerate(regions) if r is not None]
+
+    if full:
+        for i, boxes in zip(full, detector.detect([frames[i] for i in full])):
+            boxes_per_frame[i] = boxes
+
+    crops = [frames[i][regions[i][1]:regions[i][3], regions[i][0]:regions[i][2]] for i in cropped]
+    for i, boxes in zip(cropped, detector.detect(crops, imgsz=ROI_IMGSZ)):
+        ox, oy = regions[i][:2]
+        boxes_per_frame[i] = [(x1 + ox, y1 + oy, x2 + ox, y2 + oy, label) for (x1, y1, x2, y2, label) in boxes]
+    metrics.inc('frames_cropped', len(cropped))
+
+    return boxes_per_frame
+
+def read_rois(rois, cameras=None):
+    """Read every ROI, returns one list of (bbox, text, confidence) per ROI.
+
+    cameras (one per ROI) scopes the OCR cache; reads are only reused within a camera.
+    """
+    if not rois:
+        return []
+
+    models.get()
+    if models.classifier is not None:
+        return classify_rois(rois, cameras)
+    return ocr_rois(rois, cameras)
+
+def classify_rois(rois, cameras=None):
+    """Label classifier first; crops it isn't sure about go to EasyOCR"""
+    outputs, unsure = [], []
+    for i, (roi, (label, conf)) in enumerate(zip(rois, models.classifier.predict(rois))):
+        if conf < CLASSIFIER_MIN_CONFIDENCE:
+            outputs.append([])
+            unsure.append(i)
+        elif label == UNKNOWN:
+            outputs.append([])
+        else:
+            h, w = roi.shape[:2]
+            outputs.append([([[0, 0], [w, 0], [w, h], [0, h]], label, conf)])
+
+    metrics.inc('classifier_reads', len(rois) - len(unsure))
+    metrics.inc('classifier_fallbacks', len(unsure))
+    if unsure:
+        unsure_cameras = [cameras[i] for i in unsure] if cameras else None
+        for i, result in zip(unsure, ocr_rois([rois[i] for i in unsure], unsure_cameras)):
+            outputs[i] = result
+    return outputs
+
+def ocr_rois(rois, cameras=None):
+    """EasyOCR for every ROI; cached reads are reused, the rest go in one batched call"""
+    if not rois or not OCR_CACHE:
+        return _run_ocr(rois)
+
+    cameras = cameras or [None] * len(rois)
+    keys = [phash(roi) for roi in rois]
+    outputs = [ocr_cache.get(key, camera) for key, camera in zip(keys, cameras)]
+    missing = [i for i, out in enumerate(outputs) if out is None]
+    if missing:
+        for i, result in zip(missing, _run_ocr([rois[i] for i in missing])):
+            outputs[i] = result
+            if result:
+                ocr_cache.put(keys[i], result, cameras[i])
+    return outputs
+
+def _run_ocr(rois):
+    if not rois:
+        return []
+
+    metrics.inc('ocr_calls')
+    _, reader = models.get()
+    if OCR_MODE == "constrained":
+        return read_labels(reader, rois)
+
+    return reader.readtext_batched(
+        rois,
+        n_width=OCR_BATCH_WIDTH,
+        n_height=OCR_BATCH_HEIGHT,
+        batch_size=len(rois)
+    )
+
+def get_tracker(camera):
+    tracker = trackers.get(camera)
+    if tracker is None:
+        tracker = trackers.setdefault(camera, IouTracker())
+    return tracker
+
+def confident_boxes(camera):
+    """Boxes of tracks that already have a confident read (no OCR needed)"""
+    tracker = get_tracker(camera)
+    with tracker.lock:
+        return [t.bbox for t in tracker.tracks if not t.needs_ocr]
+
+def infer(frames, skip_boxes=None, regions=None, cameras=None):
+    """YOLO + OCR without any per-camera state.
+
+    Boxes overlapping one of skip_boxes (per frame) are not sent to OCR.
+    YOLO only looks at regions[i] of frame i when it is set (see detect_boxes).
+    cameras[i] only scopes the OCR cache lookups of frame i.
+    Returns, per frame, a list of (box, ocr_results or None).
+    """
+    if skip_boxes is None:
+        skip_boxes = [[] for _ in frames]
+    if cameras is None:
+        cameras = [None] * len(frames)
+
+    with metrics.timed('yolo'):
+        boxes_per_frame = detect_boxes(frames, regions)
+
+    # Flatten ROIs of all frames, remember which box each one belongs to
+    rois, owners, roi_cameras = [], [], []
+    for i, (frame, boxes, skip) in enumerate(zip(frames, boxes_per_frame, skip_boxes)):
+        frame_rois = 0
+        for j, (x1, y1, x2, y2, label) in enumerate(boxes):
+            if any(iou((x1, y1, x2, y2), b) >= TRACK_IOU_THRESHOLD for b in skip): continue
             roi = frame[y1:y2, x1:x2]
             if roi.size == 0: continue
+            rois.append(roi)
+            owners.append((i, j))
+            roi_cameras.append(cameras[i])
+            frame_rois += 1
+        metrics.observe('ocr_rois_per_frame', frame_rois)
 
-            ocr_results = reader.readtext(roi)
+    with metrics.timed('ocr'):
+        ocr_outputs = read_rois(rois, roi_cameras)
+    metrics.inc('frames_processed', len(frames))
+    metrics.inc('ocr_rois', len(rois))
 
-            for (bbox, text, ocr_conf) in ocr_results:
-                text = text.strip().upper()
+    inferred = [[(box, None) for box in boxes] for boxes in boxes_per_frame]
+    for (i, j), ocr_results in zip(owners, ocr_outputs):
+        inferred[i][j] = (inferred[i][j][0], ocr_results)
+    return inferred
+
+def _fire(track):
+    """Send the track's servo command once; returns the servo id or None"""
+    servo_id = TEXT_SERVO_MAPPING.get(track.text)
+    if servo_id is None or track.fired:
+        return servo_id
+
+    with metrics.timed('servo_enqueue'):
+        send_servo_command(servo_id, track.id)
+    track.fired = True
+    if models.first_detection_seconds is None:
+        models.first_detection_seconds = time.perf_counter() - STARTED_AT
+        print(f"First detection {models.first_detection_seconds:.1f}s after startup")
+    return servo_id
+
+def _detection(track, servo_id, bbox, label, new):
+    return {
+        'text': track.text,
+        'servo': servo_id,
+        'confidence': track.confidence,
+        'bbox': list(bbox),
+        'object_label': label,
+        'track_id': track.id,
+        'new': new
+    }
+
+def finish_frame(frame, camera, inferred):
+    """Track, annotate and fire servos for one frame's inference output.
 
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, f"{label}: {text}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    A track fires once its read is confident (or was repeated
+    TRACK_FIRE_AFTER_READS times); a track leaving the frame fires on its best
+    read so far. Overlays go on a pooled canvas, the input frame is left
+    untouched; the caller owns one reference to the returned canvas
+    (buffers.release).
+    """
+    boxes = [box for box, _ in inferred]
+    roi.observe(camera, boxes)
 
+    tracker = get_tracker(camera)
+    # Pool mode reads the tracks for skip boxes from the submit thread (confident_boxes)
+    with tracker.lock:
+        with metrics.timed('track'):
+            tracks = tracker.update([b[:4] for b in boxes])
+
+        for track, (_, ocr_results) in zip(tracks, inferred):
+            for (bbox, text, ocr_conf) in ocr_results or []:
+                text = text.strip().upper()
                 if text in TEXT_SERVO_MAPPING:
-                    servo_id = TEXT_SERVO_MAPPING[text]
-                    detections.append({
-                        'text': text,
-                        'servo': servo_id,
-                        'confidence': ocr_conf,
-                        'bbox': [x1, y1, x2, y2],
-                        'object_label': label
-                    })
-
-                    send_servo_command(servo_id)
-                    cv2.circle(frame, (x2-20, y1+20), 10, (0, 255, 0), -1)
-
-    return frame, detections
+                    track.update_read(text, ocr_conf)
+
+        canvas = buffers.acquire(frame.shape, frame.dtype)
+        np.copyto(canvas, frame)
+
+        detections = []
+        for (x1, y1, x2, y2, label), track in zip(boxes, tracks):
+            if track.text is None: continue
+
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(canvas, f"{label}: {track.text} #{track.id}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+            new = track.ready_to_fire
+            servo_id = _fire(track) if new else TEXT_SERVO_MAPPING.get(track.text)
+            if servo_id is None: continue
+
+            detections.append(_detection(track, servo_id, (x1, y1, x2, y2), label, new))
+            if track.fired:
+                cv2.circle(canvas, (x2-20, y1+20), 10, (0, 255, 0), -1)
+
+        # Parcels that left before a confident read still get sorted on their best one
+        for track in tracker.expired:
+            if track.fired or track.text is None: continue
+            servo_id = _fire(track)
+            if servo_id is not None:
+                detections.append(_detection(track, servo_id, track.bbox, None, True))
+
+    return canvas, detections
+
+def process_batch(frames, cameras=None):
+    """Process several frames (from any camera) with one YOLO and one OCR call.
+
+    Boxes are tracked per camera; OCR only runs on boxes not already covered
+    by a track with a confident read, and the servo fires once per track.
+    """
+    if cameras is None:
+        cameras = [DEFAULT_CAMERA] * len(frames)
+
+    inferred = infer(
+        frames,
+        [confident_boxes(camera) for camera in cameras],
+        [roi.region_for(camera, frame.shape) for frame, camera in zip(frames, cameras)],
+        cameras
+    )
+    return [
+        finish_frame(frame, camera, result)
+        for frame, camera, result in zip(frames, cameras, inferred)
+    ]
+
+def process_frame(frame, camera=DEFAULT_CAMERA):
+    return process_batch([frame], [camera])[0]
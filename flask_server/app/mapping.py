@@ -0,0 +1,19 @@
+from .config import TEXT_SERVO_MAPPING
+
+_listeners = []
+
+
+def on_mapping_change(callback):
+    """Register callback(mapping) to run whenever TEXT_SERVO_MAPPING changes"""
+    _listeners.append(callback)
+    return callback
+
+
+def update_mapping(new_mapping):
+    """Update the shared mapping in place and notify listeners"""
+    TEXT_SERVO_MAPPING.update(
+        {str(text).strip().upper(): int(servo) for text, servo in new_mapping.items()}
+    )
+    for callback in _listeners:
+        callback(TEXT_SERVO_MAPPING)
+    return TEXT_SERVO_MAPPING
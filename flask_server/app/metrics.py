@@ -0,0 +1,145 @@
+"""Hot-path instrumentation for the vision pipeline.
+
+Stages are timed with ``timed('yolo')`` and kept in rolling windows so
+p50/p95/p99 reflect recent traffic. Counters are plain integers and gauges are
+callables registered by the module that owns the value (queue depths etc.).
+Everything is rendered as Prometheus text on /metrics.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from .config import METRICS_WINDOW, METRICS_PUSH_INTERVAL
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Rolling window of samples plus lifetime count and sum"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, qs=QUANTILES):
+        values = sorted(self.samples)
+        if not values:
+            return {q: 0.0 for q in qs}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in qs}
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+def observe(name, value):
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        _histograms[name].observe(value)
+
+
+@contextmanager
+def timed(stage):
+    """Time a block into the '<stage>' latency histogram (seconds)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"stage_{stage}", time.perf_counter() - start)
+
+
+def inc(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name, fn, kind="gauge"):
+    """Expose fn() under name; kind is the Prometheus type (gauge or counter)"""
+    _gauges[name] = (fn, kind)
+
+
+def snapshot():
+    """Plain dict of everything, used for the socket push and debugging"""
+    with _lock:
+        hist = {
+            name: dict(count=h.count, sum=round(h.sum, 6),
+                       **{f"p{int(q * 100)}": round(v, 6) for q, v in h.quantiles().items()})
+            for name, h in _histograms.items()
+        }
+        counters = dict(_counters)
+
+    gauges = {}
+    for name, (fn, _) in list(_gauges.items()):
+        try:
+            gauges[name] = fn()
+        except Exception:
+            continue
+    return {'histograms': hist, 'counters': counters, 'gauges': gauges}
+
+
+def render_prometheus(prefix="sorting"):
+    lines = []
+    typed = set()
+
+    def declare(metric, kind):
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} {kind}")
+
+    with _lock:
+        histograms = {name: (h.quantiles(), h.count, h.sum) for name, h in _histograms.items()}
+        counters = dict(_counters)
+
+    for name, (qs, count, total) in sorted(histograms.items()):
+        if name.startswith("stage_"):
+            metric, label = f"{prefix}_stage_seconds", f'stage="{name[6:]}",'
+        else:
+            metric, label = f"{prefix}_{name}", ""
+        declare(metric, "summary")
+        for q, v in qs.items():
+            lines.append(f'{metric}{{{label}quantile="{q}"}} {v:.6f}')
+        selector = f"{{{label.rstrip(',')}}}" if label else ""
+        lines.append(f"{metric}_count{selector} {count}")
+        lines.append(f"{metric}_sum{selector} {total:.6f}")
+
+    for name, value in sorted(counters.items()):
+        declare(f"{prefix}_{name}_total", "counter")
+        lines.append(f"{prefix}_{name}_total {value}")
+
+    for name, (fn, kind) in sorted(_gauges.items()):
+        try:
+            value = float(fn())
+        except Exception:
+            continue
+        metric = f"{prefix}_{name}_total" if kind == "counter" else f"{prefix}_{name}"
+        declare(metric, kind)
+        lines.append(f"{metric} {value:g}")
+
+    return "\n".join(lines) + "\n"
+
+
+_pusher = None
+
+
+def start_push(socketio, interval=METRICS_PUSH_INTERVAL):
+    """Periodically emit a 'metrics' event with snapshot() to the dashboard"""
+    global _pusher
+    if interval <= 0 or _pusher is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            socketio.emit('metrics', snapshot())
+
+    _pusher = threading.Thread(target=loop, name="metrics-push", daemon=True)
+    _pusher.start()
@@ -0,0 +1,51 @@
+import threading
+import cv2
+import numpy as np
+from .config import MOTION_PIXEL_THRESHOLD, MOTION_MIN_CHANGED_FRACTION, MOTION_MAX_SKIP
+
+
+def thumbnail(jpeg):
+    """Tiny grayscale version of a JPEG, decoded at 1/8 scale (much cheaper than a full decode)"""
+    thumb = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if thumb is None:
+        return None
+    return cv2.GaussianBlur(thumb, (3, 3), 0)
+
+
+class ChangeDetector:
+    """Frame differencing against the last frame that was sent to inference, per camera"""
+
+    def __init__(self, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                 min_changed_fraction=MOTION_MIN_CHANGED_FRACTION, max_skip=MOTION_MAX_SKIP):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip = max_skip
+        self.lock = threading.Lock()
+        self.reference = {}
+        self.skipped_in_row = {}
+        self.skipped = 0
+        self.passed = 0
+
+    def changed(self, camera, jpeg):
+        """True if the frame should go to inference"""
+        thumb = thumbnail(jpeg)
+        if thumb is None:
+            return True  # let the full decode report the bad image
+
+        with self.lock:
+            ref = self.reference.get(camera)
+            if ref is not None and ref.shape == thumb.shape:
+                diff = cv2.absdiff(ref, thumb)
+                fraction = np.count_nonzero(diff > self.pixel_threshold) / float(diff.size)
+                if fraction < self.min_changed_fraction and self.skipped_in_row.get(camera, 0) < self.max_skip:
+                    self.skipped_in_row[camera] = self.skipped_in_row.get(camera, 0) + 1
+                    self.skipped += 1
+                    return False
+
+            self.reference[camera] = thumb
+            self.skipped_in_row[camera] = 0
+            self.passed += 1
+            return True
+
+
+change_detector = ChangeDetector()
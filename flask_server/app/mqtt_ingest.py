@@ -0,0 +1,143 @@
+"""Frame ingest over MQTT.
+
+Cameras publish raw JPEG bytes to MQTT_TOPIC_FRAME (camera cam0) or
+MQTT_TOPIC_FRAME/<camera> on the plant broker (MQTT_BROKER:MQTT_PORT), which
+ingest subscribes to with its own client; the shared mqtt_client stays on the
+cloud broker for servo status. The paho network thread only does a non-blocking
+put into a small bounded queue; one ingest thread drains it into
+``pipeline.ingest_jpeg``, the same change gate / decode / frame queue stage as
+/upload. When inference falls behind, frames are dropped here and counted
+instead of stalling the MQTT loop (which would also delay keep-alives).
+"""
+import queue
+import threading
+from collections import namedtuple
+from paho.mqtt.client import topic_matches_sub
+from . import metrics
+from .config import MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_FRAME, MQTT_FRAME_QOS, MQTT_FRAME_QUEUE_SIZE
+from .detection import DEFAULT_CAMERA
+
+
+def camera_for_topic(topic, base=MQTT_TOPIC_FRAME):
+    if topic.startswith(base + '/'):
+        return topic[len(base) + 1:] or DEFAULT_CAMERA
+    return DEFAULT_CAMERA
+
+
+class BrokerSubscriber:
+    """paho client on the frame broker; subscriptions are renewed on every (re)connect"""
+
+    def __init__(self, host=MQTT_BROKER, port=MQTT_PORT):
+        import paho.mqtt.client as mqtt
+        self.host = host
+        self.port = port
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.subscriptions = []
+        self.started = False
+
+    def subscribe(self, topic, callback, qos=0):
+        """Route messages on topic to callback(client, userdata, msg); connects on first use"""
+        self.subscriptions.append((topic, qos))
+        self.client.message_callback_add(topic, callback)
+        if self.client.is_connected():
+            self.client.subscribe(topic, qos)
+        if not self.started:
+            # Doesn't block startup when the broker is down, paho keeps retrying
+            self.client.connect_async(self.host, self.port)
+            self.client.loop_start()
+            self.started = True
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        print(f"Frame ingest connected to {self.host}:{self.port} with result code {reason_code}")
+        for topic, qos in self.subscriptions:
+            client.subscribe(topic, qos)
+
+
+class FrameIngest:
+    def __init__(self, maxsize=MQTT_FRAME_QUEUE_SIZE, require_ready=True):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.require_ready = require_ready
+        self.thread = None
+        self.received = 0
+        self.ingested = 0
+        self.errors = 0
+        self.dropped = 0
+        self.not_ready = 0
+        self.subscriber = None
+
+    def start(self, subscribe=None, qos=MQTT_FRAME_QOS):
+        """Subscribe to the frame topics (defaults to MQTT_BROKER) and start draining"""
+        if subscribe is None:
+            self.subscriber = BrokerSubscriber()
+            subscribe = self.subscriber.subscribe
+        subscribe(MQTT_TOPIC_FRAME, self.on_frame, qos)
+        subscribe(MQTT_TOPIC_FRAME + '/+', self.on_frame, qos)
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="mqtt-ingest", daemon=True)
+            self.thread.start()
+
+    def on_frame(self, client, userdata, msg):
+        self.received += 1
+        try:
+            self.queue.put_nowait((camera_for_topic(msg.topic), msg.payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        from .pipeline import ingest_jpeg, inference_ready
+
+        while True:
+            camera, jpeg = self.queue.get()
+            if self.require_ready and not inference_ready():
+                self.not_ready += 1
+                continue
+            try:
+                status, _ = ingest_jpeg(jpeg, camera)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error ingesting MQTT frame from {camera}: {e}")
+                continue
+            metrics.inc(f'mqtt_frames_{status}')
+            self.ingested += 1
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'ingested': self.ingested,
+            'errors': self.errors,
+            'pending': self.queue.qsize(),
+            'dropped': self.dropped,
+            'not_ready': self.not_ready,
+        }
+
+
+Message = namedtuple('Message', 'topic payload qos')
+
+
+class LoopbackBroker:
+    """In-process stand-in for a broker: publish() delivers to matching subscribers
+    synchronously, so the ingest path can be exercised without mosquitto"""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, topic, callback, qos=0):
+        self.subscribers.append((topic, callback))
+
+    def publish(self, topic, payload, qos=0):
+        delivered = 0
+        for sub, callback in self.subscribers:
+            if topic_matches_sub(sub, topic):
+                callback(self, None, Message(topic, payload, qos))
+                delivered += 1
+        return delivered
+
+
+ingest = FrameIngest()
+
+metrics.register_gauge('mqtt_frame_queue_depth', ingest.queue.qsize)
+metrics.register_gauge('mqtt_frames_received', lambda: ingest.received, kind="counter")
+metrics.register_gauge('mqtt_frames_dropped', lambda: ingest.dropped, kind="counter")
+metrics.register_gauge('mqtt_frames_errors', lambda: ingest.errors, kind="counter")
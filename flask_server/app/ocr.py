@@ -0,0 +1,102 @@
+"""Constrained label recognition.
+
+Every label we sort on is a TEXT_SERVO_MAPPING key, so the recognizer only
+needs those characters and the YOLO box already is the text region: EasyOCR's
+detection stage is skipped and all ROIs go through ``reader.recognize`` in one
+batch. Near-misses are snapped to the closest key.
+"""
+import difflib
+import re
+import threading
+import cv2
+import numpy as np
+from .config import TEXT_SERVO_MAPPING, OCR_SNAP_MIN_RATIO
+from .mapping import on_mapping_change
+
+
+class Vocabulary:
+    def __init__(self, mapping):
+        self.keys = sorted(mapping)
+        self.charset = ''.join(sorted(set(''.join(self.keys))))
+
+    def snap(self, text, conf, min_ratio=OCR_SNAP_MIN_RATIO):
+        """Return (key, score) for the closest mapping key, or None"""
+        text = re.sub(r'[^0-9A-Z]', '', text.upper())
+        if not text:
+            return None
+        if text in self.keys:
+            return text, conf
+
+        scored = sorted(
+            ((difflib.SequenceMatcher(None, text, key).ratio(), key) for key in self.keys),
+            reverse=True
+        )
+        best_ratio, best_key = scored[0]
+        # Ambiguous near-miss (e.g. just "A"): refuse rather than guess
+        if best_ratio < min_ratio or (len(scored) > 1 and scored[1][0] == best_ratio):
+            return None
+        return best_key, conf * best_ratio
+
+
+_vocab = Vocabulary(TEXT_SERVO_MAPPING)
+_vocab_lock = threading.Lock()
+
+
+@on_mapping_change
+def rebuild_vocabulary(mapping):
+    global _vocab
+    with _vocab_lock:
+        _vocab = Vocabulary(mapping)
+    print(f"OCR vocabulary rebuilt: {_vocab.keys} (charset {_vocab.charset})")
+
+
+def vocabulary():
+    return _vocab
+
+
+def _stack_rois(rois):
+    """Stack grayscale ROIs vertically into one canvas, returns canvas and boxes"""
+    grays = [cv2.cvtColor(r, cv2.COLOR_BGR2GRAY) if r.ndim == 3 else r for r in rois]
+    width = max(g.shape[1] for g in grays)
+    height = sum(g.shape[0] for g in grays)
+
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+    boxes, y = [], 0
+    for g in grays:
+        h, w = g.shape
+        canvas[y:y + h, :w] = g
+        boxes.append([0, w, y, y + h])
+        y += h
+    return canvas, boxes
+
+
+def read_labels(reader, rois):
+    """Recognize each ROI against the mapping vocabulary.
+
+    Returns one list per ROI in readtext format: [(bbox, key, score)].
+    """
+    if not rois:
+        return []
+
+    vocab = vocabulary()
+    canvas, boxes = _stack_rois(rois)
+    raw = reader.recognize(
+        canvas,
+        horizontal_list=boxes,
+        free_list=[],
+        allowlist=vocab.charset,
+        batch_size=len(boxes),
+        reformat=False
+    )
+
+    # Results come back sorted by y; map them back through each ROI's top edge
+    index_by_top = {box[2]: i for i, box in enumerate(boxes)}
+    outputs = [[] for _ in rois]
+    for bbox, text, conf in raw:
+        i = index_by_top.get(int(bbox[0][1]))
+        if i is None:
+            continue
+        snapped = vocab.snap(text, conf)
+        if snapped is not None:
+            outputs[i].append((bbox, snapped[0], snapped[1]))
+    return outputs
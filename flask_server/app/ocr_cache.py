@@ -0,0 +1,97 @@
+"""OCR result cache keyed by a perceptual hash of the ROI.
+
+A parcel that sits still (belt stopped, or re-sent through /upload_web)
+produces nearly identical crops; their 256-bit DCT hashes differ in a few bits
+at most, so the nearest cached hash within OCR_CACHE_HAMMING bits is reused.
+Labels differ only in a digit, so the hash keeps 16x16 DCT frequencies (8x8
+put some label pairs 4 bits apart) and entries are per camera: a crop is only
+ever matched against crops from the same camera. Only non-empty reads are
+cached. Everything is dropped when the mapping changes, since reads are
+snapped to the mapping keys.
+"""
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from . import metrics
+from .config import OCR_CACHE_SIZE, OCR_CACHE_TTL, OCR_CACHE_HAMMING
+from .mapping import on_mapping_change
+
+
+def phash(roi):
+    """256-bit pHash: sign of the 16x16 lowest DCT frequencies against their median"""
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:16, :16].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class OcrCache:
+    def __init__(self, size=OCR_CACHE_SIZE, ttl=OCR_CACHE_TTL, tolerance=OCR_CACHE_HAMMING):
+        self.size = size
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.entries = OrderedDict()  # (camera, hash) -> (result, stored at)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, camera=None):
+        now = time.monotonic()
+        with self.lock:
+            match = (camera, key) if (camera, key) in self.entries else None
+            if match is None and self.tolerance:
+                # Nearest hash from the same camera, newest first on ties
+                best = self.tolerance + 1
+                for k in reversed(self.entries):
+                    if k[0] != camera:
+                        continue
+                    distance = bin(k[1] ^ key).count('1')
+                    if distance < best:
+                        match, best = k, distance
+
+            if match is not None:
+                result, stored = self.entries[match]
+                if now - stored <= self.ttl:
+                    self.entries.move_to_end(match)
+                    self.hits += 1
+                    return result
+                del self.entries[match]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result, camera=None):
+        with self.lock:
+            self.entries[(camera, key)] = (result, time.monotonic())
+            self.entries.move_to_end((camera, key))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+cache = OcrCache()
+
+
+@on_mapping_change
+def invalidate(mapping):
+    cache.clear()
+
+
+metrics.register_gauge('ocr_cache_entries', lambda: len(cache.entries))
+metrics.register_gauge('ocr_cache_hits', lambda: cache.hits, kind="counter")
+metrics.register_gauge('ocr_cache_misses', lambda: cache.misses, kind="counter")
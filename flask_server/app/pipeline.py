@@ -0,0 +1,277 @@
+import atexit
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from . import socketio
+from .broadcast import broadcaster
+from .config import FRAME_QUEUE_SIZE, FRAME_DROP_POLICY, BATCH_MAX_FRAMES, BATCH_MAX_WAIT_MS, INFERENCE_WORKERS
+from .config import MOTION_GATE, MOTION_STATIC_ACTION
+from .motion import change_detector
+from .capture import writer as capture_writer
+from .detection import process_batch, finish_frame, confident_boxes, models, DEFAULT_CAMERA
+from .database import log_detection
+from . import metrics, roi, buffers
+
+
+class FrameQueue:
+    """Bounded frame queue between the HTTP ingest and the inference worker"""
+
+    def __init__(self, maxsize=FRAME_QUEUE_SIZE, policy=FRAME_DROP_POLICY):
+        if policy not in ("drop_oldest", "latest_only"):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, frame, camera=DEFAULT_CAMERA, reply=None, seq=None):
+        with self.cond:
+            if self.policy == "latest_only":
+                # Keep only the newest frame per camera
+                stale = [item for item in self.items if item[1] == camera]
+                for item in stale:
+                    self.items.remove(item)
+                    self._drop(item)
+
+            if len(self.items) >= self.maxsize:
+                self._drop(self.items.popleft())
+
+            self.items.append((frame, camera, reply, time.perf_counter(), seq))
+            self.cond.notify()
+            return len(self.items)
+
+    def get_batch(self, max_frames=BATCH_MAX_FRAMES, max_wait_ms=BATCH_MAX_WAIT_MS):
+        """Block for the first frame, then collect more until max_frames or max_wait_ms"""
+        with self.cond:
+            while not self.items:
+                self.cond.wait()
+
+            deadline = time.perf_counter() + max_wait_ms / 1000.0
+            while len(self.items) < max_frames:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+
+            batch = []
+            while self.items and len(batch) < max_frames:
+                batch.append(self.items.popleft())
+            return batch
+
+    def __len__(self):
+        return len(self.items)
+
+    def _drop(self, item):
+        reply = item[2]
+        self.dropped += 1
+        if reply is not None:
+            reply.cancel()
+
+
+frame_queue = FrameQueue()
+_worker = None
+# Frame sequence numbers, written to both capture records so frames and detections can be joined
+_frame_ids = itertools.count()
+_pool = None
+
+# Last detections per camera, reused for frames the change gate skips
+last_detections = {}
+
+metrics.register_gauge('frame_queue_depth', lambda: len(frame_queue))
+metrics.register_gauge('frames_dropped', lambda: frame_queue.dropped, kind="counter")
+metrics.register_gauge('frames_skipped_static', lambda: change_detector.skipped, kind="counter")
+
+
+def submit_frame(frame, camera=DEFAULT_CAMERA, wait=False, seq=None):
+    """Queue a decoded frame; returns a Future when the caller wants the result"""
+    reply = Future() if wait else None
+    frame_queue.put(frame, camera, reply, next(_frame_ids) if seq is None else seq)
+    return reply
+
+
+def ingest_jpeg(jpeg, camera=DEFAULT_CAMERA, wait=False):
+    """Ingest stage shared by every frame source: change gate, decode, queue.
+
+    Returns (status, detections) where status is 'queued', 'skipped' (no
+    significant change since the last inferred frame) or 'invalid'. With
+    wait set, a queued frame returns its Future in place of the detections.
+    """
+    if MOTION_GATE:
+        with metrics.timed('change_gate'):
+            changed = change_detector.changed(camera, jpeg)
+        if not changed:
+            # The last annotated frame stays on screen, nothing to publish
+            reused = last_detections.get(camera, []) if MOTION_STATIC_ACTION == "reuse" else []
+            # Already logged and fired when they were inferred
+            reused = [dict(det, new=False) for det in reused]
+            capture_writer.record('frame', camera, jpeg, {'status': 'skipped', 'seq': next(_frame_ids), 'detections': reused})
+            return 'skipped', reused
+
+    with metrics.timed('decode'):
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return 'invalid', None
+
+    seq = next(_frame_ids)
+    capture_writer.record('frame', camera, jpeg, {'status': 'queued', 'seq': seq})
+    return 'queued', submit_frame(frame, camera, wait, seq)
+
+
+def _publish(processed_frame, detections, camera, seq=None):
+    # Encoded once, shared by /video_feed viewers and socket clients
+    with metrics.timed('encode'):
+        jpeg = broadcaster.publish(processed_frame, camera)
+    last_detections[camera] = detections
+    capture_writer.record('detections', camera, meta={'seq': seq, 'detections': detections})
+
+    # Only the first read of each tracked parcel is logged
+    for det in detections:
+        if not det.get('new'):
+            continue
+        with metrics.timed('db_log'):
+            timestamp = log_detection(det['text'], det['servo'], det['confidence'], det['bbox'])
+        socketio.emit('new_detection', {
+            'timestamp': timestamp,
+            'text': det['text'],
+            'servo': det['servo'],
+            'confidence': det['confidence'],
+            'track_id': det['track_id'],
+            'camera': camera
+        })
+
+    return jpeg
+
+
+def _inference_loop():
+    """Single worker that owns the model and drains the frame queue in micro-batches"""
+    while True:
+        process_queued(frame_queue.get_batch())
+
+
+def process_queued(batch):
+    """Infer and publish one batch of FrameQueue items.
+
+    With INFERENCE_WORKERS > 0 the frames are handed to the process pool instead.
+    """
+    batch = [
+        item for item in batch
+        if item[2] is None or item[2].set_running_or_notify_cancel()
+    ]
+    if not batch:
+        return
+
+    now = time.perf_counter()
+    for _, _, _, queued_at, _ in batch:
+        metrics.observe('stage_queue_wait', now - queued_at)
+    metrics.observe('batch_size', len(batch))
+
+    pool = _pool
+    if pool is not None:
+        for frame, camera, reply, _, seq in batch:
+            try:
+                pool.submit(frame, camera, reply, confident_boxes(camera), roi.region_for(camera, frame.shape), seq)
+            except Exception as e:
+                print(f"Error submitting frame from {camera}: {e}")
+                if reply is not None:
+                    reply.set_exception(e)
+        return
+
+    try:
+        outputs = process_batch(
+            [frame for frame, _, _, _, _ in batch],
+            [camera for _, camera, _, _, _ in batch]
+        )
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        for _, _, reply, _, _ in batch:
+            if reply is not None:
+                reply.set_exception(e)
+        return
+
+    # Route every result back to the camera (and caller) it came from
+    for (_, camera, reply, _, seq), (processed_frame, detections) in zip(batch, outputs):
+        _deliver(processed_frame, detections, camera, reply, seq)
+
+
+def _deliver(processed_frame, detections, camera, reply, seq=None):
+    try:
+        jpeg = _publish(processed_frame, detections, camera, seq)
+        if reply is not None:
+            reply.set_result((detections, jpeg))
+    except Exception as e:
+        print(f"Error publishing frame from {camera}: {e}")
+        if reply is not None:
+            reply.set_exception(e)
+    finally:
+        # The broadcaster keeps its own reference to the canvas
+        buffers.release(processed_frame)
+
+
+def _on_pool_result(frame, camera, reply, inferred, error, seq=None):
+    """Called by the pool collector, in frame order per camera"""
+    if error is not None:
+        print(f"Error processing frame from {camera}: {error}")
+        if reply is not None:
+            reply.set_exception(RuntimeError(error))
+        return
+
+    processed_frame, detections = finish_frame(frame, camera, inferred)
+    _deliver(processed_frame, detections, camera, reply, seq)
+
+
+def _on_pool_failed():
+    """No worker process could load the models: run inference in this process instead"""
+    global _pool
+    pool, _pool = _pool, None
+    print("All inference workers failed, falling back to in-process inference")
+    models.load_async()
+    pool.close()
+
+
+def inference_ready():
+    pool = _pool
+    if pool is not None:
+        return pool.ready
+    return models.ready.is_set()
+
+
+def inference_status():
+    status = models.status()
+    status['ready'] = inference_ready()
+    pool = _pool
+    if pool is not None:
+        status['workers_ready'] = pool.ready_workers
+        status['workers'] = pool.status()
+        errors = [w['error'] for w in status['workers'] if w['error']]
+        status['error'] = "; ".join(errors) or None
+    return status
+
+
+metrics.register_gauge('inference_ready', lambda: int(inference_ready()))
+metrics.register_gauge('model_load_seconds', lambda: models.load_seconds)
+metrics.register_gauge('first_detection_seconds', lambda: models.first_detection_seconds)
+
+
+def start_inference_worker():
+    global _worker, _pool
+    if _worker is not None and _worker.is_alive():
+        return _worker
+
+    if INFERENCE_WORKERS > 0:
+        from .workers import InferencePool
+        _pool = InferencePool(INFERENCE_WORKERS)
+        _pool.start(_on_pool_result, _on_pool_failed)
+        # Stop the workers and unlink the shared-memory slots on shutdown
+        atexit.register(_pool.close)
+    else:
+        # Bind the port right away, load and warm the models in the background
+        models.load_async()
+
+    _worker = threading.Thread(target=_inference_loop, name="inference-worker", daemon=True)
+    _worker.start()
+    return _worker
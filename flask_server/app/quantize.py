@@ -0,0 +1,248 @@
+"""INT8 post-training quantization of the detector.
+
+best.pt is exported to FP32 ONNX, then quantized with ONNX Runtime static
+quantization (QDQ, per-channel weights) using activation ranges calibrated on
+the train images listed in data.yaml. The result is scored on the val images
+against best.pt itself: box mAP50 against the YOLO label files, and the label
+read rate (ground-truth labels whose detected crop reads as a mapping key).
+It is only written to ONNX_INT8_MODEL_PATH if neither drops by more than
+QUANT_MAX_MAP_DROP / QUANT_MAX_READ_DROP; the server picks it up with
+DETECTOR_BACKEND = "onnx_int8".
+"""
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from . import buffers
+from .backends import ExportedDetector, DATA_YAML
+from .config import DETECTOR_IMGSZ, DETECTOR_CONF, TEXT_SERVO_MAPPING
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+MAP_IOU = 0.5
+
+
+def dataset_images(split, data_yaml=DATA_YAML, limit=None):
+    """Image paths for a data.yaml split; relative entries resolve against its
+    ``path`` key or, failing that, the yaml's own folder"""
+    import yaml
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or os.path.dirname(os.path.abspath(data_yaml))
+    entries = data[split] if isinstance(data[split], list) else [data[split]]
+
+    paths = []
+    for entry in entries:
+        entry = entry if os.path.isabs(entry) else os.path.join(root, entry)
+        if os.path.isdir(entry):
+            paths.extend(sorted(
+                p for p in glob.glob(os.path.join(entry, '**', '*'), recursive=True)
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        elif entry.endswith('.txt') and os.path.exists(entry):
+            # A list of image paths, one per line
+            with open(entry) as f:
+                paths.extend(os.path.join(root, line.strip()) for line in f if line.strip())
+    return paths[:limit] if limit else paths
+
+
+def label_path(image_path):
+    """YOLO layout: .../images/x.jpg -> .../labels/x.txt"""
+    head, _, tail = image_path.rpartition(os.sep + 'images' + os.sep)
+    stem = os.path.splitext(tail)[0] + '.txt'
+    return os.path.join(head, 'labels', stem) if head else os.path.splitext(image_path)[0] + '.txt'
+
+
+def load_labels(image_path, shape):
+    """Ground-truth (x1, y1, x2, y2, class_id) in pixels; empty if there's no label file"""
+    path = label_path(image_path)
+    if not os.path.exists(path):
+        return []
+    h, w = shape[:2]
+    boxes = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cls, cx, cy, bw, bh = int(parts[0]), *map(float, parts[1:5])
+            boxes.append((
+                int((cx - bw / 2) * w), int((cy - bh / 2) * h),
+                int((cx + bw / 2) * w), int((cy + bh / 2) * h), cls,
+            ))
+    return boxes
+
+
+class CalibrationReader:
+    """onnxruntime CalibrationDataReader over letterboxed images, one per batch"""
+
+    def __init__(self, paths, input_name, imgsz=DETECTOR_IMGSZ):
+        self.paths = iter(paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.prep = ExportedDetector(None, imgsz)
+
+    def get_next(self):
+        for path in self.paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            blob, _ = self.prep.preprocess([frame], self.imgsz)
+            batch = {self.input_name: blob.copy()}
+            buffers.release(blob)
+            return batch
+        return None
+
+
+def head_nodes(model_path):
+    """Nodes of the last module (the Detect head: DFL decode, sigmoid, concat).
+    Box regression is the most quantization-sensitive part, so it can stay FP32."""
+    import onnx
+    model = onnx.load(model_path)
+    prefixes = [n.name.split('/')[1] for n in model.graph.node if n.name.startswith('/model.')]
+    if not prefixes:
+        return []
+    last = max(prefixes, key=lambda p: int(p.split('.')[1]) if p.split('.')[1].isdigit() else -1)
+    return [n.name for n in model.graph.node if n.name.startswith(f'/{last}/')]
+
+
+def quantize_model(fp32_path, out_path, calibration_paths, imgsz=DETECTOR_IMGSZ, exclude_head=True):
+    """Static INT8 quantization of an FP32 ONNX detector; returns out_path"""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = out_path + '.prep.onnx'
+    quant_pre_process(fp32_path, prepared)
+    try:
+        input_name = ort.InferenceSession(prepared, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        quantize_static(
+            prepared, out_path,
+            CalibrationReader(calibration_paths, input_name, imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=head_nodes(prepared) if exclude_head else [],
+        )
+    finally:
+        os.remove(prepared)
+
+    # Keep the ultralytics metadata (names, imgsz) OnnxDetector reads
+    fp32, int8 = onnx.load(fp32_path), onnx.load(out_path)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, out_path)
+    return out_path
+
+
+def average_precision(predictions, n_truth):
+    """All-point interpolated AP from (score, is_true_positive) pairs"""
+    if n_truth == 0:
+        return None
+    if not predictions:
+        return 0.0
+    predictions = sorted(predictions, key=lambda p: -p[0])
+    tp = np.cumsum([hit for _, hit in predictions])
+    fp = np.cumsum([not hit for _, hit in predictions])
+    recall = np.concatenate([[0.0], tp / n_truth, [1.0]])
+    precision = np.concatenate([[1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum((recall[1:] - recall[:-1]) * precision[1:]))
+
+
+def _match(truth, predictions, min_iou=MAP_IOU):
+    """Greedy match in score order; returns (is_tp per prediction, prediction index per truth)"""
+    from .tracker import iou
+
+    hits, matched = [], [None] * len(truth)
+    for j in sorted(range(len(predictions)), key=lambda j: -predictions[j][5]):
+        best, best_iou = None, min_iou
+        for i, gt in enumerate(truth):
+            if matched[i] is None and gt[4] == predictions[j][4]:
+                overlap = iou(gt[:4], predictions[j][:4])
+                if overlap >= best_iou:
+                    best, best_iou = i, overlap
+        if best is not None:
+            matched[best] = j
+        hits.append((j, best is not None))
+    hits.sort()
+    return [hit for _, hit in hits], matched
+
+
+def evaluate(detector, paths, map_conf=0.001, read_conf=DETECTOR_CONF):
+    """mAP50 and label read rate of a detector on labelled images"""
+    from .detection import read_rois
+    from .ocr_cache import cache
+
+    # Reads cached while scoring one model must not carry over to the next
+    cache.clear()
+    class_ids = {name: i for i, name in (detector.names or {}).items()}
+    per_class, n_truth = {}, {}
+    read_ok, n_labels, frames = 0, 0, 0
+
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        truth = load_labels(path, frame.shape)
+
+        boxes = detector.detect([frame], conf=map_conf, with_scores=True)[0]
+        frames += 1
+
+        predictions = [(x1, y1, x2, y2, class_ids.get(label, 0), score) for x1, y1, x2, y2, label, score in boxes]
+        hits, _ = _match(truth, predictions)
+        for (*_, cls, score), hit in zip(predictions, hits):
+            per_class.setdefault(cls, []).append((score, hit))
+        for gt in truth:
+            n_truth[gt[4]] = n_truth.get(gt[4], 0) + 1
+
+        # Read rate only counts boxes the server would act on
+        confident = [p for p in predictions if p[5] >= read_conf]
+        _, matched = _match(truth, confident)
+        rois = []
+        for j in matched:
+            if j is not None:
+                x1, y1, x2, y2 = confident[j][:4]
+                if x2 > x1 and y2 > y1:
+                    rois.append(frame[y1:y2, x1:x2])
+        for results in read_rois(rois):
+            if any(text.strip().upper() in TEXT_SERVO_MAPPING for _, text, _ in results):
+                read_ok += 1
+        n_labels += len(truth)
+
+    aps = [average_precision(per_class.get(cls, []), n) for cls, n in n_truth.items()]
+    aps = [ap for ap in aps if ap is not None]
+    return {
+        'frames': frames,
+        'labels': n_labels,
+        'map50': sum(aps) / len(aps) if aps else 0.0,
+        'read_rate': read_ok / n_labels if n_labels else 0.0,
+    }
+
+
+def time_detector(detector, paths, limit=50, warmup=3):
+    """Median ms/frame at the production confidence threshold"""
+    frames = [f for f in (cv2.imread(p) for p in paths[:limit]) if f is not None]
+    for frame in frames[:warmup]:
+        detector.detect([frame])
+    timings = []
+    for frame in frames:
+        t0 = time.perf_counter()
+        detector.detect([frame])
+        timings.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(timings)) if timings else 0.0
+
+
+def gate(reference, candidate, max_map_drop, max_read_drop):
+    """Reasons the candidate can't be published; empty if it passes"""
+    failures = []
+    map_drop = reference['map50'] - candidate['map50']
+    read_drop = reference['read_rate'] - candidate['read_rate']
+    if map_drop > max_map_drop:
+        failures.append(f"mAP50 dropped {map_drop:.4f} (max {max_map_drop})")
+    if read_drop > max_read_drop:
+        failures.append(f"read rate dropped {read_drop:.4f} (max {max_read_drop})")
+    return failures
@@ -0,0 +1,226 @@
+"""Offline replay of recorded frames through the detection pipeline.
+
+Frames go through the live code path (pipeline.ingest_jpeg, then the
+inference worker's process_queued, publish and database.log_detection) but
+one at a time on the calling thread. Everything that leaves the process is
+replaced by in-memory recorders: servo commands, the database writer and
+cache, detection listeners, the capture writer and socket events. A run is
+reproducible and needs neither the ESP32 controller nor MySQL.
+"""
+import glob
+import json
+import os
+import time
+from contextlib import contextmanager
+from . import detection, database, pipeline, broadcast, metrics
+
+REPORT_STAGES = ('change_gate', 'decode', 'yolo', 'ocr', 'track', 'servo_enqueue', 'encode', 'db_log')
+
+
+def folder_source(folder, fps=10.0):
+    """(name, timestamp, jpeg bytes) for every JPEG in folder, spaced 1/fps apart"""
+    paths = sorted(
+        p for p in glob.glob(os.path.join(folder, '*'))
+        if p.lower().endswith(('.jpg', '.jpeg'))
+    )
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            yield os.path.basename(path), i / fps, f.read()
+
+
+def capture_source(directory, camera=None, start=None, end=None):
+    """/upload frames archived by capture mode, with their original timestamps"""
+    from .capture import CaptureReader
+
+    for record in CaptureReader(directory).records(start, end, kinds=['frame'], camera=camera):
+        yield f"{record.camera}@{record.timestamp:.3f}", record.timestamp, record.jpeg
+
+
+def mjpeg_source(path, fps=10.0):
+    """Frames of a raw MJPEG dump (e.g. curl http://server/video_feed > belt.mjpg)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    i, start = 0, data.find(b'\xff\xd8')
+    while start != -1:
+        end = data.find(b'\xff\xd9', start)
+        if end == -1:
+            break
+        yield f"{os.path.basename(path)}#{i}", i / fps, data[start:end + 2]
+        i += 1
+        start = data.find(b'\xff\xd8', end + 2)
+
+
+class StubSinks:
+    """Records what the pipeline would send out instead of sending it"""
+
+    def __init__(self):
+        self.servo_commands = []
+        self.log_rows = []
+        self.events = []
+        self.captured = 0
+        self.frame = None
+
+    def send_servo_command(self, servo_id, command_id=None):
+        self.servo_commands.append((self.frame, servo_id))
+        return True
+
+    def put(self, row):
+        """database.writer: rows log_detection would have written"""
+        self.log_rows.append((self.frame, row))
+        return True
+
+    def record(self, kind, camera, jpeg=b'', meta=None):
+        """pipeline.capture_writer"""
+        self.captured += 1
+
+    def emit(self, event, data=None, **kwargs):
+        """pipeline.socketio / broadcast.socketio"""
+        self.events.append((self.frame, event))
+
+
+@contextmanager
+def stubbed_sinks():
+    sinks = StubSinks()
+    patches = [
+        (detection, 'send_servo_command', sinks.send_servo_command),
+        (database, 'writer', sinks),
+        (database, 'cache', database.DetectionCache()),
+        (database, '_listeners', []),
+        (pipeline, 'capture_writer', sinks),
+        (pipeline, 'socketio', sinks),
+        (broadcast, 'socketio', sinks),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield sinks
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+
+
+def _summary(detections):
+    return [
+        {'text': d['text'], 'servo': d['servo'], 'bbox': d['bbox'], 'track_id': d['track_id']}
+        for d in detections
+    ]
+
+
+def replay(source, camera=detection.DEFAULT_CAMERA, speed=0.0):
+    """Run every frame of source through the pipeline.
+
+    speed 0 runs as fast as possible, 1.0 is real time, 2.0 twice as fast.
+    Returns (results, sinks, wall seconds) where results has one entry per frame.
+    """
+    results = []
+    with stubbed_sinks() as sinks:
+        start = time.perf_counter()
+        first_ts = None
+
+        for name, ts, jpeg in source:
+            if speed > 0:
+                if first_ts is None:
+                    first_ts = ts
+                delay = (ts - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            sinks.frame = name
+            status, out = pipeline.ingest_jpeg(jpeg, camera, wait=True)
+            if status == 'invalid':
+                results.append({'frame': name, 'status': 'invalid', 'detections': []})
+                continue
+            if status == 'skipped':
+                results.append({'frame': name, 'status': 'skipped', 'detections': _summary(out)})
+                continue
+
+            # What the inference worker does for the frame, on this thread
+            pipeline.process_queued(pipeline.frame_queue.get_batch(max_frames=1, max_wait_ms=0))
+            detections, _ = out.result()
+            results.append({'frame': name, 'status': 'processed', 'detections': _summary(detections)})
+
+        elapsed = time.perf_counter() - start
+    return results, sinks, elapsed
+
+
+def compare_golden(results, golden, min_iou=0.5):
+    """Per-frame agreement with a golden results file (same format as write_golden)"""
+    from .tracker import iou
+
+    expected = {g['frame']: g['detections'] for g in golden}
+    matched = missing = extra = frames_equal = compared = 0
+    for r in results:
+        if r['frame'] not in expected:
+            continue
+        compared += 1
+        ref = list(expected[r['frame']])
+        frame_ok = True
+        for det in r['detections']:
+            hit = next((g for g in ref if g['text'] == det['text'] and iou(g['bbox'], det['bbox']) >= min_iou), None)
+            if hit is None:
+                extra += 1
+                frame_ok = False
+            else:
+                ref.remove(hit)
+                matched += 1
+        missing += len(ref)
+        frame_ok = frame_ok and not ref
+        frames_equal += frame_ok
+
+    return {
+        'frames_compared': compared,
+        'frames_equal': frames_equal,
+        'matched': matched,
+        'missing': missing,
+        'extra': extra,
+    }
+
+
+def write_golden(results, path):
+    with open(path, 'w') as f:
+        json.dump([{'frame': r['frame'], 'detections': r['detections']} for r in results], f, indent=1)
+
+
+def build_report(results, sinks, elapsed, golden=None):
+    snap = metrics.snapshot()
+    processed = sum(1 for r in results if r['status'] == 'processed')
+    stages = {}
+    for stage in REPORT_STAGES:
+        h = snap['histograms'].get(f'stage_{stage}')
+        if h:
+            stages[stage] = {'count': h['count'], 'p50_ms': h['p50'] * 1000, 'p99_ms': h['p99'] * 1000}
+
+    report = {
+        'frames': len(results),
+        'processed': processed,
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+        'seconds': elapsed,
+        'fps': len(results) / elapsed if elapsed else 0.0,
+        'ocr_calls': snap['counters'].get('ocr_calls', 0),   # EasyOCR calls, not frames through the OCR stage
+        'ocr_rois': snap['counters'].get('ocr_rois', 0),
+        'servo_commands': len(sinks.servo_commands),
+        'log_rows': len(sinks.log_rows),
+        'stages': stages,
+    }
+    if golden is not None:
+        report['golden'] = compare_golden(results, golden)
+    return report
+
+
+def print_report(report):
+    print(f"frames: {report['frames']}  processed: {report['processed']}  "
+          f"skipped: {report['skipped']}  invalid: {report['invalid']}")
+    print(f"wall: {report['seconds']:.2f}s  fps: {report['fps']:.1f}")
+    print(f"ocr calls: {report['ocr_calls']}  ocr rois: {report['ocr_rois']}  "
+          f"servo commands: {report['servo_commands']}  log rows: {report['log_rows']}")
+    print(f"{'stage':>14} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for stage, s in report['stages'].items():
+        print(f"{stage:>14} {s['count']:>7} {s['p50_ms']:>8.2f} {s['p99_ms']:>8.2f}")
+
+    g = report.get('golden')
+    if g:
+        print(f"golden: {g['frames_equal']}/{g['frames_compared']} frames equal  "
+              f"matched: {g['matched']}  missing: {g['missing']}  extra: {g['extra']}")
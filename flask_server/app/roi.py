@@ -0,0 +1,72 @@
+import threading
+from collections import deque
+import numpy as np
+from .config import (
+    ROI_MODE, CAMERA_ROIS, ROI_MARGIN, ROI_ADAPTIVE_WINDOW,
+    ROI_ADAPTIVE_MIN_BOXES, ROI_FULL_FRAME_EVERY,
+)
+
+
+class RegionLearner:
+    """Learns where labels show up for one camera from recent detections"""
+
+    def __init__(self, window=ROI_ADAPTIVE_WINDOW, min_boxes=ROI_ADAPTIVE_MIN_BOXES,
+                 margin=ROI_MARGIN, full_frame_every=ROI_FULL_FRAME_EVERY):
+        self.boxes = deque(maxlen=window)
+        self.min_boxes = min_boxes
+        self.margin = margin
+        self.full_frame_every = full_frame_every
+        self.frames = 0
+
+    def add(self, boxes):
+        self.boxes.extend(b[:4] for b in boxes)
+
+    def region(self, shape):
+        """(x1, y1, x2, y2) to crop, or None for a full-frame pass"""
+        self.frames += 1
+        if len(self.boxes) < self.min_boxes or self.frames % self.full_frame_every == 0:
+            return None
+
+        # 2nd/98th percentile so one stray box doesn't blow up the region
+        b = np.array(self.boxes)
+        h, w = shape[:2]
+        x1 = max(0, int(np.percentile(b[:, 0], 2)) - self.margin)
+        y1 = max(0, int(np.percentile(b[:, 1], 2)) - self.margin)
+        x2 = min(w, int(np.percentile(b[:, 2], 98)) + self.margin)
+        y2 = min(h, int(np.percentile(b[:, 3], 98)) + self.margin)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (x1, y1, x2, y2)
+
+
+_learners = {}
+_lock = threading.Lock()
+
+
+def region_for(camera, shape, mode=ROI_MODE):
+    """Crop region for the next frame of this camera, or None for the full frame"""
+    if mode == "static":
+        roi = CAMERA_ROIS.get(camera)
+        if roi is None:
+            return None
+        h, w = shape[:2]
+        x1, y1, x2, y2 = roi
+        return (max(0, x1), max(0, y1), min(w, x2), min(h, y2))
+
+    if mode == "adaptive":
+        with _lock:
+            if camera not in _learners:
+                _learners[camera] = RegionLearner()
+            return _learners[camera].region(shape)
+
+    return None
+
+
+def observe(camera, boxes, mode=ROI_MODE):
+    """Feed frame-space detections back to the adaptive learner"""
+    if mode != "adaptive" or not boxes:
+        return
+    with _lock:
+        if camera not in _learners:
+            _learners[camera] = RegionLearner()
+        _learners[camera].add(boxes)
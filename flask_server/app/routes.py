@@ -3,15 +3,28 @@ import cv2
 import numpy as np
 import base64
 import time
-from .detection import process_frame
-from .database import log_detection, init_db
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from . import socketio, pipeline
+from .pipeline import submit_frame, ingest_jpeg, inference_ready, inference_status
+from .broadcast import broadcaster
+from .database import recent_logs, query_detections, iter_detections, COLUMNS
+from .config import TEXT_SERVO_MAPPING, STREAM_PASSTHROUGH, UPLOAD_WEB_TIMEOUT
+from .mapping import update_mapping
+from .servo import dispatcher
+from .capture import writer as capture_writer
+from .stats import aggregator as stats_aggregator
+from . import metrics
 from .controller import get_servo_status, send_servo_command
 from .mqtt_client import mqtt_client
 from app.state_cache import servo_state
 import json
+import csv
+import io
 bp = Blueprint('routes', __name__)
 
-latest_frame = None
+def _camera_id(default=pipeline.DEFAULT_CAMERA):
+    """Camera that sent the request (X-Camera-Id header or ?camera=)"""
+    return request.headers.get('X-Camera-Id') or request.args.get('camera', default)
 
 @bp.route('/')
 def index():
@@ -20,66 +33,84 @@ def index():
 
 @bp.route('/upload', methods=['POST'])
 def upload_frame():
-    """Receive frame from ESP32-CAM"""
-    global latest_frame
-    
+    """Receive frame from ESP32-CAM and queue it for inference"""
+    if not inference_ready():
+        return jsonify({'status': 'not_ready', 'message': 'Models are still loading'}), 503
+
     try:
-        # Get image from request
-        file_bytes = np.frombuffer(request.data, np.uint8)
-        frame = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        # Change gate + decode, then hand off to the inference worker;
+        # results go out via socket events
+        status, detections = ingest_jpeg(request.data, _camera_id())
         
-        if frame is None:
+        if status == 'invalid':
             return jsonify({'status': 'error', 'message': 'Invalid image'}), 400
         
-        # Process frame
-        processed_frame, detections = process_frame(frame)
-        
-        # Store latest frame
-        with frame_lock:
-            latest_frame = processed_frame.copy()
-        
-        # Emit frame to WebSocket clients
-        _, buffer = cv2.imencode('.jpg', processed_frame)
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
-        socketio.emit('frame_update', {'frame': frame_base64})
+        if status == 'skipped':
+            return jsonify({
+                'status': 'skipped',
+                'detections': detections,
+                'count': len(detections)
+            }), 200
         
         return jsonify({
-            'status': 'success',
-            'detections': detections,
-            'count': len(detections)
-        }), 200
+            'status': 'queued',
+            'queue_depth': len(pipeline.frame_queue),
+            'dropped': pipeline.frame_queue.dropped
+        }), 202
         
     except Exception as e:
-        print(f"Error processing frame: {e}")
+        print(f"Error receiving frame: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def _read_web_image():
+    """Image bytes from a raw image/* body, a multipart 'image' file or a base64 data-URL (legacy)"""
+    if request.mimetype.startswith('image/'):
+        return request.get_data()
+
+    if 'image' in request.files:
+        return request.files['image'].read()
+
+    data = request.get_json(silent=True)
+    if data:
+        image_data = data.get("image")
+        if image_data and image_data.startswith("data:image"):
+            return base64.b64decode(image_data.split(",")[1])
+    return None
+
 @bp.route('/upload_web', methods=['POST'])
 def upload_web():
-    try:
-        data = request.get_json(silent=True)
+    if not inference_ready():
+        return jsonify({'status': 'not_ready', 'message': 'Models are still loading'}), 503
 
-        if not data:
-            return jsonify({'status': 'error', 'message': 'No JSON received'}), 400
-        
-        image_data = data.get("image")
-        if not image_data or not image_data.startswith("data:image"):
+    try:
+        file_bytes = _read_web_image()
+        if not file_bytes:
             return jsonify({'status': 'error', 'message': 'Invalid image data'}), 400
 
-        # Decode base64
-        image_base64 = image_data.split(",")[1]
-        file_bytes = base64.b64decode(image_base64)
-
-        np_arr = np.frombuffer(file_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        with metrics.timed('decode'):
+            np_arr = np.frombuffer(file_bytes, np.uint8)
+            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
         if frame is None:
             return jsonify({'status': 'error', 'message': 'Failed to decode image'}), 400
 
-        processed_frame, detections = process_frame(frame)
+        reply = submit_frame(frame, _camera_id('web'), wait=True)
+        try:
+            detections, jpeg = reply.result(timeout=UPLOAD_WEB_TIMEOUT)
+        except CancelledError:
+            return jsonify({'status': 'error', 'message': 'Frame dropped, server busy'}), 503
+        except FutureTimeoutError:
+            # Still queued: don't spend inference on a frame nobody is waiting for
+            reply.cancel()
+            return jsonify({'status': 'error', 'message': 'Inference timed out'}), 504
 
-        _, buffer = cv2.imencode('.jpg', processed_frame)
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
-        socketio.emit('frame_update', {'frame': frame_base64})
+        # Binary clients get the annotated JPEG as the body, detections in a header
+        if request.accept_mimetypes.best == 'image/jpeg':
+            return Response(jpeg, mimetype='image/jpeg', headers={
+                'X-Detections': json.dumps(detections)
+            })
 
+        frame_base64 = base64.b64encode(jpeg).decode('utf-8')
         return jsonify({
             'status': 'ok',
             'detections': detections,
@@ -94,34 +125,38 @@ def upload_web():
 def video_feed():
     """MJPEG stream for web dashboard"""
     def generate():
+        seq = 0
         while True:
-            with frame_lock:
-                if latest_frame is not None:
-                    _, buffer = cv2.imencode('.jpg', latest_frame)
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            time.sleep(0.03)  # ~30 FPS
+            # Block until a new frame is published, reuse its encoded bytes
+            seq, frame_bytes = broadcaster.wait_next(seq)
+            if frame_bytes is None:
+                continue
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
     
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @bp.route('/stream', methods=['POST'])
 def stream_frame():
     """Receive realtime stream frame (tanpa deteksi)"""
-    global latest_frame
     try:
+        if STREAM_PASSTHROUGH:
+            # No overlays on preview frames, forward the JPEG bytes untouched
+            if not request.data.startswith(b'\xff\xd8'):
+                return jsonify({'status': 'error', 'message': 'Invalid frame'}), 400
+            broadcaster.publish_jpeg(request.data, _camera_id())
+            capture_writer.record('stream', _camera_id(), request.data)
+            metrics.inc('stream_passthrough_frames')
+            return jsonify({'status': 'ok'}), 200
+
         file_bytes = np.frombuffer(request.data, np.uint8)
         frame = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
         if frame is None:
             return jsonify({'status': 'error', 'message': 'Invalid frame'}), 400
         
-        with frame_lock:
-            latest_frame = frame.copy()
-        
-        # Kirim ke websocket biar dashboard update
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_base64 = base64.b64encode(buffer).decode('utf-8')
-        socketio.emit('frame_update', {'frame': frame_base64})
+        # Encode once for /video_feed and websocket dashboard
+        broadcaster.publish(frame, _camera_id())
+        capture_writer.record('stream', _camera_id(), request.data)
         
         return jsonify({'status': 'ok'}), 200
     except Exception as e:
@@ -129,16 +164,54 @@ def stream_frame():
 
 @bp.route('/api/logs')
 def get_logs():
-    """Get detection logs from MySQL"""
+    """Recent detection logs, served from the in-memory cache"""
     limit = request.args.get('limit', 50, type=int)
-    
-    conn = mysql.connector.connect(**DB_CONFIG)
-    c = conn.cursor(dictionary=True)
-    c.execute("SELECT * FROM detections ORDER BY id DESC LIMIT %s", (limit,))
-    rows = c.fetchall()
-    conn.close()
+    return jsonify(recent_logs(limit))
+
+def _detection_filters():
+    """Filters shared by /api/detections and its export"""
+    text = request.args.get('text')
+    return {
+        'since': request.args.get('since'),
+        'until': request.args.get('until'),
+        'servo_id': request.args.get('servo', type=int),
+        'text': text.strip().upper() if text else None,
+    }
+
+@bp.route('/api/detections')
+def get_detections():
+    """Filtered detection history (since/until/servo/text), paginated with ?cursor="""
+    rows, next_cursor = query_detections(
+        cursor=request.args.get('cursor', type=int),
+        limit=request.args.get('limit', 100, type=int),
+        **_detection_filters()
+    )
+    return jsonify({'detections': rows, 'next_cursor': next_cursor})
+
+@bp.route('/api/detections/export')
+def export_detections():
+    """Stream every matching detection as NDJSON (default) or CSV"""
+    rows = iter_detections(**_detection_filters())
+
+    if request.args.get('format') == 'csv':
+        def generate_csv():
+            buf = io.StringIO()
+            out = csv.writer(buf)
+            out.writerow(('id',) + COLUMNS)
+            for row in rows:
+                out.writerow([row['id']] + [row[k] for k in COLUMNS])
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            yield buf.getvalue()
+        return Response(generate_csv(), mimetype='text/csv', headers={
+            'Content-Disposition': 'attachment; filename=detections.csv'
+        })
 
-    return jsonify(rows)
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(row, default=str) + '\n'
+    return Response(generate_ndjson(), mimetype='application/x-ndjson')
 
 @bp.route('/api/servo_status')
 def servo_status():
@@ -153,6 +226,40 @@ def servo_status():
     
     return jsonify(servo_state)
 
+@bp.route('/api/stats')
+def sorting_stats():
+    """Parcels per chute and OCR confidence from the in-memory counters"""
+    return jsonify(stats_aggregator.snapshot())
+
+@bp.route('/ready')
+def ready():
+    """Readiness probe: 200 once models are loaded and warmed up"""
+    status = inference_status()
+    return jsonify(status), (200 if status['ready'] else 503)
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Pipeline stage latencies, queue depths and counters in Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/capture', methods=['GET', 'POST'])
+def capture():
+    """Capture mode status, POST {"enabled": true|false} to switch it"""
+    if request.method == 'POST':
+        capture_writer.enabled = bool((request.get_json(silent=True) or {}).get('enabled'))
+    return jsonify(capture_writer.stats())
+
+@bp.route('/api/mqtt_ingest')
+def mqtt_ingest_stats():
+    """Frames received over MQTT, queued for ingest and dropped"""
+    from .mqtt_ingest import ingest
+    return jsonify(ingest.stats())
+
+@bp.route('/api/servo_metrics')
+def servo_metrics():
+    """Servo command delivery latency and failure counters"""
+    return jsonify(dispatcher.metrics())
+
 @bp.route('/api/manual_servo/<int:servo_id>')
 def manual_servo(servo_id):
     """Manual servo control via MQTT"""
@@ -179,12 +286,10 @@ def manual_servo(servo_id):
 
 @bp.route('/api/config', methods=['GET', 'POST'])
 def config():
-    """Get or update text-servo mbping configuration"""
-    global TEXT_SERVO_MAPPING
-    
+    """Get or update text-servo mapping configuration"""
     if request.method == 'POST':
         new_mapping = request.json
-        TEXT_SERVO_MAPPING.update(new_mapping)
+        update_mapping(new_mapping)
         return jsonify({'status': 'success', 'mapping': TEXT_SERVO_MAPPING})
     else:
         return jsonify(TEXT_SERVO_MAPPING)
\ No newline at end of file
@@ -1,11 +1,172 @@
+import queue
+import threading
+import time
+from collections import deque, OrderedDict
 import requests
-from .config import ESP32_CONTROLLER_IP
+from requests.adapters import HTTPAdapter
+from . import metrics
+from .config import (
+    ESP32_CONTROLLER_IP, SERVO_QUEUE_SIZE, SERVO_WORKERS, SERVO_TIMEOUT,
+    SERVO_MAX_RETRIES, SERVO_BACKOFF_BASE, SERVO_DEDUP_IDS,
+    SERVO_BREAKER_THRESHOLD, SERVO_BREAKER_COOLDOWN,
+)
 
 
-def send_servo_command(servo_id):
-    try:
-        url = f"{ESP32_CONTROLLER_IP}/servo/{servo_id}?action=activate"
-        response = requests.get(url, timeout=3)
-        return response.status_code == 200
-    except:
-        return False
\ No newline at end of file
+class ServoDispatcher:
+    """Delivers servo commands off the inference thread.
+
+    Commands go through a bounded queue to worker threads sharing one
+    keep-alive session. A command carrying an id (the track id) is only sent
+    once, two parcels for the same chute are two commands. Failed deliveries
+    are retried with backoff; after too many consecutive failures the circuit
+    opens and commands are dropped until the cooldown ends. The first command
+    after that is a single probe (half-open): if it gets through the circuit
+    closes, if not it opens for another cooldown.
+    """
+
+    def __init__(self, base_url=ESP32_CONTROLLER_IP, workers=SERVO_WORKERS):
+        self.base_url = base_url
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=SERVO_QUEUE_SIZE)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.recent_ids = OrderedDict()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.threads = []
+
+        self.latencies = deque(maxlen=500)
+        self.counters = {
+            'enqueued': 0, 'delivered': 0, 'failed': 0, 'retries': 0,
+            'deduplicated': 0, 'dropped_full': 0, 'dropped_open': 0, 'probes': 0,
+        }
+
+    def start(self):
+        if self.threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"servo-dispatch-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _circuit_closed(self):
+        return self.consecutive_failures < SERVO_BREAKER_THRESHOLD
+
+    def dispatch(self, servo_id, action='activate', command_id=None):
+        """Queue a command; returns False if it was deduplicated or dropped"""
+        now = time.monotonic()
+
+        with self.lock:
+            if command_id is not None and command_id in self.recent_ids:
+                self.counters['deduplicated'] += 1
+                return False
+
+            probe = False
+            if not self._circuit_closed():
+                # Open, or half-open with the probe still in flight
+                if now < self.open_until or self.probing:
+                    self.counters['dropped_open'] += 1
+                    return False
+                probe = self.probing = True
+                self.counters['probes'] += 1
+
+            try:
+                self.queue.put_nowait((servo_id, action, now, probe))
+            except queue.Full:
+                if probe:
+                    self.probing = False
+                self.counters['dropped_full'] += 1
+                return False
+
+            if command_id is not None:
+                self.recent_ids[command_id] = now
+                if len(self.recent_ids) > SERVO_DEDUP_IDS:
+                    self.recent_ids.popitem(last=False)
+            self.counters['enqueued'] += 1
+        return True
+
+    def _run(self):
+        while True:
+            servo_id, action, queued_at, probe = self.queue.get()
+
+            # Commands queued before the circuit opened are dropped too
+            if not probe and not self._circuit_closed():
+                with self.lock:
+                    self.counters['dropped_open'] += 1
+                self.queue.task_done()
+                continue
+
+            # A probe only decides the circuit state, it isn't retried
+            ok = self._deliver(servo_id, action, retries=0 if probe else SERVO_MAX_RETRIES)
+
+            with self.lock:
+                if probe:
+                    self.probing = False
+                if ok:
+                    self.latencies.append((time.monotonic() - queued_at) * 1000)
+                    metrics.observe('stage_servo_delivery', time.monotonic() - queued_at)
+                    self.counters['delivered'] += 1
+                    if not self._circuit_closed():
+                        print("Servo controller reachable again, circuit closed")
+                    self.consecutive_failures = 0
+                else:
+                    self.counters['failed'] += 1
+                    self.consecutive_failures += 1
+                    if probe or self.consecutive_failures == SERVO_BREAKER_THRESHOLD:
+                        self.open_until = time.monotonic() + SERVO_BREAKER_COOLDOWN
+                        print(f"Servo controller unreachable, circuit open for {SERVO_BREAKER_COOLDOWN}s")
+            self.queue.task_done()
+
+    def _deliver(self, servo_id, action, retries=SERVO_MAX_RETRIES):
+        url = f"{self.base_url}/servo/{servo_id}?action={action}"
+        for attempt in range(retries + 1):
+            if attempt:
+                with self.lock:
+                    self.counters['retries'] += 1
+                time.sleep(SERVO_BACKOFF_BASE * (2 ** (attempt - 1)))
+            try:
+                response = self.session.get(url, timeout=SERVO_TIMEOUT)
+                if response.status_code == 200:
+                    return True
+            except requests.RequestException as e:
+                print(f"Error sending servo command: {e}")
+        return False
+
+    def metrics(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counters = dict(self.counters)
+            circuit_open = not self._circuit_closed()
+            half_open = circuit_open and time.monotonic() >= self.open_until
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))], 1)
+
+        counters.update({
+            'queue_depth': self.queue.qsize(),
+            'circuit_open': circuit_open,
+            'circuit_half_open': half_open,
+            'latency_ms_p50': pct(50),
+            'latency_ms_p99': pct(99),
+        })
+        return counters
+
+
+dispatcher = ServoDispatcher()
+
+metrics.register_gauge('servo_queue_depth', dispatcher.queue.qsize)
+for _name in ('delivered', 'failed', 'deduplicated', 'dropped_full', 'dropped_open'):
+    metrics.register_gauge(f'servo_{_name}', lambda n=_name: dispatcher.counters[n], kind="counter")
+
+
+def send_servo_command(servo_id, command_id=None):
+    """Non-blocking: queue an activate command for the servo, once per command_id"""
+    return dispatcher.dispatch(servo_id, command_id=command_id)
@@ -16,13 +16,45 @@ socket.on("disconnect", () => {
   updateStatusIndicators();
 });
 
-// Track frame updates
-socket.on("frame_update", () => {
+// Track frame updates (raw JPEG bytes arrive as an ArrayBuffer)
+socket.on("frame_update", (data) => {
   cameraOnline = true;
   lastFrameTime = Date.now();
   updateStatusIndicators();
+
+  if (data && data.frame) {
+    const blob = data.encoding === "base64"
+      ? base64ToBlob(data.frame)
+      : new Blob([data.frame], { type: "image/jpeg" });
+    showFrameBlob(blob, "live");
+  }
 });
 
+// ========== FRAME RENDERING ==========
+// Live frames and the manual capture result have their own panels, so the
+// stream never overwrites a capture the user is looking at
+const framePanels = {
+  live: { img: "liveImage", panel: "liveResult", time: "liveTime", url: null },
+  capture: { img: "capturedImage", panel: "captureResult", time: "captureTime", url: null },
+};
+
+function showFrameBlob(blob, target) {
+  const p = framePanels[target];
+  if (p.url) URL.revokeObjectURL(p.url);
+  p.url = URL.createObjectURL(blob);
+  document.getElementById(p.img).src = p.url;
+
+  document.getElementById(p.panel).classList.remove("hidden");
+  document.getElementById(p.time).textContent = new Date().toLocaleTimeString();
+}
+
+function base64ToBlob(b64) {
+  const bin = atob(b64);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return new Blob([bytes], { type: "image/jpeg" });
+}
+
 // Track detections
 socket.on("new_detection", (data) => {
   console.log("New detection:", data);
@@ -123,6 +155,37 @@ function stopVideoStream() {
   }
 }
 
+// ========== CAPTURE & UPLOAD ==========
+async function captureAndUpload() {
+  const video = document.getElementById("videoStream");
+  if (!video.videoWidth) return alert("Kamera belum siap!");
+
+  const canvas = document.createElement("canvas");
+  canvas.width = video.videoWidth;
+  canvas.height = video.videoHeight;
+  canvas.getContext("2d").drawImage(video, 0, 0);
+
+  const blob = await new Promise(resolve => canvas.toBlob(resolve, "image/jpeg", 0.9));
+
+  // Send raw JPEG bytes, get the annotated JPEG back as binary
+  const res = await fetch("/upload_web", {
+    method: "POST",
+    headers: { "Content-Type": "image/jpeg", "Accept": "image/jpeg" },
+    body: blob,
+  });
+
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    return alert("Upload failed: " + (err.message || res.status));
+  }
+
+  showFrameBlob(await res.blob(), "capture");
+  const detections = JSON.parse(res.headers.get("X-Detections") || "[]");
+  console.log("Capture detections:", detections);
+}
+
+document.getElementById("captureBtn").addEventListener("click", captureAndUpload);
+
 // ========== STATUS HANDLER ==========
 function updateStatusIndicators() {
   document.getElementById("cameraStatus").className =
@@ -0,0 +1,205 @@
+"""Sorting statistics: parcels per chute (servo) and OCR confidence.
+
+Counters are updated in memory for every logged detection, so /api/stats never
+scans the detections table. Increments are flushed every STATS_FLUSH_INTERVAL
+into the stats_minute and stats_hour rollup tables (upserts that add to the
+stored values), and rebuild_rollups() recomputes both tables from the raw
+detections when they drift (e.g. rows the DB writer had to drop).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from . import database
+from .config import STATS_FLUSH_INTERVAL, STATS_PUSH_INTERVAL
+
+WINDOW_MINUTES = 60
+
+
+def minute_of(timestamp):
+    return timestamp[:16] + ':00'
+
+
+def hour_of(timestamp):
+    return timestamp[:13] + ':00:00'
+
+
+def _empty_servo_stats():
+    return {
+        'parcels_last_minute': 0, 'parcels_current_minute': 0,
+        'parcels_last_hour': 0, 'parcels_current_hour': 0, '_conf_hour': 0.0,
+    }
+
+
+class StatsAggregator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # minute bucket -> {servo_id: [parcels, confidence_sum]}, last WINDOW_MINUTES only
+        self.minutes = OrderedDict()
+        self.totals = {}
+        # Increments not yet in the rollup tables / not yet pushed to dashboards
+        self.pending = {}
+        self.delta = {}
+
+    def record(self, timestamp, text, servo_id, confidence):
+        minute = minute_of(timestamp)
+        with self.lock:
+            if minute not in self.minutes:
+                self.minutes[minute] = {}
+                while len(self.minutes) > WINDOW_MINUTES:
+                    self.minutes.popitem(last=False)
+            for counts in (
+                self.minutes[minute].setdefault(servo_id, [0, 0.0]),
+                self.totals.setdefault(servo_id, [0, 0.0]),
+                self.pending.setdefault((minute, servo_id), [0, 0.0]),
+                self.delta.setdefault(servo_id, [0, 0.0]),
+            ):
+                counts[0] += 1
+                counts[1] += confidence
+
+    def snapshot(self, now=None):
+        """Per-servo rates from the in-memory window; cost doesn't depend on table size"""
+        now = now or datetime.now()
+        current_minute = now.strftime('%Y-%m-%d %H:%M:00')
+        last_minute = (now - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:00')
+        current_hour = now.strftime('%Y-%m-%d %H:00:00')
+        window_start = (now - timedelta(minutes=WINDOW_MINUTES)).strftime('%Y-%m-%d %H:%M:00')
+
+        servos = {}
+        with self.lock:
+            for minute, per_servo in self.minutes.items():
+                for servo_id, (parcels, conf_sum) in per_servo.items():
+                    s = servos.setdefault(servo_id, _empty_servo_stats())
+                    if minute == last_minute:
+                        s['parcels_last_minute'] += parcels
+                    if minute == current_minute:
+                        s['parcels_current_minute'] += parcels
+                    if minute > window_start:
+                        s['parcels_last_hour'] += parcels
+                    if minute.startswith(current_hour[:13]):
+                        s['parcels_current_hour'] += parcels
+                        s['_conf_hour'] += conf_sum
+            totals = {k: list(v) for k, v in self.totals.items()}
+
+        for servo_id, (parcels, conf_sum) in totals.items():
+            s = servos.setdefault(servo_id, _empty_servo_stats())
+            s['total'] = parcels
+            s['avg_confidence'] = conf_sum / parcels if parcels else None
+
+        for s in servos.values():
+            conf_hour = s.pop('_conf_hour')
+            s['parcels_per_minute'] = s['parcels_last_hour'] / float(WINDOW_MINUTES)
+            s['avg_confidence_current_hour'] = conf_hour / s['parcels_current_hour'] if s['parcels_current_hour'] else None
+            s.setdefault('total', 0)
+            s.setdefault('avg_confidence', None)
+
+        return {
+            'generated_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'servos': servos,
+            'total': sum(s['total'] for s in servos.values()),
+        }
+
+    def take_delta(self):
+        with self.lock:
+            delta, self.delta = self.delta, {}
+        return {servo_id: {'parcels': p, 'confidence_sum': c} for servo_id, (p, c) in delta.items()}
+
+    def flush(self):
+        """Add pending increments to the minute and hour rollup tables"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+
+        hours = {}
+        for (minute, servo_id), (parcels, conf_sum) in pending.items():
+            counts = hours.setdefault((hour_of(minute), servo_id), [0, 0.0])
+            counts[0] += parcels
+            counts[1] += conf_sum
+
+        try:
+            backend = database.get_backend()
+            with backend.connection() as conn:
+                c = conn.cursor()
+                c.executemany(backend.upsert_rollup.format(table='stats_minute'),
+                              [(m, s, p, cs) for (m, s), (p, cs) in pending.items()])
+                c.executemany(backend.upsert_rollup.format(table='stats_hour'),
+                              [(h, s, p, cs) for (h, s), (p, cs) in hours.items()])
+                conn.commit()
+        except Exception as e:
+            # Put the increments back, next flush retries them
+            print(f"Error flushing stats rollups: {e}")
+            with self.lock:
+                for key, (parcels, conf_sum) in pending.items():
+                    counts = self.pending.setdefault(key, [0, 0.0])
+                    counts[0] += parcels
+                    counts[1] += conf_sum
+            return 0
+        return len(pending)
+
+    def load_recent(self, now=None):
+        """Seed the in-memory window and totals from the rollup tables after a restart"""
+        now = now or datetime.now()
+        since = (now - timedelta(minutes=WINDOW_MINUTES)).strftime('%Y-%m-%d %H:%M:00')
+        backend = database.get_backend()
+        recent = backend.fetch_all(
+            f"SELECT * FROM stats_minute WHERE bucket > {backend.placeholder} ORDER BY bucket", (since,)
+        )
+        totals = backend.fetch_all(
+            "SELECT servo_id, SUM(parcels) AS parcels, SUM(confidence_sum) AS confidence_sum "
+            "FROM stats_hour GROUP BY servo_id"
+        )
+        with self.lock:
+            for row in recent:
+                per_servo = self.minutes.setdefault(row['bucket'], {})
+                per_servo[row['servo_id']] = [int(row['parcels']), float(row['confidence_sum'])]
+            for row in totals:
+                self.totals[row['servo_id']] = [int(row['parcels']), float(row['confidence_sum'])]
+
+
+def rebuild_rollups():
+    """Recompute stats_minute and stats_hour from the raw detections table"""
+    backend = database.get_backend()
+    with backend.connection() as conn:
+        c = conn.cursor()
+        for table, bucket in (('stats_minute', backend.minute_bucket), ('stats_hour', backend.hour_bucket)):
+            c.execute(f"DELETE FROM {table}")
+            c.execute(
+                f"INSERT INTO {table} (bucket, servo_id, parcels, confidence_sum) "
+                f"SELECT {bucket}, servo_id, COUNT(*), SUM(confidence) FROM detections "
+                f"WHERE servo_id IS NOT NULL GROUP BY {bucket}, servo_id"
+            )
+        conn.commit()
+
+
+aggregator = StatsAggregator()
+database.on_detection_logged(aggregator.record)
+
+_thread = None
+
+
+def start(socketio, flush_interval=STATS_FLUSH_INTERVAL, push_interval=STATS_PUSH_INTERVAL):
+    """Load recent rollups, then flush them periodically and push 'stats_delta' events"""
+    global _thread
+    if _thread is not None:
+        return
+    try:
+        aggregator.load_recent()
+    except Exception as e:
+        print(f"Error loading stats rollups: {e}")
+
+    def loop():
+        tick = push_interval if push_interval > 0 else flush_interval
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(tick)
+            if push_interval > 0:
+                delta = aggregator.take_delta()
+                if delta:
+                    socketio.emit('stats_delta', delta)
+            if time.monotonic() - last_flush >= flush_interval:
+                aggregator.flush()
+                last_flush = time.monotonic()
+
+    _thread = threading.Thread(target=loop, name="stats-rollup", daemon=True)
+    _thread.start()
@@ -0,0 +1,113 @@
+import itertools
+import threading
+from .config import TRACK_IOU_THRESHOLD, TRACK_MAX_CENTROID_DIST, TRACK_MAX_MISSED, OCR_CONFIDENT_THRESHOLD
+from .config import TRACK_FIRE_AFTER_READS
+
+_track_ids = itertools.count(1)
+
+
+def iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def centroid_dist(a, b):
+    ax, ay = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    bx, by = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5
+
+
+class Track:
+    """One parcel label followed across frames"""
+
+    def __init__(self, bbox):
+        self.id = next(_track_ids)
+        self.bbox = bbox
+        self.text = None
+        self.confidence = 0.0
+        self.missed = 0
+        self.reads = 0
+        self.fired = False
+
+    @property
+    def needs_ocr(self):
+        return not self.fired and (self.text is None or self.confidence < OCR_CONFIDENT_THRESHOLD)
+
+    @property
+    def ready_to_fire(self):
+        """A confident read, or the same parcel read often enough that waiting won't help"""
+        if self.fired or self.text is None:
+            return False
+        return self.confidence >= OCR_CONFIDENT_THRESHOLD or self.reads >= TRACK_FIRE_AFTER_READS
+
+    def update_read(self, text, confidence):
+        """Keep the most confident read seen so far; the text is frozen once the servo fired"""
+        if self.fired:
+            return
+        self.reads += 1
+        if self.text is None or confidence > self.confidence:
+            self.text = text
+            self.confidence = confidence
+
+
+class IouTracker:
+    """Greedy IoU matcher with a centroid-distance fallback"""
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD,
+                 max_centroid_dist=TRACK_MAX_CENTROID_DIST, max_missed=TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_dist = max_centroid_dist
+        self.max_missed = max_missed
+        self.tracks = []
+        self.expired = []   # tracks dropped by the last update()
+        self.lock = threading.Lock()  # held by callers across update() and reading tracks/expired
+
+    def update(self, boxes):
+        """Match this frame's boxes to tracks; returns one Track per box, in order"""
+        assigned = [None] * len(boxes)
+        free = set(range(len(self.tracks)))
+
+        # Best IoU pairs first, then centroid distance for whatever is left
+        pairs = sorted(
+            ((iou(t.bbox, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+            reverse=True
+        )
+        for score, ti, bi in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in free and assigned[bi] is None:
+                assigned[bi] = self.tracks[ti]
+                free.discard(ti)
+
+        pairs = sorted(
+            (centroid_dist(self.tracks[ti].bbox, b), ti, bi)
+            for ti in free for bi, b in enumerate(boxes) if assigned[bi] is None
+        )
+        for dist, ti, bi in pairs:
+            if dist > self.max_centroid_dist:
+                break
+            if ti in free and assigned[bi] is None:
+                assigned[bi] = self.tracks[ti]
+                free.discard(ti)
+
+        for ti in free:
+            self.tracks[ti].missed += 1
+
+        for bi, box in enumerate(boxes):
+            track = assigned[bi]
+            if track is None:
+                track = Track(box)
+                self.tracks.append(track)
+                assigned[bi] = track
+            track.bbox = box
+            track.missed = 0
+
+        self.expired = [t for t in self.tracks if t.missed > self.max_missed]
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return assigned
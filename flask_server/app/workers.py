@@ -0,0 +1,281 @@
+"""Process-pool inference.
+
+N worker processes each load their own YOLO model and OCR reader. Frames are
+copied into pre-allocated shared-memory slots and only (slot, shape) goes over
+the task queue, so pixel data is never pickled. Workers run the stateless part
+of the pipeline (``detection.infer``); tracking, servo dispatch and publishing
+stay in the parent and are applied in frame order per camera.
+
+Every worker has its own task queue, so the parent knows which frames a worker
+holds. Workers report 'ready' or 'failed' once their models are loaded. The
+collector watches the processes: when one dies, the frames it held fail (their
+slots go back to the pool) and it is restarted up to WORKER_MAX_RESTARTS
+times. A worker that fails to load is not restarted; once all of them have
+failed, on_failed() lets the caller fall back to in-process inference.
+"""
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+from .config import INFERENCE_WORKERS, SHM_SLOT_BYTES, TEXT_SERVO_MAPPING
+from .config import INFERENCE_SLOT_TIMEOUT, WORKER_MAX_RESTARTS
+from . import metrics
+
+
+def _worker_main(index, slot_names, tasks, results):
+    try:
+        from .detection import infer, models
+        from .mapping import update_mapping
+        from .buffers import tune_allocator
+        from .config import MALLOC_TUNING
+
+        if MALLOC_TUNING:
+            tune_allocator()
+
+        slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+        mapping = dict(TEXT_SERVO_MAPPING)
+
+        # Load and warm up before taking frames
+        models.load()
+    except Exception as e:
+        results.put(('failed', index, str(e)))
+        return
+    results.put(('ready', index))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot, shape, skip_boxes, region, new_mapping, camera = task
+
+        # Keep the OCR vocabulary in sync with /api/config in the parent
+        if new_mapping != mapping:
+            mapping = new_mapping
+            update_mapping(mapping)
+
+        try:
+            start = time.perf_counter()
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+            inferred = infer([frame], [skip_boxes], [region], [camera])[0]
+            del frame
+            results.put(('result', index, seq, inferred, None, time.perf_counter() - start))
+        except Exception as e:
+            results.put(('result', index, seq, None, str(e), None))
+
+    for shm in slots:
+        shm.close()
+
+
+class InferencePool:
+    def __init__(self, workers=INFERENCE_WORKERS, slot_bytes=SHM_SLOT_BYTES, target=_worker_main):
+        self.workers = workers
+        self.slot_bytes = slot_bytes
+        self.target = target
+        self.ctx = mp.get_context("spawn")
+
+        # Two slots per worker so the next frame can be copied in while one runs
+        self.slots = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(workers * 2)]
+        self.free_slots = queue.Queue()
+        for i in range(len(self.slots)):
+            self.free_slots.put(i)
+
+        self.results = self.ctx.Queue()
+        self.processes = [None] * workers
+        self.tasks = [None] * workers
+        self.states = ['starting'] * workers   # starting, ready or failed
+        self.errors = [None] * workers
+        self.restarts = [0] * workers
+        self.assigned = [set() for _ in range(workers)]
+
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.order = {}
+        self.collector = None
+        self.closed = False
+        self.on_failed = None
+
+    def start(self, on_result, on_failed=None):
+        """on_result(frame, camera, reply, inferred, error, frame_seq) is called in frame order per camera,
+        on_failed() once no worker is left that could take frames"""
+        self.on_result = on_result
+        self.on_failed = on_failed
+        for i in range(self.workers):
+            self._spawn(i)
+        self.collector = threading.Thread(target=self._collect, name="inference-collector", daemon=True)
+        self.collector.start()
+
+    def _spawn(self, index):
+        self.tasks[index] = self.ctx.Queue()
+        self.states[index] = 'starting'
+        self.processes[index] = self.ctx.Process(
+            target=self.target, args=(index, [s.name for s in self.slots], self.tasks[index], self.results),
+            name=f"inference-{index}", daemon=True
+        )
+        self.processes[index].start()
+
+    def submit(self, frame, camera, reply=None, skip_boxes=(), region=None, frame_seq=None):
+        """Copy frame into a free slot and queue it on the least busy ready worker.
+
+        Waits up to INFERENCE_SLOT_TIMEOUT for a slot (TimeoutError after that),
+        RuntimeError if no worker is ready.
+        """
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds SHM_SLOT_BYTES")
+        if not self.ready:
+            raise RuntimeError("No inference worker is ready")
+
+        try:
+            slot = self.free_slots.get(timeout=INFERENCE_SLOT_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"No free frame slot after {INFERENCE_SLOT_TIMEOUT}s")
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.slots[slot].buf)
+        view[...] = frame
+        del view
+
+        seq = next(self.seq)
+        with self.lock:
+            ready = [i for i in range(self.workers) if self.states[i] == 'ready']
+            if not ready:
+                self.free_slots.put(slot)
+                raise RuntimeError("No inference worker is ready")
+            worker = min(ready, key=lambda i: len(self.assigned[i]))
+            self.assigned[worker].add(seq)
+            self.pending[seq] = {'frame': frame, 'camera': camera, 'reply': reply, 'slot': slot,
+                                 'worker': worker, 'frame_seq': frame_seq, 'done': False}
+            self.order.setdefault(camera, deque()).append(seq)
+            self.tasks[worker].put((seq, slot, frame.shape, list(skip_boxes), region, dict(TEXT_SERVO_MAPPING), camera))
+        return seq
+
+    def _collect(self):
+        while not self.closed:
+            try:
+                message = self.results.get(timeout=0.5)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                break  # queue closed underneath us at shutdown
+
+            ready = []
+            if message is not None:
+                ready = self._handle(message)
+            ready += self._check_workers()
+
+            for it in ready:
+                self.on_result(it['frame'], it['camera'], it['reply'], it['inferred'], it['error'], it['frame_seq'])
+
+            if self.failed and self.on_failed is not None:
+                on_failed, self.on_failed = self.on_failed, None
+                on_failed()
+
+    def _handle(self, message):
+        kind, index = message[:2]
+        if kind == 'ready':
+            self.states[index] = 'ready'
+            self.errors[index] = None
+            print(f"inference-{index} ready")
+            return []
+        if kind == 'failed':
+            self.states[index] = 'failed'
+            self.errors[index] = message[2]
+            print(f"inference-{index} failed to load models: {message[2]}")
+            return []
+
+        _, _, seq, inferred, error, elapsed = message
+        if elapsed is not None:
+            metrics.observe('stage_worker_infer', elapsed)
+        with self.lock:
+            return self._complete([seq], inferred, error)
+
+    def _check_workers(self):
+        """Fail the frames of workers that died and restart them"""
+        dead = [i for i, p in enumerate(self.processes) if self.states[i] != 'failed' and not p.is_alive()]
+        if not dead:
+            return []
+
+        # A worker's last messages are flushed before it exits, take them first
+        ready = []
+        while True:
+            try:
+                ready += self._handle(self.results.get_nowait())
+            except queue.Empty:
+                break
+
+        for i in dead:
+            if self.states[i] == 'failed':
+                continue  # reported a load failure and exited
+            process = self.processes[i]
+            error = f"inference-{i} exited with code {process.exitcode}"
+            print(error)
+            metrics.inc('inference_worker_deaths')
+            with self.lock:
+                ready += self._complete(list(self.assigned[i]), None, error)
+                self.errors[i] = error
+                if self.restarts[i] < WORKER_MAX_RESTARTS and not self.closed:
+                    self.restarts[i] += 1
+                    self._spawn(i)
+                else:
+                    self.states[i] = 'failed'
+        return ready
+
+    def _complete(self, seqs, inferred, error):
+        """Mark frames done and free their slots; returns what can be delivered now.
+        Results for frames already failed (their worker died) are ignored."""
+        ready = []
+        for seq in seqs:
+            item = self.pending.get(seq)
+            if item is None or item['done']:
+                continue
+            item.update(done=True, inferred=inferred, error=error)
+            self.assigned[item['worker']].discard(seq)
+            self.free_slots.put(item['slot'])
+            ready += self._pop_ready(item['camera'])
+        return ready
+
+    @property
+    def ready(self):
+        return 'ready' in self.states
+
+    @property
+    def ready_workers(self):
+        return self.states.count('ready')
+
+    @property
+    def failed(self):
+        return all(state == 'failed' for state in self.states)
+
+    def status(self):
+        return [
+            {'name': f"inference-{i}", 'state': self.states[i], 'error': self.errors[i], 'restarts': self.restarts[i]}
+            for i in range(self.workers)
+        ]
+
+    def _pop_ready(self, camera):
+        """Completed items at the head of the camera's order, oldest first"""
+        ready = []
+        order = self.order[camera]
+        while order and self.pending[order[0]]['done']:
+            ready.append(self.pending.pop(order.popleft()))
+        return ready
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for i, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                self.tasks[i].put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+        if self.collector is not None and self.collector is not threading.current_thread():
+            self.collector.join(timeout=1)
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
@@ -5,6 +5,12 @@ import ipywidgets as widgets
 from IPython.display import display, clear_output
 import os
 
+# Box detection, crop/label output and the manifest are shared with the
+# headless batch mode (python -m app.cli autolabel); this widget works
+# through the images it didn't accept (see Manifest.work_list).
+from app.autolabel import auto_detect_box, write_result, Manifest, list_images
+from app.config import AUTOLABEL_OUTPUT_DIR
+
 # === GLOBAL VARIABEL ===
 start_point = None      # bounding box (x1, y1)
 end_point = None        # bounding box (x2, y2)
@@ -12,44 +18,13 @@ dragging = False        # sedang geser box atau tidak
 offset = (0, 0)         # offset klik terhadap box
 current_img = None
 current_path = None
+current_record = None
 fig = None
 ax = None
 
-output_folder = "hasil_crop_realtime_colab"
+output_folder = AUTOLABEL_OUTPUT_DIR
 os.makedirs(output_folder, exist_ok=True)
-
-
-# === AUTO DETECT BOX ===
-def auto_detect_box(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5,5), 0)
-    _, thresh = cv2.threshold(
-        blur, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU
-    )
-
-    contours, _ = cv2.findContours(
-        thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-    )
-
-    boxes = []
-    for cnt in contours:
-        x, y, w, h = cv2.boundingRect(cnt)
-
-        if 300 < w < img.shape[1] and 40 < h < 300 and 150 < y < img.shape[0]//2:
-            boxes.append((x, y, w, h))
-
-    if len(boxes) == 0:
-        return None
-
-    boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)
-    x, y, w, h = boxes[0]
-
-    x = max(0, x + 550)
-    y = max(0, y + 0)
-    w = min(img.shape[1] - x, w + 20)
-    h = min(img.shape[0] - y, h + 25)
-
-    return (x, y, x + w, y + h)
+manifest = Manifest(output_folder)
 
 
 # === DRAW RECTANGLE ===
@@ -124,13 +99,9 @@ def save_crop(_):
         print("❌ Kotak belum dipilih.")
         return
 
-    x1, y1 = start_point
-    x2, y2 = end_point
-
-    crop = current_img[y1:y2, x1:x2]
-
-    save_path = os.path.join(output_folder, os.path.basename(current_path))
-    cv2.imwrite(save_path, crop)
+    box = (start_point[0], start_point[1], end_point[0], end_point[1])
+    save_path = write_result(current_img, current_path, current_record['split'], box, output_folder)
+    manifest.append([dict(current_record, box=list(box), status='reviewed')])
 
     print(f"✅ Disimpan ke: {save_path}")
     next_image()    
@@ -138,11 +109,12 @@ def save_crop(_):
 
 # === RETRY ===
 def retry(_):
-    show_image(current_path)
+    show_image(current_record)
 
 
 # === SKIP ===
 def skip(_):
+    manifest.append([dict(current_record, status='skipped')])
     print("⏭️ Dilewati.")
     next_image()
 
@@ -158,12 +130,13 @@ btn_skip.on_click(skip)
 
 
 # === SHOW IMAGE ===
-def show_image(path):
-    global current_img, current_path, fig, ax
+def show_image(record):
+    global current_img, current_path, current_record, fig, ax
     global start_point, end_point
 
-    current_img = cv2.imread(path)
-    current_path = path
+    current_img = cv2.imread(record['path'])
+    current_path = record['path']
+    current_record = record
 
     clear_output(wait=True)
     display(widgets.HBox([btn_save, btn_retry, btn_skip]))
@@ -192,15 +165,10 @@ def show_image(path):
 
 # === LOAD IMAGE LIST ===
 base_folder = r"C:\Users\Taufiqur Rahman\OneDrive\Documents\label_alamat_dataset\label_alamat_dataset\images"
-image_list = []
-
-for subset in ["train", "val"]:
-    folder = os.path.join(base_folder, subset)
-    print("Checking:", folder)
 
-    for f in os.listdir(folder):
-        if f.lower().endswith(('.jpg', '.png', '.jpeg')):
-            image_list.append(os.path.join(folder, f))
+# Every image not yet accepted by the batch run or saved/skipped here
+image_list = manifest.work_list(list_images(base_folder, ["train", "val"]))
+print(f"Belum selesai: {len(image_list)} gambar")
 
 index = 0
 
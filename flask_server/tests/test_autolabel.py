@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from app.autolabel import SHIFT_X, Manifest, detect_box, yolo_label
+
+
+def test_autolabel_imports_without_flask():
+    # teeet.py runs in a notebook kernel that doesn't have the server's dependencies
+    code = "import sys, app.autolabel, app.config; print('flask' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
+
+
+def test_detect_box_finds_dark_blob():
+    img = np.full((1080, 1920, 3), 255, np.uint8)
+    img[200:260, 100:500] = 0
+    box, confidence = detect_box(img)
+    assert box is not None
+    assert abs(box[0] - (100 + SHIFT_X)) <= 4
+    assert abs(box[1] - 200) <= 4
+    assert confidence > 0.9
+
+
+def test_detect_box_empty_image():
+    assert detect_box(np.full((1080, 1920, 3), 255, np.uint8)) == (None, 0.0)
+
+
+def test_yolo_label_normalised():
+    assert yolo_label((0, 0, 50, 20), (100, 200)) == "0 0.125000 0.100000 0.250000 0.200000\n"
+
+
+def test_work_list_keeps_images_a_manual_session_never_reached(tmp_path):
+    images = []
+    for name in ('a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'):
+        path = tmp_path / name
+        path.write_bytes(b'')
+        images.append((str(path), 'train'))
+    manifest = Manifest(str(tmp_path / 'out'))
+    manifest.append([
+        {'path': path, 'split': 'train', 'mtime': os.path.getmtime(path), 'status': status, 'box': [1, 2, 3, 4]}
+        for (path, _), status in zip(images, ('reviewed', 'skipped', 'review'))
+    ])
+
+    pending = manifest.work_list(images)
+    assert [r['path'] for r in pending] == [images[2][0], images[3][0]]
+    assert pending[0]['box'] == [1, 2, 3, 4]
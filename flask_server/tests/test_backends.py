@@ -0,0 +1,55 @@
+import os
+import cv2
+import numpy as np
+import pytest
+from app.backends import ExportedDetector, letterbox, make_detector
+from app.cli import match_boxes
+from app.config import MODEL_PATH, ONNX_MODEL_PATH, OPENVINO_MODEL_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_letterbox_pads_to_square():
+    frame = np.full((360, 640, 3), 255, np.uint8)
+    canvas, scale, left, top = letterbox(frame, 320)
+    assert canvas.shape == (320, 320, 3)
+    assert (scale, left, top) == (0.5, 0, 70)
+    assert canvas[0, 0, 0] == 114 and canvas[160, 160, 0] == 255
+
+
+def test_postprocess_maps_back_to_frame_and_suppresses_overlaps():
+    detector = ExportedDetector({0: 'alamat'})
+    # (cx, cy, w, h, score) per anchor, in letterboxed 320px input coordinates
+    anchors = np.array([
+        [100, 170, 40, 20, 0.9],
+        [102, 170, 40, 20, 0.8],   # overlaps the first, suppressed
+        [250, 200, 20, 20, 0.7],
+        [50, 50, 10, 10, 0.2],     # below conf
+    ], np.float32)
+    output = anchors.T[None]
+    meta = [(0.5, 0, 70, (360, 640))]
+
+    boxes, = detector.postprocess(output, meta, conf=0.5, with_scores=True)
+    assert [b[:5] for b in boxes] == [(160, 180, 240, 220, 'alamat'), (480, 240, 520, 280, 'alamat')]
+    assert boxes[0][5] == pytest.approx(0.9)
+
+
+@pytest.mark.parametrize('backend, module, path', [
+    ('onnx', 'onnxruntime', ONNX_MODEL_PATH),
+    ('openvino', 'openvino', OPENVINO_MODEL_PATH),
+])
+def test_exported_backend_matches_pytorch(backend, module, path, monkeypatch):
+    pytest.importorskip('ultralytics')
+    pytest.importorskip(module)
+    monkeypatch.chdir(ROOT)
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(path):
+        pytest.skip(f"needs {MODEL_PATH} and {path} (python -m app.cli export --format {backend})")
+
+    frames = [cv2.imread('1.png')]
+    reference = make_detector('pytorch').detect(frames)
+    exported = make_detector(backend).detect(frames)
+
+    for ref, other in zip(reference, exported):
+        ious, missed, extra = match_boxes(ref, other, 0.5)
+        assert (missed, extra) == (0, 0)
+        assert min(ious, default=1.0) >= 0.9
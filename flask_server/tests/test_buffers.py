@@ -0,0 +1,36 @@
+from app.buffers import BufferPool
+
+
+def test_released_buffer_is_reused():
+    pool = BufferPool(slots=2, enabled=True)
+    first = pool.acquire((4, 4, 3))
+    first.release()
+    again = pool.acquire((4, 4, 3))
+    assert again.array is first.array
+    assert pool.stats()['reused'] == 1
+
+
+def test_retained_buffer_stays_out_until_last_release():
+    pool = BufferPool(slots=2, enabled=True)
+    buf = pool.acquire((4, 4, 3))
+    buf.retain()
+    buf.release()
+    assert pool.acquire((4, 4, 3)).array is not buf.array
+    buf.release()
+    assert pool.acquire((4, 4, 3)).array is buf.array
+
+
+def test_least_recently_used_shape_evicted():
+    pool = BufferPool(slots=2, enabled=True, shapes=2)
+    held = pool.acquire((1, 1, 3))
+    pool.acquire((2, 2, 3)).release()
+    for size in range(3, 20):
+        pool.acquire((size, size, 3)).release()
+
+    stats = pool.stats()
+    assert stats['shapes'] == 2
+    assert stats['evicted'] == 17
+    assert len(pool.by_id) == 2
+    # An array of an evicted shape is released without coming back
+    held.release()
+    assert pool.stats()['free'] == 2
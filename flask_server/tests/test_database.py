@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime
+import pytest
+from mysql.connector.errors import PoolError
+from app import database
+from app.database import SQLiteBackend, MySQLBackend, DetectionCache, DetectionWriter
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, '_backend', SQLiteBackend(str(tmp_path / 'detections.db')))
+    monkeypatch.setattr(database, 'cache', DetectionCache(size=5))
+    database.init_db()
+    return database._backend
+
+
+def _row(i, servo_id=1):
+    return {'timestamp': f'2024-01-01 10:00:{i:02d}', 'detected_text': f'A{servo_id}',
+            'servo_id': servo_id, 'confidence': 0.9, 'bbox': str([0, 0, 10, 10])}
+
+
+def test_migrations_applied_once(db):
+    database.init_db()
+    versions = db.fetch_all("SELECT version FROM schema_version ORDER BY version")
+    assert [v['version'] for v in versions] == [version for version, _ in database.MIGRATIONS]
+
+    tables = {r['name'] for r in db.fetch_all("SELECT name FROM sqlite_master")}
+    assert {'detections', 'stats_minute', 'stats_hour', 'idx_detections_servo'} <= tables
+
+
+def test_insert_and_fetch_newest_first(db):
+    database.insert_detections([_row(i) for i in range(3)])
+    rows = database.fetch_logs(10)
+    assert [r['timestamp'] for r in rows] == ['2024-01-01 10:00:02', '2024-01-01 10:00:01', '2024-01-01 10:00:00']
+
+
+def test_insert_sets_ids(db):
+    rows = [_row(i) for i in range(3)]
+    database.insert_detections(rows)
+    database.insert_detections([_row(3)])
+    assert [r['id'] for r in rows] == [r['id'] for r in reversed(database.fetch_logs(10)[1:])]
+
+
+def test_logged_rows_get_ids_and_match_database_rows(db, monkeypatch):
+    writer = DetectionWriter(batch_size=2, flush_interval=0.05)
+    monkeypatch.setattr(database, 'writer', writer)
+    writer.start()
+    for i in range(3):
+        database.log_detection(f'A{i}', i, 0.5 + i / 10, [i, 0, 10, 10])
+    deadline = time.monotonic() + 5
+    while writer.written < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    cached = database.recent_logs(3)          # from the cache
+    stored = database.recent_logs(10)         # past the cache size: from the database
+    assert cached == stored
+    assert [r['detected_text'] for r in cached] == ['A2', 'A1', 'A0']
+    assert all(isinstance(r['id'], int) for r in cached)
+
+
+def test_serialize_row_formats_mysql_datetimes():
+    row = dict(_row(0), id=4, timestamp=datetime(2024, 1, 1, 10, 0, 5))
+    assert database.serialize_row(row)['timestamp'] == '2024-01-01 10:00:05'
+    assert database.serialize_row(row)['id'] == 4
+
+
+def test_recent_logs_past_cache_size_reads_database(db):
+    database.insert_detections([_row(i) for i in range(8)])
+    assert len(database.recent_logs(8)) == 8
+
+
+def test_init_db_warms_cache(db):
+    database.insert_detections([_row(i) for i in range(8)])
+    database.init_db()
+    assert [r['timestamp'] for r in database.recent_logs(2)] == ['2024-01-01 10:00:07', '2024-01-01 10:00:06']
+
+
+def test_query_detections_pages_by_id(db):
+    database.insert_detections([_row(i, servo_id=1 + i % 2) for i in range(7)])
+    rows, cursor = database.query_detections(servo_id=1, limit=2)
+    assert len(rows) == 2 and cursor == rows[-1]['id']
+    assert len(list(database.iter_detections(page_size=2, servo_id=1))) == 4
+
+
+class FakePool:
+    def __init__(self, free):
+        self.free = free
+        self.lock = threading.Lock()
+
+    def get_connection(self):
+        with self.lock:
+            if not self.free:
+                raise PoolError("Failed getting connection; pool exhausted")
+            return self.free.pop()
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def close(self):
+        self.pool.free.append(self)
+
+
+def _mysql_backend(connections, timeout):
+    backend = MySQLBackend.__new__(MySQLBackend)
+    backend.pool = FakePool([])
+    backend.pool.free = [FakeConnection(backend.pool) for _ in range(connections)]
+    backend.pool_timeout = timeout
+    return backend
+
+
+def test_mysql_waits_for_a_returned_connection():
+    backend = _mysql_backend(1, timeout=2.0)
+    with backend.connection() as held:
+        threading.Timer(0.05, held.close).start()
+        with backend.connection() as conn:
+            assert conn is held
+
+
+def test_mysql_pool_wait_is_bounded():
+    backend = _mysql_backend(0, timeout=0.05)
+    with pytest.raises(PoolError):
+        with backend.connection():
+            pass
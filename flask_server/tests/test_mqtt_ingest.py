@@ -0,0 +1,72 @@
+import time
+from app import config, pipeline
+from app.mqtt_ingest import FrameIngest, LoopbackBroker, BrokerSubscriber, camera_for_topic
+from app.config import MQTT_TOPIC_FRAME
+
+
+def test_frame_ingest_off_by_default():
+    assert config.MQTT_FRAME_INGEST is False
+
+
+def test_camera_for_topic():
+    assert camera_for_topic(MQTT_TOPIC_FRAME) == 'cam0'
+    assert camera_for_topic(MQTT_TOPIC_FRAME + '/dock2') == 'dock2'
+
+
+def test_loopback_frames_reach_ingest_jpeg(monkeypatch):
+    ingested = []
+    monkeypatch.setattr(pipeline, 'ingest_jpeg', lambda jpeg, camera: ingested.append((camera, jpeg)) or ('queued', None))
+    broker = LoopbackBroker()
+    ingest = FrameIngest(maxsize=4, require_ready=False)
+    ingest.start(subscribe=broker.subscribe)
+
+    assert broker.publish(MQTT_TOPIC_FRAME, b'a') == 1
+    assert broker.publish(MQTT_TOPIC_FRAME + '/dock2', b'b') == 1
+    assert broker.publish('other/topic', b'c') == 0
+
+    deadline = time.monotonic() + 5
+    while ingest.ingested < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert ingested == [('cam0', b'a'), ('dock2', b'b')]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    broker = LoopbackBroker()
+    ingest = FrameIngest(maxsize=1, require_ready=False)
+    broker.subscribe(MQTT_TOPIC_FRAME, ingest.on_frame)
+    broker.publish(MQTT_TOPIC_FRAME, b'a')
+    broker.publish(MQTT_TOPIC_FRAME, b'b')
+    assert (ingest.received, ingest.dropped) == (2, 1)
+
+
+def test_default_subscriber_uses_configured_broker(monkeypatch):
+    connects = []
+    monkeypatch.setattr(BrokerSubscriber, 'subscribe', lambda self, topic, callback, qos=0: connects.append((self.host, self.port, topic)))
+    ingest = FrameIngest(require_ready=False)
+    monkeypatch.setattr(ingest, '_run', lambda: None)
+    ingest.start()
+
+    assert connects == [
+        (config.MQTT_BROKER, config.MQTT_PORT, MQTT_TOPIC_FRAME),
+        (config.MQTT_BROKER, config.MQTT_PORT, MQTT_TOPIC_FRAME + '/+'),
+    ]
+
+
+def test_failed_ingest_counts_as_error(monkeypatch):
+    def ingest_jpeg(jpeg, camera):
+        if jpeg == b'bad':
+            raise ValueError("not a JPEG")
+        return 'queued', None
+    monkeypatch.setattr(pipeline, 'ingest_jpeg', ingest_jpeg)
+    broker = LoopbackBroker()
+    ingest = FrameIngest(maxsize=4, require_ready=False)
+    ingest.start(subscribe=broker.subscribe)
+
+    broker.publish(MQTT_TOPIC_FRAME, b'bad')
+    broker.publish(MQTT_TOPIC_FRAME, b'good')
+    deadline = time.monotonic() + 5
+    while ingest.ingested + ingest.errors < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert (ingest.stats()['ingested'], ingest.stats()['errors']) == (1, 1)
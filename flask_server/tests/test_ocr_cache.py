@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+import pytest
+from app.config import OCR_CACHE_HAMMING
+from app.ocr_cache import OcrCache, phash
+
+LABELS = ['A1', 'A2', 'A3', 'A4', 'A5', 'A6']
+
+
+def render(text, noise=0, seed=0):
+    crop = np.full((64, 200, 3), 255, np.uint8)
+    cv2.putText(crop, text, (20, 48), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (0, 0, 0), 3)
+    if noise:
+        jitter = np.random.default_rng(seed).integers(-noise, noise + 1, crop.shape)
+        crop = np.clip(crop.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    return crop
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def test_distinct_labels_are_outside_tolerance():
+    hashes = {label: phash(render(label)) for label in LABELS}
+    for i, a in enumerate(LABELS):
+        for b in LABELS[i + 1:]:
+            assert distance(hashes[a], hashes[b]) > OCR_CACHE_HAMMING, (a, b)
+
+
+def test_distinct_labels_do_not_collide():
+    cache = OcrCache()
+    for label in LABELS:
+        cache.put(phash(render(label)), [(None, label, 0.9)])
+    for label in LABELS:
+        result = cache.get(phash(render(label, noise=20, seed=1)))
+        assert result is not None and result[0][1] == label
+
+
+def test_same_label_with_noise_hits():
+    cache = OcrCache()
+    cache.put(phash(render('A3')), 'A3')
+    assert cache.get(phash(render('A3', noise=20, seed=2))) == 'A3'
+
+
+def test_nearest_entry_wins_over_first():
+    cache = OcrCache(tolerance=4)
+    key = 0b1111
+    cache.put(key ^ 0b0111, 'far')     # 3 bits away, stored first
+    cache.put(key ^ 0b0001, 'near')    # 1 bit away
+    cache.put(key ^ 0b1110000, 'mid')  # 3 bits away, newest
+    assert cache.get(key) == 'near'
+
+
+def test_entries_are_per_camera():
+    cache = OcrCache()
+    key = phash(render('A1'))
+    cache.put(key, 'A1', camera='cam0')
+    assert cache.get(key, camera='cam1') is None
+    assert cache.get(key ^ 1, camera='cam1') is None
+    assert cache.get(key, camera='cam0') == 'A1'
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.ocr_cache.time.monotonic', lambda: now[0])
+    cache = OcrCache(ttl=30.0)
+    cache.put(1, 'A1')
+    now[0] += 31
+    assert cache.get(1) is None
+    assert cache.entries == {}
+
+
+def test_least_recently_used_evicted():
+    cache = OcrCache(size=2, tolerance=0)
+    cache.put(1, 'A1')
+    cache.put(2, 'A2')
+    cache.get(1)
+    cache.put(4, 'A4')
+    assert cache.get(2) is None
+    assert cache.get(1) == 'A1'
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['hit_rate'] == pytest.approx(2 / 3)
+
+
+def test_cached_reads_are_not_counted_as_ocr_calls(monkeypatch):
+    from app import detection, metrics
+    monkeypatch.setattr(detection, 'ocr_cache', OcrCache())
+    monkeypatch.setattr(detection.models, 'get', lambda: (None, None))
+    monkeypatch.setattr(detection, 'read_labels', lambda reader, rois: [[(None, 'A1', 0.9)] for _ in rois])
+    monkeypatch.setattr(detection, 'OCR_MODE', 'constrained')
+    calls = lambda: metrics.snapshot()['counters'].get('ocr_calls', 0)
+
+    before = calls()
+    detection.ocr_rois([render('A1')])
+    detection.ocr_rois([render('A1')])
+    detection.ocr_rois([])
+    assert calls() - before == 1
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import Future
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+from app import routes, pipeline
+from app.pipeline import FrameQueue
+
+
+def test_drop_oldest_cancels_evicted_reply():
+    q = FrameQueue(maxsize=2, policy="drop_oldest")
+    first = Future()
+    q.put('f0', 'cam0', first)
+    q.put('f1', 'cam0')
+    q.put('f2', 'cam0')
+
+    assert first.cancelled()
+    assert q.dropped == 1
+    assert [item[0] for item in q.get_batch(max_frames=4, max_wait_ms=0)] == ['f1', 'f2']
+
+
+def test_latest_only_keeps_newest_frame_per_camera():
+    q = FrameQueue(maxsize=8, policy="latest_only")
+    q.put('a0', 'cam0')
+    q.put('b0', 'cam1')
+    q.put('a1', 'cam0')
+
+    assert q.dropped == 1
+    assert [(item[0], item[1]) for item in q.get_batch(max_frames=4, max_wait_ms=0)] == [('b0', 'cam1'), ('a1', 'cam0')]
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        FrameQueue(policy="drop_newest")
+
+
+def test_get_batch_caps_size_and_keeps_the_rest():
+    q = FrameQueue(maxsize=8)
+    for i in range(5):
+        q.put(i)
+
+    assert [item[0] for item in q.get_batch(max_frames=3, max_wait_ms=0)] == [0, 1, 2]
+    assert len(q) == 2
+
+
+def test_get_batch_waits_for_more_frames():
+    q = FrameQueue(maxsize=8)
+    q.put(0)
+    threading.Timer(0.02, q.put, args=(1,)).start()
+
+    batch = q.get_batch(max_frames=2, max_wait_ms=1000)
+    assert [item[0] for item in batch] == [0, 1]
+
+
+def test_get_batch_returns_partial_batch_after_wait():
+    q = FrameQueue(maxsize=8)
+    q.put(0)
+    start = time.perf_counter()
+
+    assert len(q.get_batch(max_frames=4, max_wait_ms=30)) == 1
+    assert time.perf_counter() - start >= 0.03
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(routes.bp)
+    return app.test_client()
+
+
+def test_upload_web_times_out_with_504(client, monkeypatch):
+    pending = Future()
+    monkeypatch.setattr(routes, 'inference_ready', lambda: True)
+    monkeypatch.setattr(routes, 'submit_frame', lambda frame, camera, wait: pending)
+    monkeypatch.setattr(routes, 'UPLOAD_WEB_TIMEOUT', 0.05)
+
+    _, jpeg = cv2.imencode('.jpg', np.zeros((32, 32, 3), np.uint8))
+    response = client.post('/upload_web', data=jpeg.tobytes(), content_type='image/jpeg')
+
+    assert response.status_code == 504
+    assert pending.cancelled()
+
+
+def test_upload_web_dropped_frame_is_503(client, monkeypatch):
+    dropped = Future()
+    dropped.cancel()
+    monkeypatch.setattr(routes, 'inference_ready', lambda: True)
+    monkeypatch.setattr(routes, 'submit_frame', lambda frame, camera, wait: dropped)
+
+    _, jpeg = cv2.imencode('.jpg', np.zeros((32, 32, 3), np.uint8))
+    response = client.post('/upload_web', data=jpeg.tobytes(), content_type='image/jpeg')
+
+    assert response.status_code == 503
+
+
+def test_skipped_frame_reuses_detections_as_not_new(monkeypatch):
+    monkeypatch.setattr(pipeline, 'MOTION_GATE', True)
+    monkeypatch.setattr(pipeline, 'MOTION_STATIC_ACTION', 'reuse')
+    monkeypatch.setattr(pipeline.change_detector, 'changed', lambda camera, jpeg: False)
+    monkeypatch.setitem(pipeline.last_detections, 'cam9', [{'text': 'A1', 'servo': 1, 'new': True}])
+
+    status, detections = pipeline.ingest_jpeg(b'\xff\xd8', 'cam9')
+
+    assert status == 'skipped'
+    assert detections == [{'text': 'A1', 'servo': 1, 'new': False}]
+    assert pipeline.last_detections['cam9'][0]['new'] is True
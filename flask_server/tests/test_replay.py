@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import pytest
+from app import detection, database, pipeline, replay
+
+
+class FakeDetector:
+    def detect(self, frames, conf=None, imgsz=None):
+        return [[(10, 10, 60, 40, 'alamat')] for _ in frames]
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(detection.models, 'detector', FakeDetector())
+    monkeypatch.setattr(detection.models, 'reader', object())
+    monkeypatch.setattr(detection.models, 'ready', type(detection.models.ready)())
+    detection.models.ready.set()
+    monkeypatch.setattr(detection, 'read_rois', lambda rois, cameras=None: [[(None, 'A2', 0.95)] for _ in rois])
+    monkeypatch.setattr(detection, 'trackers', {})
+    monkeypatch.setattr(pipeline, 'MOTION_GATE', True)
+
+
+def _jpeg(value):
+    frame = np.full((120, 160, 3), value, np.uint8)
+    cv2.rectangle(frame, (10, 10), (60, 40), (255 - value,) * 3, -1)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def test_replay_runs_the_live_path_with_stubbed_sinks(fake_models):
+    writer, listeners = database.writer, database._listeners
+    source = [('f0', 0.0, _jpeg(0)), ('f1', 0.1, _jpeg(0)), ('f2', 0.2, _jpeg(200)), ('bad', 0.3, b'xx')]
+
+    results, sinks, _ = replay.replay(source, camera='replay-test')
+
+    assert [r['status'] for r in results] == ['processed', 'skipped', 'processed', 'invalid']
+    assert results[1]['detections'] == results[0]['detections']
+    assert [d['text'] for d in results[2]['detections']] == ['A2']
+
+    # One parcel: one servo command, one logged row, one socket event
+    assert sinks.servo_commands == [('f0', 2)]
+    assert [(frame, row['detected_text']) for frame, row in sinks.log_rows] == [('f0', 'A2')]
+    assert [e for e in sinks.events if e[1] == 'new_detection'] == [('f0', 'new_detection')]
+    # frame records for f0, f1, f2 plus detection records for the two inferred ones
+    assert sinks.captured == 5
+
+    # Real sinks are back in place afterwards
+    assert database.writer is writer and database._listeners is listeners
+    assert pipeline.capture_writer is not sinks
@@ -0,0 +1,103 @@
+import threading
+import time
+import pytest
+import requests
+from app import servo
+from app.servo import ServoDispatcher
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Dispatcher whose HTTP calls are answered by controller.up"""
+    monkeypatch.setattr(servo, 'SERVO_MAX_RETRIES', 0)
+    monkeypatch.setattr(servo, 'SERVO_BREAKER_THRESHOLD', 2)
+    monkeypatch.setattr(servo, 'SERVO_BREAKER_COOLDOWN', 0.05)
+
+    dispatcher = ServoDispatcher('http://controller', workers=1)
+    dispatcher.up = True
+    dispatcher.calls = []
+    dispatcher.answer = threading.Event()
+    dispatcher.answer.set()
+
+    def get(url, timeout=None):
+        dispatcher.calls.append(url)
+        dispatcher.answer.wait()
+        if not dispatcher.up:
+            raise requests.ConnectionError("unreachable")
+        return FakeResponse(200)
+
+    monkeypatch.setattr(dispatcher.session, 'get', get)
+    dispatcher.start()
+    return dispatcher
+
+
+def test_same_command_id_sent_once(controller):
+    assert controller.dispatch(1, command_id=7)
+    assert not controller.dispatch(1, command_id=7)
+    controller.queue.join()
+    assert controller.calls == ['http://controller/servo/1?action=activate']
+    assert controller.counters['deduplicated'] == 1
+
+
+def test_second_parcel_for_same_chute_is_sent(controller):
+    assert controller.dispatch(3, command_id=1)
+    assert controller.dispatch(3, command_id=2)
+    controller.queue.join()
+    assert len(controller.calls) == 2
+    assert controller.counters['delivered'] == 2
+
+
+def test_dedup_ids_are_bounded(controller, monkeypatch):
+    monkeypatch.setattr(servo, 'SERVO_DEDUP_IDS', 2)
+    for command_id in range(3):
+        controller.dispatch(1, command_id=command_id)
+    assert list(controller.recent_ids) == [1, 2]
+
+
+def test_circuit_opens_then_half_open_probe_closes_it(controller):
+    controller.up = False
+    controller.dispatch(1, command_id=1)
+    controller.dispatch(1, command_id=2)
+    controller.queue.join()
+    assert controller.metrics()['circuit_open']
+
+    # Open: dropped without a request
+    assert not controller.dispatch(1, command_id=3)
+    assert len(controller.calls) == 2
+
+    # After the cooldown exactly one probe goes out
+    time.sleep(0.06)
+    assert controller.metrics()['circuit_half_open']
+    controller.up = True
+    controller.answer.clear()
+    assert controller.dispatch(1, command_id=4)
+    # Probe still in flight: everything else is dropped
+    assert not controller.dispatch(1, command_id=5)
+    controller.answer.set()
+    controller.queue.join()
+
+    assert controller.counters['probes'] == 1
+    assert not controller.metrics()['circuit_open']
+    assert controller.dispatch(1, command_id=6)
+    controller.queue.join()
+    assert controller.counters['delivered'] == 2
+
+
+def test_failed_probe_reopens_circuit(controller):
+    controller.up = False
+    controller.dispatch(1, command_id=1)
+    controller.dispatch(1, command_id=2)
+    controller.queue.join()
+
+    time.sleep(0.06)
+    assert controller.dispatch(1, command_id=3)
+    controller.queue.join()
+
+    metrics = controller.metrics()
+    assert metrics['circuit_open'] and not metrics['circuit_half_open']
+    assert not controller.dispatch(1, command_id=4)
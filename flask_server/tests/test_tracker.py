@@ -0,0 +1,119 @@
+import threading
+import numpy as np
+import pytest
+from app import detection
+from app.tracker import IouTracker, Track, iou
+
+
+def test_iou():
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+    assert iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(1 / 3)
+
+
+def test_tracker_keeps_id_across_frames():
+    tracker = IouTracker()
+    first, = tracker.update([(0, 0, 100, 50)])
+    moved, = tracker.update([(10, 0, 110, 50)])
+    assert moved is first
+
+
+def test_tracker_centroid_fallback_for_fast_parcels():
+    tracker = IouTracker(max_centroid_dist=80)
+    first, = tracker.update([(0, 0, 40, 40)])
+    jumped, = tracker.update([(60, 0, 100, 40)])
+    assert jumped is first
+
+
+def test_tracker_expires_missing_tracks():
+    tracker = IouTracker(max_missed=1)
+    track, = tracker.update([(0, 0, 40, 40)])
+    tracker.update([])
+    assert tracker.expired == []
+    tracker.update([])
+    assert tracker.expired == [track]
+    assert tracker.tracks == []
+
+
+def test_track_text_frozen_once_fired():
+    track = Track((0, 0, 10, 10))
+    track.update_read('A1', 0.9)
+    track.fired = True
+    track.update_read('A2', 0.99)
+    assert (track.text, track.confidence) == ('A1', 0.9)
+    assert not track.needs_ocr
+
+
+def test_ready_to_fire_needs_confidence_or_repeated_reads(monkeypatch):
+    track = Track((0, 0, 10, 10))
+    assert not track.ready_to_fire
+    track.update_read('A1', 0.3)
+    assert not track.ready_to_fire
+    track.update_read('A1', 0.4)
+    track.update_read('A1', 0.5)
+    assert track.ready_to_fire
+
+    confident = Track((0, 0, 10, 10))
+    confident.update_read('A2', 0.95)
+    assert confident.ready_to_fire
+
+
+@pytest.fixture
+def fired(monkeypatch):
+    sent = []
+    monkeypatch.setattr(detection, 'send_servo_command', lambda servo_id, *args: sent.append(servo_id))
+    monkeypatch.setattr(detection, 'trackers', {})
+    monkeypatch.setattr(detection.roi, 'observe', lambda camera, boxes: None)
+    return sent
+
+
+def _finish(camera, inferred):
+    canvas, detections = detection.finish_frame(np.zeros((120, 160, 3), np.uint8), camera, inferred)
+    detection.buffers.release(canvas)
+    return detections
+
+
+def _frame(camera, box, text=None, conf=0.0):
+    reads = [(None, text, conf)] if text else None
+    return _finish(camera, [((*box, 'label'), reads)])
+
+
+def test_low_confidence_first_read_does_not_fire(fired):
+    box = (10, 10, 60, 40)
+    detections = _frame('cam0', box, 'A2', 0.3)
+    assert fired == []
+    assert [d['new'] for d in detections] == [False]
+
+    # A better read before it fires replaces the text
+    detections = _frame('cam0', box, 'A1', 0.9)
+    assert fired == [1]
+    assert [(d['text'], d['new']) for d in detections] == [('A1', True)]
+
+    # Later reads neither fire again nor change what was logged
+    detections = _frame('cam0', box, 'A3', 0.99)
+    assert fired == [1]
+    assert [(d['text'], d['new']) for d in detections] == [('A1', False)]
+
+
+def test_track_leaving_fires_on_best_read(fired):
+    _frame('cam0', (10, 10, 60, 40), 'A2', 0.5)
+    detections = []
+    for _ in range(detection.get_tracker('cam0').max_missed + 1):
+        assert fired == []
+        detections = _finish('cam0', [])
+
+    assert fired == [2]
+    assert [(d['text'], d['new'], d['object_label']) for d in detections] == [('A2', True, None)]
+
+
+def test_confident_boxes_waits_for_finish_frame(fired):
+    _frame('cam0', (0, 0, 40, 40), 'A1', 0.95)
+    tracker = detection.get_tracker('cam0')
+    result = []
+    with tracker.lock:
+        reader = threading.Thread(target=lambda: result.append(detection.confident_boxes('cam0')))
+        reader.start()
+        reader.join(timeout=0.1)
+        assert reader.is_alive()
+    reader.join(timeout=1)
+    assert result == [[(0, 0, 40, 40)]]
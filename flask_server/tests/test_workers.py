@@ -0,0 +1,139 @@
+import importlib.util
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from app import workers
+from app.workers import InferencePool
+
+
+def echo_worker(index, slot_names, tasks, results):
+    """Answers every frame with no boxes"""
+    results.put(('ready', index))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        results.put(('result', index, task[0], [], None, 0.0))
+
+
+def crash_on_first_frame(index, slot_names, tasks, results):
+    """Dies mid-frame the first time it is started, behaves after a restart"""
+    marker = os.environ['CRASH_MARKER']
+    results.put(('ready', index))
+    task = tasks.get()
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(3)
+    while task is not None:
+        results.put(('result', index, task[0], [], None, 0.0))
+        task = tasks.get()
+
+
+def failing_load(index, slot_names, tasks, results):
+    results.put(('failed', index, "best.pt not found"))
+
+
+def silent_worker(index, slot_names, tasks, results):
+    """Ready, takes frames, never answers"""
+    results.put(('ready', index))
+    while tasks.get() is not None:
+        pass
+
+
+class Collector:
+    def __init__(self):
+        self.results = []
+        self.failed = threading.Event()
+        self.delivered = threading.Condition()
+
+    def on_result(self, frame, camera, reply, inferred, error, frame_seq):
+        with self.delivered:
+            self.results.append((camera, inferred, error))
+            self.delivered.notify_all()
+
+    def wait_for(self, n, timeout=30):
+        with self.delivered:
+            assert self.delivered.wait_for(lambda: len(self.results) >= n, timeout)
+
+
+def _wait(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def make(target, workers=1):
+        collector = Collector()
+        pool = InferencePool(workers, slot_bytes=64 * 64 * 3, target=target)
+        pool.start(collector.on_result, collector.failed.set)
+        pools.append(pool)
+        return pool, collector
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+FRAME = np.zeros((64, 64, 3), np.uint8)
+
+
+def test_results_in_order(pool_factory):
+    pool, collector = pool_factory(echo_worker)
+    _wait(lambda: pool.ready)
+    for _ in range(3):
+        pool.submit(FRAME, 'cam0')
+    collector.wait_for(3)
+    assert collector.results == [('cam0', [], None)] * 3
+    assert pool.free_slots.qsize() == 2
+
+
+def test_dead_worker_fails_its_frames_and_restarts(pool_factory, tmp_path, monkeypatch):
+    monkeypatch.setenv('CRASH_MARKER', str(tmp_path / 'crashed'))
+    pool, collector = pool_factory(crash_on_first_frame)
+    _wait(lambda: pool.ready)
+
+    pool.submit(FRAME, 'cam0')
+    collector.wait_for(1)
+    camera, inferred, error = collector.results[0]
+    assert inferred is None and 'exited with code 3' in error
+    assert pool.free_slots.qsize() == 2
+
+    _wait(lambda: pool.ready)
+    assert pool.restarts == [1]
+    pool.submit(FRAME, 'cam0')
+    collector.wait_for(2)
+    assert collector.results[1] == ('cam0', [], None)
+
+
+def test_load_failure_is_reported(pool_factory):
+    pool, collector = pool_factory(failing_load, workers=2)
+    assert collector.failed.wait(30)
+    assert not pool.ready
+    assert [w['error'] for w in pool.status()] == ["best.pt not found"] * 2
+    assert pool.restarts == [0, 0]
+    with pytest.raises(RuntimeError):
+        pool.submit(FRAME, 'cam0')
+
+
+def test_submit_times_out_without_free_slot(pool_factory, monkeypatch):
+    monkeypatch.setattr(workers, 'INFERENCE_SLOT_TIMEOUT', 0.05)
+    pool, _ = pool_factory(silent_worker)
+    _wait(lambda: pool.ready)
+    pool.submit(FRAME, 'cam0')
+    pool.submit(FRAME, 'cam0')
+    with pytest.raises(TimeoutError):
+        pool.submit(FRAME, 'cam0')
+
+
+@pytest.mark.skipif(importlib.util.find_spec('easyocr') is not None, reason="would load the real models")
+def test_real_worker_reports_missing_models(pool_factory):
+    pool, collector = pool_factory(workers._worker_main)
+    assert collector.failed.wait(60)
+    assert 'easyocr' in pool.status()[0]['error']